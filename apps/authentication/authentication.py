@@ -1,17 +1,19 @@
 from rest_framework_simplejwt.tokens import Token
 from rest_framework_simplejwt.settings import api_settings
-from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
 from rest_framework_simplejwt.authentication import JWTAuthentication, AuthUser
 
 from django.utils.translation import gettext_lazy as _
 
-from apps.authentication.services import ENCODE_USER_FIELDS
+from apps.authentication.services import ENCODE_USER_FIELDS, is_token_version_valid
 
 
 class CustomJWTAuthentication(JWTAuthentication):
     """
     An authentication plugin that authenticates requests through a JSON web
     token provided in a request header.
+    The user is built from the token claims, so no user query is made.
+    Revoked tokens are rejected by comparing the token version with the cached one.
     """
 
     def get_user(self, validated_token: Token) -> AuthUser:
@@ -22,9 +24,19 @@ class CustomJWTAuthentication(JWTAuthentication):
             user_id = validated_token[api_settings.USER_ID_CLAIM]
         except KeyError:
             raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if any(key not in validated_token for key in ENCODE_USER_FIELDS):
+            raise InvalidToken(_("Token contained no user claims"))
+
+        if not is_token_version_valid(validated_token):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+
         user = self.user_model(
             **{api_settings.USER_ID_FIELD: user_id},
-            **{key: getattr(validated_token.payload, key, '') for key in ENCODE_USER_FIELDS}
+            **{key: validated_token[key] for key in ENCODE_USER_FIELDS}
         )
 
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
         return user
@@ -0,0 +1,93 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+
+
+class HashingQueueFull(Exception):
+    pass
+
+
+def _init_worker():
+    # Workers start from a fresh interpreter, the hashers are configured by the settings
+    django.setup()
+
+
+class PasswordHasherPool:
+    """
+    Runs password hashing in a pool of worker processes, so PBKDF2 doesn't block the event loop
+    and uses all cores. At most PASSWORD_HASHING_QUEUE_DEPTH hashes of this process are running
+    or waiting at the same time, further calls raise HashingQueueFull instead of queueing.
+    Workers are started with forkserver, forking a process running ASGI threads is unsafe.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(
+                    max_workers=settings.PASSWORD_HASHING_WORKERS or os.cpu_count(),
+                    mp_context=context,
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    async def run(self, func, *args):
+        executor = self.executor
+        with self._lock:
+            if self._pending >= settings.PASSWORD_HASHING_QUEUE_DEPTH:
+                raise HashingQueueFull('Password hashing queue is full')
+            self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+hasher_pool = PasswordHasherPool()
+
+
+def password_must_update(encoded):
+    """
+    Whether a password stored as encoded is re-hashed after a successful check, as check_password decides
+    """
+    preferred = get_hasher('default')
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+async def acheck_password(password, encoded, setter=None):
+    """
+    Async check_password, the setter is awaited with the password when its hash must be upgraded.
+    It runs here and not in the pool worker, which has no access to the user.
+    """
+    valid = await hasher_pool.run(check_password, password, encoded)
+    if valid and setter is not None and password_must_update(encoded):
+        await setter(password)
+    return valid
+
+
+async def amake_password(password):
+    return await hasher_pool.run(make_password, password)
@@ -0,0 +1,51 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand
+
+from apps.authentication.hashing import acheck_password, hasher_pool
+
+
+class Command(BaseCommand):
+    """
+    Compare password checks per second of the sync views, hashing on the request threads,
+    with the async views, hashing in the process pool. Password checks are what limits logins.
+    """
+    help = 'Benchmark password checks per second of the sync and async login paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Password checks per run')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent requests')
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        concurrency = options['concurrency']
+        encoded = make_password('benchmark-password')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda _: check_password('benchmark-password', encoded), range(total)))
+        sync_rate = total / (time.perf_counter() - started)
+        self.stdout.write(f'sync, {concurrency} request threads: {sync_rate:.1f} logins/s')
+
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def login():
+                async with semaphore:
+                    return await acheck_password('benchmark-password', encoded)
+
+            # Start the workers before measuring
+            await acheck_password('benchmark-password', encoded)
+            started = time.perf_counter()
+            await asyncio.gather(*(login() for _ in range(total)))
+            return total / (time.perf_counter() - started)
+
+        try:
+            async_rate = asyncio.run(run())
+        finally:
+            hasher_pool.shutdown()
+        self.stdout.write(f'async, {concurrency} concurrent requests: {async_rate:.1f} logins/s')
+        self.stdout.write(self.style.SUCCESS(f'Speedup: {async_rate / sync_rate:.2f}x'))
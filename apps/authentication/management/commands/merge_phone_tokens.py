@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from apps.authentication.models.otp import PhoneToken
+
+
+class Command(BaseCommand):
+    """
+    Keep only the most recently updated PhoneToken row of every phone number.
+    Run it before migrating to the unique PhoneToken.phone_number, which can't be added while
+    duplicates exist. Only columns that existed before are read, so it runs on the old schema.
+    """
+    help = 'Merge duplicate phone tokens into the latest row of each phone number'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Phone numbers merged per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        duplicated = list(
+            PhoneToken.objects.values_list('phone_number').annotate(total=Count('pk')).filter(total__gt=1)
+            .values_list('phone_number', flat=True)
+        )
+
+        total = 0
+        for start in range(0, len(duplicated), batch_size):
+            batch = duplicated[start:start + batch_size]
+            kept = set()
+            stale = []
+            for pk, phone_number in PhoneToken.objects.filter(phone_number__in=batch).order_by(
+                'phone_number', '-updated_at', '-pk'
+            ).values_list('pk', 'phone_number'):
+                if phone_number in kept:
+                    stale.append(pk)
+                else:
+                    kept.add(phone_number)
+            with transaction.atomic():
+                total += PhoneToken.objects.filter(pk__in=stale).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {total} duplicate phone tokens of {len(duplicated)} phone numbers'
+        ))
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.authentication.models.otp import PhoneToken
+
+
+class Command(BaseCommand):
+    """
+    Delete PhoneToken rows that can no longer be verified or used to register
+    """
+    help = 'Delete expired phone tokens'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of rows deleted per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        lifetime = max(timedelta(minutes=settings.OTP_EXPIRY), timedelta(seconds=settings.OTP_VERIFIED_TTL))
+        expired = PhoneToken.objects.filter(updated_at__lt=timezone.now() - lifetime)
+
+        total = 0
+        while True:
+            # Small batches keep the delete from locking the table for long
+            batch = list(expired.values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            total += PhoneToken.objects.filter(pk__in=batch).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {total} expired phone tokens'))
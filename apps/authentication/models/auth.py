@@ -1,12 +1,10 @@
-import re
-
 from django.db import models
-from django.conf import settings
 
 from django.core.validators import RegexValidator
-from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 
+from apps.utils.validators import normalize_phone_number
+
 
 class CustomUserManager(BaseUserManager):
     """
@@ -47,6 +45,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     :param avatar: Avatar of the user
     :param phone_number: Phone number of the user
     :param ut: Type of the user
+    :param token_version: Version of the issued JWT tokens, bumped to revoke them
     """
     class UserTypes(models.IntegerChoices):
         """
@@ -74,6 +73,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
 
     objects = CustomUserManager()
 
@@ -84,13 +84,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         """
         Clean the phone number field of the CustomUser model
         """
-        self.phone_number = re.sub(r'\D', '', self.phone_number.strip())
-
-        valid_operators = settings.VALID_OPERATORS_PHONE
-        operator_code = self.phone_number[3:5]
-        if operator_code not in valid_operators:
-            raise ValidationError("Invalid operator code.")
-
+        self.phone_number = normalize_phone_number(self.phone_number)
         super().clean()
 
     def __str__(self):
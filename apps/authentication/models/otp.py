@@ -1,13 +1,12 @@
-import re
 import random
 
 from django.core.validators import RegexValidator
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
-from django.core.exceptions import ValidationError
 
 from apps.utils.abs_model import AbstractBaseModel
+from apps.utils.validators import normalize_phone_number
 
 
 class PhoneToken(AbstractBaseModel):
@@ -15,8 +14,10 @@ class PhoneToken(AbstractBaseModel):
     PhoneToken model for OTP verification of phone number.
     AbstractBaseModel is a custom abstract model that contains
     """
+    # Databases with duplicate rows need manage.py merge_phone_tokens before the unique index is migrated
     phone_number = models.CharField(
         max_length=12,
+        unique=True,
         validators=[
             RegexValidator(
                 regex=r'^998\d{9}$',
@@ -27,6 +28,7 @@ class PhoneToken(AbstractBaseModel):
     )
     otp = models.CharField(max_length=6)
     verified = models.BooleanField(default=False)
+    attempts = models.PositiveSmallIntegerField(default=0)
 
     def generate_otp(self):
         # Generate a random 6-digit OTP
@@ -42,14 +44,7 @@ class PhoneToken(AbstractBaseModel):
         Remove all non-numeric characters from the phone number.
         Check if the operator code is valid
         """
-        phone_number = re.sub(r'\D', '', self.phone_number.strip())
-        valid_operators = settings.VALID_OPERATORS_PHONE
-        operator_code = phone_number[3:5]
-
-        if operator_code not in valid_operators:
-            raise ValidationError("Invalid operator code.")
-
-        return phone_number
+        return normalize_phone_number(self.phone_number)
 
     def clean(self):
         # Clean the phone number field
@@ -62,3 +57,6 @@ class PhoneToken(AbstractBaseModel):
     class Meta:
         verbose_name = 'Phone Token'
         verbose_name_plural = 'Phone Tokens'
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
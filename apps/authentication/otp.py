@@ -0,0 +1,150 @@
+import secrets
+import string
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.authentication.models.otp import PhoneToken
+
+
+class OTPResult:
+    """
+    Outcomes of OTPBackend.verify()
+    """
+    VERIFIED = 'verified'
+    INVALID = 'invalid'
+    EXPIRED = 'expired'
+    NOT_FOUND = 'not_found'
+    ALREADY_VERIFIED = 'already_verified'
+    TOO_MANY_ATTEMPTS = 'too_many_attempts'
+
+
+def generate_otp_code():
+    return ''.join(secrets.choice(string.digits) for _ in range(settings.OTP_LENGTH))
+
+
+class BaseOTPBackend:
+    """
+    Stores the OTP codes of phone numbers.
+    issue() creates a new code, verify() checks it and marks the phone number as verified,
+    consume_verification() takes the verification away once, for the registration.
+    """
+
+    def issue(self, phone_number):
+        raise NotImplementedError
+
+    def verify(self, phone_number, otp):
+        raise NotImplementedError
+
+    def consume_verification(self, phone_number):
+        raise NotImplementedError
+
+
+class DatabaseOTPBackend(BaseOTPBackend):
+    """
+    Keeps the codes in the PhoneToken table.
+    Verification is a single conditional UPDATE, so a code can't be used twice.
+    Old rows are removed with manage.py purge_phone_tokens.
+    """
+
+    def issue(self, phone_number):
+        otp = generate_otp_code()
+        PhoneToken.objects.update_or_create(
+            phone_number=phone_number,
+            defaults={'otp': otp, 'verified': False, 'attempts': 0},
+        )
+        return otp
+
+    def verify(self, phone_number, otp):
+        now = timezone.now()
+        tokens = PhoneToken.objects.filter(phone_number=phone_number)
+        verified = tokens.filter(
+            otp=otp,
+            verified=False,
+            attempts__lt=settings.OTP_MAX_ATTEMPTS,
+            updated_at__gte=now - timedelta(minutes=settings.OTP_EXPIRY),
+        ).update(verified=True, updated_at=now)
+        if verified:
+            return OTPResult.VERIFIED
+
+        tokens.filter(verified=False).update(attempts=F('attempts') + 1)
+        token = tokens.only('verified', 'attempts', 'updated_at').first()
+        if token is None:
+            return OTPResult.NOT_FOUND
+        if token.verified:
+            return OTPResult.ALREADY_VERIFIED
+        if token.is_expired():
+            return OTPResult.EXPIRED
+        if token.attempts > settings.OTP_MAX_ATTEMPTS:
+            return OTPResult.TOO_MANY_ATTEMPTS
+        return OTPResult.INVALID
+
+    def consume_verification(self, phone_number):
+        deleted, _ = PhoneToken.objects.filter(
+            phone_number=phone_number,
+            verified=True,
+            updated_at__gte=timezone.now() - timedelta(seconds=settings.OTP_VERIFIED_TTL),
+        ).delete()
+        return deleted > 0
+
+
+class CacheOTPBackend(BaseOTPBackend):
+    """
+    Keeps the codes in the OTP_CACHE cache with native expiry, without touching the database.
+    Attempts are counted with incr and a code is consumed by the delete that removes it,
+    so of two concurrent correct guesses only one verifies.
+    A locmem OTP_CACHE only works with a single process, use a shared cache such as Redis otherwise.
+    """
+    CODE_KEY = 'otp:code:{}'
+    ATTEMPTS_KEY = 'otp:attempts:{}'
+    VERIFIED_KEY = 'otp:verified:{}'
+
+    @property
+    def cache(self):
+        return caches[settings.OTP_CACHE]
+
+    def issue(self, phone_number):
+        otp = generate_otp_code()
+        self.cache.set_many({
+            self.CODE_KEY.format(phone_number): otp,
+            self.ATTEMPTS_KEY.format(phone_number): 0,
+        }, timeout=settings.OTP_EXPIRY * 60)
+        self.cache.delete(self.VERIFIED_KEY.format(phone_number))
+        return otp
+
+    def verify(self, phone_number, otp):
+        code_key = self.CODE_KEY.format(phone_number)
+        attempts_key = self.ATTEMPTS_KEY.format(phone_number)
+        try:
+            attempts = self.cache.incr(attempts_key)
+        except ValueError:
+            # Nothing issued or already expired
+            if self.cache.get(self.VERIFIED_KEY.format(phone_number)):
+                return OTPResult.ALREADY_VERIFIED
+            return OTPResult.EXPIRED
+
+        if attempts > settings.OTP_MAX_ATTEMPTS:
+            self.cache.delete(code_key)
+            return OTPResult.TOO_MANY_ATTEMPTS
+
+        stored = self.cache.get(code_key)
+        if stored is None or not secrets.compare_digest(stored.encode(), str(otp).encode()):
+            return OTPResult.INVALID
+        if not self.cache.delete(code_key):
+            # A concurrent request consumed the code first
+            return OTPResult.INVALID
+
+        self.cache.set(self.VERIFIED_KEY.format(phone_number), True, timeout=settings.OTP_VERIFIED_TTL)
+        self.cache.delete(attempts_key)
+        return OTPResult.VERIFIED
+
+    def consume_verification(self, phone_number):
+        return self.cache.delete(self.VERIFIED_KEY.format(phone_number))
+
+
+def get_otp_backend():
+    return import_string(settings.OTP_BACKEND)()
@@ -0,0 +1,15 @@
+from rest_framework.permissions import BasePermission
+
+from apps.authentication.models import CustomUser
+
+
+class IsAdminUserType(BasePermission):
+    """
+    Allows access only to admins and superusers.
+    Checks the ut claim of the token, so no user query is made.
+    """
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated and request.user.ut in (
+            CustomUser.UserTypes.ADMIN, CustomUser.UserTypes.SUPERUSER
+        ))
@@ -4,10 +4,11 @@ from django.contrib.auth import get_user_model, authenticate
 
 from rest_framework import serializers, exceptions
 from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from apps.authentication.services import generate_jwt_token
+from apps.authentication.services import generate_jwt_token, is_token_version_valid
 
 User = get_user_model()
 
@@ -90,8 +91,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         user.save()
 
         # Generate JWT tokens
-        from rest_framework_simplejwt.tokens import RefreshToken
-        refresh = RefreshToken.for_user(user)
+        refresh = generate_jwt_token(user)
         validated_data['access_token'] = str(refresh.access_token)
         validated_data['refresh_token'] = str(refresh)
 
@@ -107,6 +107,9 @@ class CustomTokenRefreshSerializer(serializers.Serializer):
 
     def validate(self, attrs: dict[str, Any]) -> dict[str, str]:
         refresh_token = RefreshToken(attrs["refresh_token"])
+        if not is_token_version_valid(refresh_token):
+            raise TokenError("Token has been revoked")
+
         return {
             "access_token": str(refresh_token.access_token)
         }
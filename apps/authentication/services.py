@@ -1,10 +1,60 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 
-ENCODE_USER_FIELDS = ('username', 'first_name', 'last_name')
+from apps.utils.cache import get_shared_timeout
+
+# Claims copied from the user into every token, enough to rebuild the user without a query
+ENCODE_USER_FIELDS = ('phone_number', 'first_name', 'last_name', 'ut', 'is_active')
+
+TOKEN_VERSION_CLAIM = 'tv'
+TOKEN_VERSION_CACHE_KEY = 'auth:token_version:{}'
+
+# Stored for users that no longer exist, so repeated requests do not hit the database
+MISSING_USER_VERSION = -1
 
 
 def generate_jwt_token(user: get_user_model()):
     token = RefreshToken.for_user(user)
     token.payload.update({key: getattr(user, key, '') for key in ENCODE_USER_FIELDS})
+    token.payload[TOKEN_VERSION_CLAIM] = user.token_version
     return token
+
+
+def get_token_version(user_id) -> int:
+    """
+    Return the current token version of the user.
+    The value is read from the cache and falls back to a single-column query on a miss.
+    Revocations reach the other workers through the cache, see get_shared_timeout.
+    """
+    key = TOKEN_VERSION_CACHE_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = get_user_model().objects.filter(pk=user_id).values_list('token_version', flat=True).first()
+        if version is None:
+            version = MISSING_USER_VERSION
+        cache.set(key, version, get_shared_timeout(cache, settings.TOKEN_VERSION_CACHE_TIMEOUT))
+    return version
+
+
+def set_token_version(user_id, version) -> None:
+    """
+    Store the token version of the user in the cache, or drop it if version is None
+    """
+    key = TOKEN_VERSION_CACHE_KEY.format(user_id)
+    if version is None:
+        cache.delete(key)
+    else:
+        cache.set(key, version, get_shared_timeout(cache, settings.TOKEN_VERSION_CACHE_TIMEOUT))
+
+
+def is_token_version_valid(token) -> bool:
+    """
+    Check that the token was issued for the current token version of its user
+    """
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return False
+    return token.get(TOKEN_VERSION_CLAIM) == get_token_version(user_id)
@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.authentication.services import set_token_version
+
+User = get_user_model()
+
+# Changing any of these fields revokes all tokens issued to the user
+TOKEN_REVOKING_FIELDS = ('is_active', 'ut')
+
+
+@receiver(pre_save, sender=User)
+def bump_token_version(sender, instance, **kwargs):
+    """
+    Bump the token version when the user is deactivated or changes role
+    """
+    if instance.pk is None:
+        return
+
+    old = sender.objects.filter(pk=instance.pk).values(*TOKEN_REVOKING_FIELDS, 'token_version').first()
+    if old is None:
+        return
+
+    if old['is_active'] and not instance.is_active or old['ut'] != instance.ut:
+        instance.token_version = old['token_version'] + 1
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'token_version' not in update_fields:
+            sender.objects.filter(pk=instance.pk).update(token_version=instance.token_version)
+
+
+@receiver(post_save, sender=User)
+def cache_token_version(sender, instance, created, **kwargs):
+    if created:
+        return
+    user_id, version = instance.pk, instance.token_version
+    transaction.on_commit(lambda: set_token_version(user_id, version))
+
+
+@receiver(post_delete, sender=User)
+def delete_token_version(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: set_token_version(user_id, None))
@@ -1,3 +1,245 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from apps.authentication.hashing import hasher_pool
+from apps.authentication.models import CustomUser
+from apps.authentication.models.otp import PhoneToken
+from apps.authentication.otp import CacheOTPBackend, DatabaseOTPBackend, OTPResult
+from apps.authentication.throttles import IPTokenBucketThrottle, PhoneTokenBucketThrottle, TokenBucketThrottle
+from apps.utils.sms.providers import LocMemProvider
+
+PHONE_NUMBER = '998901234567'
+otp_settings = override_settings(OTP_LENGTH=6, OTP_EXPIRY=5, OTP_MAX_ATTEMPTS=3, OTP_VERIFIED_TTL=900,
+                                 OTP_CACHE='default')
+
+
+class OTPBackendTestsMixin:
+    """
+    Behaviour both OTP backends share
+    """
+    backend_class = None
+    # verify() of a phone number nothing was issued for
+    missing_result = None
+
+    def setUp(self):
+        cache.clear()
+        self.backend = self.backend_class()
+
+    def expire(self, phone_number):
+        raise NotImplementedError
+
+    def wrong_code(self, otp):
+        return '000000' if otp != '000000' else '111111'
+
+    def test_issued_code_verifies_once(self):
+        otp = self.backend.issue(PHONE_NUMBER)
+        self.assertEqual(len(otp), 6)
+        self.assertEqual(self.backend.verify(PHONE_NUMBER, otp), OTPResult.VERIFIED)
+        self.assertEqual(self.backend.verify(PHONE_NUMBER, otp), OTPResult.ALREADY_VERIFIED)
+
+    def test_verification_is_consumed_once(self):
+        otp = self.backend.issue(PHONE_NUMBER)
+        self.assertFalse(self.backend.consume_verification(PHONE_NUMBER))
+        self.backend.verify(PHONE_NUMBER, otp)
+        self.assertTrue(self.backend.consume_verification(PHONE_NUMBER))
+        self.assertFalse(self.backend.consume_verification(PHONE_NUMBER))
+
+    def test_wrong_code_is_invalid(self):
+        otp = self.backend.issue(PHONE_NUMBER)
+        self.assertEqual(self.backend.verify(PHONE_NUMBER, self.wrong_code(otp)), OTPResult.INVALID)
+        self.assertEqual(self.backend.verify(PHONE_NUMBER, otp), OTPResult.VERIFIED)
+
+    def test_attempts_are_limited(self):
+        otp = self.backend.issue(PHONE_NUMBER)
+        for _ in range(3):
+            self.assertEqual(self.backend.verify(PHONE_NUMBER, self.wrong_code(otp)), OTPResult.INVALID)
+        self.assertEqual(self.backend.verify(PHONE_NUMBER, otp), OTPResult.TOO_MANY_ATTEMPTS)
+
+    def test_new_code_resets_the_attempts(self):
+        otp = self.backend.issue(PHONE_NUMBER)
+        for _ in range(3):
+            self.backend.verify(PHONE_NUMBER, self.wrong_code(otp))
+        otp = self.backend.issue(PHONE_NUMBER)
+        self.assertEqual(self.backend.verify(PHONE_NUMBER, otp), OTPResult.VERIFIED)
+
+    def test_expired_code_is_refused(self):
+        otp = self.backend.issue(PHONE_NUMBER)
+        self.expire(PHONE_NUMBER)
+        self.assertEqual(self.backend.verify(PHONE_NUMBER, otp), OTPResult.EXPIRED)
+
+    def test_unknown_phone_number(self):
+        self.assertEqual(self.backend.verify(PHONE_NUMBER, '123456'), self.missing_result)
+
+
+@otp_settings
+class DatabaseOTPBackendTests(OTPBackendTestsMixin, TestCase):
+    backend_class = DatabaseOTPBackend
+    missing_result = OTPResult.NOT_FOUND
+
+    def expire(self, phone_number):
+        PhoneToken.objects.filter(phone_number=phone_number).update(updated_at=timezone.now() - timedelta(minutes=6))
+
+    def test_one_row_per_phone_number(self):
+        self.backend.issue(PHONE_NUMBER)
+        self.backend.issue(PHONE_NUMBER)
+        self.assertEqual(PhoneToken.objects.filter(phone_number=PHONE_NUMBER).count(), 1)
+
+
+@otp_settings
+class CacheOTPBackendTests(OTPBackendTestsMixin, TestCase):
+    backend_class = CacheOTPBackend
+    missing_result = OTPResult.EXPIRED
+
+    def expire(self, phone_number):
+        # What the cache's native expiry does after OTP_EXPIRY minutes
+        cache.delete_many([CacheOTPBackend.CODE_KEY.format(phone_number),
+                           CacheOTPBackend.ATTEMPTS_KEY.format(phone_number)])
+
+    def test_no_database_queries(self):
+        with self.assertNumQueries(0):
+            otp = self.backend.issue(PHONE_NUMBER)
+            self.backend.verify(PHONE_NUMBER, otp)
+            self.backend.consume_verification(PHONE_NUMBER)
+
+    def test_concurrent_correct_codes_verify_once(self):
+        otp = self.backend.issue(PHONE_NUMBER)
+        barrier = threading.Barrier(8)
+        results = []
+
+        def verify():
+            barrier.wait()
+            results.append(self.backend.verify(PHONE_NUMBER, otp))
+
+        threads = [threading.Thread(target=verify) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(OTPResult.VERIFIED), 1)
+
+
+class ThrottledView:
+    throttle_scope = 'test'
+
+
+@mock.patch.object(TokenBucketThrottle, 'THROTTLE_RATES', {'test_ip': '3/m', 'test_phone': '2/10m'})
+class TokenBucketThrottleTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.now = 1000.0
+
+    def allow(self, throttle_class, phone_number=PHONE_NUMBER, address='10.0.0.1'):
+        request = APIRequestFactory().post('/', REMOTE_ADDR=address)
+        request.data = {'phone_number': phone_number}
+        throttle = throttle_class()
+        with mock.patch.object(throttle, 'timer', return_value=self.now):
+            allowed = throttle.allow_request(request, ThrottledView())
+        return allowed, None if allowed else throttle.wait()
+
+    def test_burst_then_refused_with_wait(self):
+        for _ in range(3):
+            self.assertEqual(self.allow(IPTokenBucketThrottle), (True, None))
+        allowed, wait = self.allow(IPTokenBucketThrottle)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 20)
+
+    def test_tokens_refill_over_time(self):
+        for _ in range(3):
+            self.allow(IPTokenBucketThrottle)
+        self.now += 19
+        self.assertFalse(self.allow(IPTokenBucketThrottle)[0])
+        self.now += 1
+        self.assertTrue(self.allow(IPTokenBucketThrottle)[0])
+        self.assertFalse(self.allow(IPTokenBucketThrottle)[0])
+
+    def test_buckets_per_address(self):
+        for _ in range(3):
+            self.allow(IPTokenBucketThrottle, address='10.0.0.1')
+        self.assertFalse(self.allow(IPTokenBucketThrottle, address='10.0.0.1')[0])
+        self.assertTrue(self.allow(IPTokenBucketThrottle, address='10.0.0.2')[0])
+
+    def test_buckets_per_phone_number(self):
+        for _ in range(2):
+            self.allow(PhoneTokenBucketThrottle)
+        # The same number written differently
+        self.assertFalse(self.allow(PhoneTokenBucketThrottle, phone_number='+998 90 123 45 67')[0])
+        self.assertTrue(self.allow(PhoneTokenBucketThrottle, phone_number='998901234568')[0])
+
+    def test_requests_without_phone_number_are_not_limited_per_phone(self):
+        for _ in range(5):
+            self.assertTrue(self.allow(PhoneTokenBucketThrottle, phone_number='')[0])
+
+    def test_scopes_without_rate_are_not_limited(self):
+        with mock.patch.object(ThrottledView, 'throttle_scope', 'other'):
+            for _ in range(5):
+                self.assertTrue(self.allow(IPTokenBucketThrottle)[0])
+
+
+@otp_settings
+@override_settings(SMS_BACKEND='apps.utils.sms.providers.LocMemProvider')
+class SendOTPThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        LocMemProvider.outbox.clear()
+
+    def test_phone_number_is_throttled_with_retry_after(self):
+        # send_otp_phone allows 3 codes per 10 minutes
+        for _ in range(3):
+            response = self.client.post(reverse('send-otp'), {'phone_number': PHONE_NUMBER})
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse('send-otp'), {'phone_number': PHONE_NUMBER})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(PhoneToken.objects.filter(phone_number=PHONE_NUMBER).count(), 1)
+
+
+async def run_inline(func, *args):
+    return func(*args)
+
+
+@mock.patch.object(hasher_pool, 'run', run_inline)
+class AsyncLoginViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(phone_number=PHONE_NUMBER, first_name='First',
+                                              password=make_password('secret', hasher='pbkdf2_sha1'))
+
+    def login(self, password='secret'):
+        return self.client.post(reverse('async-login-view'), {'phone_number': PHONE_NUMBER, 'password': password},
+                                content_type='application/json')
+
+    def test_password_hash_is_upgraded(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access_token', response.json())
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(self.user.check_password('secret'))
+
+    def test_wrong_password_keeps_the_hash(self):
+        encoded = self.user.password
+        self.assertEqual(self.login('wrong').status_code, 403)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, encoded)
+
+    @override_settings(CONCURRENCY_LIMITS={'login': 1})
+    def test_concurrency_limit(self):
+        self.assertEqual(self.login().status_code, 200)
+        # The slot is released after the request
+        self.assertEqual(self.login().status_code, 200)
+
+        with override_settings(CONCURRENCY_LIMITS={'login': 0}):
+            response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
@@ -0,0 +1,85 @@
+import re
+
+from rest_framework.throttling import SimpleRateThrottle
+
+from apps.utils.rate_limit import consume_token
+
+RATE_RE = re.compile(r'^(?P<num>\d+)/(?P<multiplier>\d*)(?P<unit>[smhd])')
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket throttle implemented as GCRA, so a bucket is a single timestamp in the cache.
+    A rate of 'n/period' refills n tokens per period with a burst of n, the period may carry
+    a multiplier, e.g. '3/10m'. See consume_token for the atomic update.
+    The scope is '<view.throttle_scope>_<scope_suffix>' and scopes without a configured
+    rate are not throttled, so every endpoint picks its own limits.
+    """
+    scope_suffix = None
+
+    def __init__(self):
+        # The rate depends on the view, it is read in allow_request
+        pass
+
+    def parse_rate(self, rate):
+        match = RATE_RE.match(rate)
+        return int(match.group('num')), int(match.group('multiplier') or 1) * UNITS[match.group('unit')]
+
+    def get_ident_key(self, request):
+        raise NotImplementedError('.get_ident_key() must be overridden')
+
+    def get_cache_key(self, request, view):
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        view_scope = getattr(view, 'throttle_scope', None)
+        if not view_scope:
+            return True
+        self.scope = f'{view_scope}_{self.scope_suffix}'
+        self.rate = self.THROTTLE_RATES.get(self.scope)
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        interval = self.duration / self.num_requests
+        tolerance = interval * (self.num_requests - 1)
+        self.retry_after = self.consume(self.key, self.timer(), interval, tolerance)
+        return self.retry_after == 0
+
+    def consume(self, key, now, interval, tolerance):
+        """
+        Take a token from the bucket, returns 0 or the seconds until a token is available
+        """
+        return consume_token(self.cache, key, now, interval, tolerance)
+
+    def wait(self):
+        return self.retry_after
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Bucket per client address
+    """
+    scope_suffix = 'ip'
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
+
+
+class PhoneTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Bucket per phone number in the request body, requests without one are not limited here
+    """
+    scope_suffix = 'phone'
+
+    def get_ident_key(self, request):
+        phone_number = re.sub(r'\D', '', str(request.data.get('phone_number') or ''))
+        return phone_number or None
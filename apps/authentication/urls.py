@@ -1,13 +1,19 @@
 from django.urls import path
 
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 
-from apps.authentication.views import RegisterAPIView, UserProfileAPIView, SendOTPAPIView, VerifyOTPAPIView
+from apps.authentication.views import (
+    AsyncLoginView, AsyncRegisterView, LoginAPIView, RegisterAPIView, UserProfileAPIView, SendOTPAPIView,
+    VerifyOTPAPIView
+)
 
 urlpatterns = [
-    path('login/', TokenObtainPairView.as_view(), name='login-view'),
+    path('login/', LoginAPIView.as_view(), name='login-view'),
     path('register/', RegisterAPIView.as_view(), name='register-view'),
     path('refresh-token/', TokenRefreshView.as_view(), name='token_refresh'),
+    # Async variants for the ASGI server, password hashing runs in a process pool
+    path('async/login/', AsyncLoginView.as_view(), name='async-login-view'),
+    path('async/register/', AsyncRegisterView.as_view(), name='async-register-view'),
 
     path('profile/', UserProfileAPIView.as_view(), name='user-profile'),
 
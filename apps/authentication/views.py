@@ -1,25 +1,47 @@
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.generics import CreateAPIView
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.views import TokenObtainPairView
 
-from apps.authentication.models.otp import PhoneToken
+from apps.authentication.authentication import CustomJWTAuthentication
+from apps.authentication.hashing import HashingQueueFull, acheck_password, amake_password
+from apps.authentication.otp import OTPResult, get_otp_backend
 from apps.authentication.serializers import RegisterSerializer
+from apps.authentication.services import generate_jwt_token
+from apps.authentication.throttles import IPTokenBucketThrottle, PhoneTokenBucketThrottle
+from apps.utils.decorator import acquire_slot, concurrency_limit, release_slot
+from apps.utils.sms import SMSQueueFull, send_sms
+
+User = get_user_model()
 
 
 class SendOTPAPIView(APIView):
     """
-    Send OTP to user's phone number using PhoneToken model
+    Send OTP to user's phone number, stored by the OTP_BACKEND
     """
     permission_classes = ()
     authentication_classes = ()
+    throttle_classes = [IPTokenBucketThrottle, PhoneTokenBucketThrottle]
+    throttle_scope = 'send_otp'
 
+    @concurrency_limit('send_otp')
     def post(self, request, *args, **kwargs):
         """
-        Send OTP to user's phone number using PhoneToken model.
+        Send OTP to user's phone number.
         """
         phone_number = request.data.get("phone_number")
         if not phone_number:
@@ -32,25 +54,34 @@ class SendOTPAPIView(APIView):
                 {"error": "Phone number must be 12 digits"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        # Create or update PhoneToken
-        phone_token, created = PhoneToken.objects.get_or_create(phone_number=phone_number)
-        phone_token.generate_otp()
+        otp = get_otp_backend().issue(phone_number)
 
-        # send_sms(phone_number, phone_token.otp)
+        # Only queued here, the SMS workers talk to the provider
+        try:
+            send_sms(phone_number, settings.SMS_OTP_MESSAGE.format(otp=otp))
+        except SMSQueueFull:
+            return Response(
+                {"error": "Too many requests, try again later"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "10"},
+            )
 
         return Response({"message": "OTP sent successfully"}, status=status.HTTP_200_OK)
 
 
 class VerifyOTPAPIView(APIView):
     """
-    Verify OTP for phone number using PhoneToken model
+    Verify OTP for phone number, stored by the OTP_BACKEND
     """
     permission_classes = ()
     authentication_classes = ()
+    throttle_classes = [IPTokenBucketThrottle, PhoneTokenBucketThrottle]
+    throttle_scope = 'verify_otp'
 
+    @concurrency_limit('verify_otp')
     def post(self, request, *args, **kwargs):
         """
-        Verify OTP for phone number using PhoneToken model and set verified to True.
+        Verify OTP for phone number and mark the phone number as verified.
         Phone number and otp are required in the request data.
         """
         phone_number = request.data.get("phone_number")
@@ -59,22 +90,25 @@ class VerifyOTPAPIView(APIView):
         if not phone_number or not otp:
             return Response({"error": "Phone number and OTP are required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            phone_token = PhoneToken.objects.get(phone_number=phone_number)
-        except PhoneToken.DoesNotExist:
+        result = get_otp_backend().verify(phone_number, otp)
+
+        if result == OTPResult.NOT_FOUND:
             return Response({"error": "Phone number not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        if phone_token.verified:
+        if result == OTPResult.ALREADY_VERIFIED:
             return Response({"message": "Phone number already verified"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if phone_token.is_expired():
+        if result == OTPResult.EXPIRED:
             return Response({"error": "OTP has expired"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if phone_token.otp != otp:
-            return Response({"error": "Invalid OTP"}, status=status.HTTP_400_BAD_REQUEST)
+        if result == OTPResult.TOO_MANY_ATTEMPTS:
+            return Response(
+                {"error": "Too many attempts, request a new OTP"},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
 
-        phone_token.verified = True
-        phone_token.save()
+        if result != OTPResult.VERIFIED:
+            return Response({"error": "Invalid OTP"}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({"message": "Phone number verified successfully"}, status=status.HTTP_200_OK)
 
@@ -85,24 +119,38 @@ class RegisterAPIView(CreateAPIView):
     """
     permission_classes = ()
     authentication_classes = ()
+    throttle_classes = [IPTokenBucketThrottle, PhoneTokenBucketThrottle]
+    throttle_scope = 'register'
     serializer_class = RegisterSerializer
 
+    @concurrency_limit('register')
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """
         Perform create method for RegisterAPIView.
         Check if phone number is verified before saving user.
+        The verification is consumed, so it registers a single user.
         """
         phone_number = self.request.data.get("phone_number")
-        try:
-            phone_token = PhoneToken.objects.get(phone_number=phone_number)
-        except PhoneToken.DoesNotExist:
-            raise ValidationError({"phone_number": "Phone number not found"})
-
-        if not phone_token.verified:
+        if not get_otp_backend().consume_verification(phone_number):
             raise ValidationError({"phone_number": "Phone number not verified"})
 
         serializer.save()
-        phone_token.delete()
+
+
+class LoginAPIView(TokenObtainPairView):
+    """
+    Login view returning access and refresh tokens.
+    Throttled per address and phone number, and password checks are capped across the workers.
+    """
+    throttle_classes = [IPTokenBucketThrottle, PhoneTokenBucketThrottle]
+    throttle_scope = 'login'
+
+    @concurrency_limit('login')
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
 
 
 class UserProfileAPIView(APIView):
@@ -110,7 +158,7 @@ class UserProfileAPIView(APIView):
     User profile view with first name, last name, and phone number
     """
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CustomJWTAuthentication]
 
     def get(self, request):
         """
@@ -123,3 +171,151 @@ class UserProfileAPIView(APIView):
             "last_name": user.last_name,
             "phone_number": user.phone_number,
         })
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncPasswordView(View):
+    """
+    Base of the async login and register views, meant to be served by config.asgi.
+    The request stays on the event loop, password hashing runs in the process pool
+    of apps.authentication.hashing and is refused with 503 when its queue is full.
+    Uses the same throttles and concurrency limit as the DRF views, subclasses implement handle().
+    """
+    throttle_classes = [IPTokenBucketThrottle, PhoneTokenBucketThrottle]
+    throttle_scope = None
+    # Name in CONCURRENCY_LIMITS, see apps.utils.decorator.concurrency_limit
+    concurrency_scope = None
+
+    async def post(self, request):
+        request = self.get_request(request)
+        throttled = self.check_throttles(request)
+        if throttled is not None:
+            return throttled
+
+        if self.concurrency_scope not in settings.CONCURRENCY_LIMITS:
+            return await self.handle(request)
+        limit = settings.CONCURRENCY_LIMITS[self.concurrency_scope]
+        key = await sync_to_async(acquire_slot)(self.concurrency_scope, limit)
+        if key is None:
+            return self.busy_response()
+        try:
+            return await self.handle(request)
+        finally:
+            await sync_to_async(release_slot)(key)
+
+    async def handle(self, request):
+        raise NotImplementedError
+
+    def get_request(self, request):
+        return Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES])
+
+    def check_throttles(self, request):
+        waits = []
+        for throttle in [throttle_class() for throttle_class in self.throttle_classes]:
+            if not throttle.allow_request(request, self):
+                waits.append(throttle.wait())
+        if not waits:
+            return None
+        retry_after = math.ceil(max(waits))
+        return JsonResponse(
+            {"detail": f"Request was throttled. Expected available in {retry_after} seconds."},
+            status=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def busy_response(self):
+        return JsonResponse(
+            {"error": "Server is busy, try again later"},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(settings.CONCURRENCY_RETRY_AFTER)},
+        )
+
+
+class AsyncLoginView(AsyncPasswordView):
+    """
+    Login view returning access and refresh tokens, same answers as LoginAPIView
+    """
+    throttle_scope = 'login'
+    concurrency_scope = 'login'
+
+    async def handle(self, request):
+        phone_number = request.data.get(User.USERNAME_FIELD)
+        password = request.data.get("password")
+        errors = {field: ["This field is required."] for field, value in
+                  ((User.USERNAME_FIELD, phone_number), ("password", password)) if not value}
+        if errors:
+            return JsonResponse(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user = await User.objects.filter(**{User.USERNAME_FIELD: phone_number}).afirst()
+        try:
+            if user is None:
+                # Hash anyway, so unknown numbers take as long as wrong passwords
+                await amake_password(password)
+                valid = False
+            else:
+                setter = self.get_password_setter(user)
+                valid = await acheck_password(password, user.password, setter) and user.is_active
+        except HashingQueueFull:
+            return self.busy_response()
+
+        if not valid:
+            return JsonResponse(
+                {"detail": "Incorrect authentication credentials."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        token = generate_jwt_token(user)
+        return JsonResponse({
+            "access_token": str(token.access_token),
+            "refresh_token": str(token),
+        })
+
+    @staticmethod
+    def get_password_setter(user):
+        """
+        Saves the password hashed with the preferred hasher, like the setter of AbstractBaseUser.check_password
+        """
+        async def setter(password):
+            try:
+                user.password = await amake_password(password)
+            except HashingQueueFull:
+                # Upgraded on a later login
+                return
+            await user.asave(update_fields=["password"])
+        return setter
+
+
+class AsyncRegisterView(AsyncPasswordView):
+    """
+    User register view with phone number verification, same answers as RegisterAPIView
+    """
+    throttle_scope = 'register'
+    concurrency_scope = 'register'
+
+    async def handle(self, request):
+        serializer = RegisterSerializer(data=request.data)
+        if not await sync_to_async(serializer.is_valid)():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            encoded_password = await amake_password(serializer.validated_data["password"])
+        except HashingQueueFull:
+            return self.busy_response()
+
+        try:
+            data = await sync_to_async(self.create_user)(serializer.validated_data["phone_number"], encoded_password)
+        except ValidationError as e:
+            return JsonResponse(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse(data, status=status.HTTP_201_CREATED)
+
+    def create_user(self, phone_number, encoded_password):
+        if not get_otp_backend().consume_verification(phone_number):
+            raise ValidationError({"phone_number": "Phone number not verified"})
+
+        user = User.objects.create(phone_number=phone_number, password=encoded_password)
+        token = generate_jwt_token(user)
+        return {
+            "phone_number": phone_number,
+            "access_token": str(token.access_token),
+            "refresh_token": str(token),
+        }
@@ -1,5 +1,24 @@
 from django.contrib import admin
+from apps.core.models import EncodingProfile, EncodingRendition
 from apps.participants.models import RepresentativeChildCamera
 
 
 admin.site.register(RepresentativeChildCamera)
+
+
+class EncodingRenditionInlines(admin.TabularInline):
+    """
+    Tabular Inline View for EncodingRendition
+    """
+    model = EncodingRendition
+    extra = 0
+
+
+@admin.register(EncodingProfile)
+class EncodingProfileAdmin(admin.ModelAdmin):
+    """
+    Admin View for EncodingProfile
+    """
+    inlines = [EncodingRenditionInlines]
+    list_display = ['name', 'hls_time', 'hls_list_size', 'preset']
+    search_fields = ['name']
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
@@ -7,3 +8,6 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         import apps.core.signals
+        import apps.utils.checks
+
+        post_migrate.connect(apps.core.signals.sync_access_status_after_migrate, sender=self)
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import re
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from apps.core.models import Camera
+from apps.core.services import bump_camera_user_versions, update_camera_access_status
+from apps.core.transcoding import RTSP_STREAM_PATH
+from apps.kindergarten.stats import apply_camera_status_deltas
+
+logger = logging.getLogger(__name__)
+
+RTSP_STATUS_RE = re.compile(rb'^RTSP/1\.\d (?P<code>\d{3})')
+
+
+async def probe_camera(ip, port, timeout):
+    """
+    Send an RTSP OPTIONS request to the camera and read the status line.
+    Any RTSP answer below 500 means the device is up, a 401 included:
+    the camera is reachable even if it wants credentials for this request.
+    Returns (healthy, reason).
+    """
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        request = (
+            f'OPTIONS rtsp://{ip}:{port}{RTSP_STREAM_PATH} RTSP/1.0\r\n'
+            f'CSeq: 1\r\n'
+            f'User-Agent: camera-health\r\n'
+            f'\r\n'
+        )
+        writer.write(request.encode())
+        await asyncio.wait_for(writer.drain(), timeout)
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+    except asyncio.TimeoutError:
+        return False, 'timeout'
+    except OSError as e:
+        return False, e.strerror or str(e)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    match = RTSP_STATUS_RE.match(status_line)
+    if match is None:
+        return False, 'not an RTSP response'
+    code = int(match.group('code'))
+    if code >= 500:
+        return False, f'RTSP {code}'
+    return True, f'RTSP {code}'
+
+
+class CameraHealthChecker:
+    """
+    Sweeps all cameras with concurrent RTSP probes and maintains Camera.status.
+    At most `concurrency` probes are open at the same time, each limited to `timeout` seconds,
+    so a sweep of the whole fleet takes about timeout * cameras / concurrency seconds at worst.
+    A camera changes status only after `failures` failed or `recoveries` successful probes in a row,
+    so one lost packet doesn't flap it. Changes are written with one bulk_update per sweep.
+    """
+
+    def __init__(self, concurrency, timeout, failures, recoveries):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.failures = failures
+        self.recoveries = recoveries
+        # camera_id -> number of consecutive probes contradicting the stored status
+        self.streaks = {}
+
+    def load_cameras(self):
+        return list(Camera.objects.only('id', 'ip', 'port', 'status'))
+
+    def save_statuses(self, cameras):
+        with transaction.atomic():
+            Camera.objects.bulk_update(cameras, ['status'])
+            # bulk_update sends no post_save, update the access index, the online camera counters
+            # and cached responses here
+            update_camera_access_status({camera.id: camera.status for camera in cameras})
+            apply_camera_status_deltas({camera.id: 1 if camera.status else -1 for camera in cameras})
+            bump_camera_user_versions([camera.id for camera in cameras])
+
+    async def probe_all(self, cameras):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def probe(camera):
+            async with semaphore:
+                return await probe_camera(camera.ip, camera.port, self.timeout)
+
+        return await asyncio.gather(*(probe(camera) for camera in cameras))
+
+    def apply_results(self, cameras, results):
+        """
+        Update the streaks with the probe results and return the cameras whose status flips
+        """
+        changed = []
+        for camera, (healthy, reason) in zip(cameras, results):
+            if healthy == camera.status:
+                self.streaks.pop(camera.id, None)
+                continue
+
+            streak = self.streaks.get(camera.id, 0) + 1
+            if streak < (self.recoveries if healthy else self.failures):
+                self.streaks[camera.id] = streak
+                continue
+
+            self.streaks.pop(camera.id, None)
+            camera.status = healthy
+            changed.append(camera)
+            logger.info('Camera %s is %s (%s)', camera.id, 'up' if healthy else 'down', reason)
+        return changed
+
+    async def sweep(self):
+        """
+        Probe every camera once, returns the sweep summary
+        """
+        started = time.monotonic()
+        cameras = await sync_to_async(self.load_cameras)()
+        results = await self.probe_all(cameras)
+
+        known = {camera.id for camera in cameras}
+        self.streaks = {camera_id: streak for camera_id, streak in self.streaks.items() if camera_id in known}
+
+        changed = self.apply_results(cameras, results)
+        if changed:
+            await sync_to_async(self.save_statuses)(changed)
+
+        return {
+            'cameras': len(cameras),
+            'healthy': sum(healthy for healthy, _ in results),
+            'changed': len(changed),
+            'duration': round(time.monotonic() - started, 2),
+        }
+
+    async def run(self, interval):
+        while True:
+            try:
+                summary = await self.sweep()
+            except Exception:
+                logger.exception('Camera health sweep failed')
+            else:
+                logger.info('Probed %(cameras)s cameras in %(duration)ss, %(healthy)s healthy, '
+                            '%(changed)s changed', summary)
+            await asyncio.sleep(interval)
@@ -0,0 +1,95 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from apps.core.models import UserCameraAccess
+from apps.core.serializers import UserCameraSerializer, UserCameraValuesSerializer
+from apps.participants.models import Child
+from apps.participants.serializers import ChildSerializer, ChildValuesSerializer
+from apps.utils.pagination import KeysetPagination
+from apps.utils import renderers
+from apps.utils.renderers import FastJSONRenderer
+
+# (endpoint, results key, queryset, DRF serializer, values serializer) of the list endpoints with a lean path
+ENDPOINTS = (
+    ('home', 'cameras', UserCameraAccess.objects.all(), UserCameraSerializer, UserCameraValuesSerializer),
+    ('children', 'children', Child.objects.all(), ChildSerializer, ChildValuesSerializer),
+)
+
+
+def serialize_objects(queryset, serializer_class, fields):
+    columns = serializer_class.get_select_columns(fields)
+    queryset = queryset.only(*KeysetPagination.ordering, *columns)
+    related = {column.rsplit('__', 1)[0] for column in columns if '__' in column}
+    if related:
+        queryset = queryset.select_related(*related)
+    return serializer_class(list(queryset), many=True, fields=fields).data
+
+
+def serialize_values(queryset, values_serializer_class, fields):
+    serializer = values_serializer_class(fields, offset=len(KeysetPagination.ordering))
+    return serializer.serialize(list(queryset.values_list(*KeysetPagination.ordering, *serializer.columns)))
+
+
+class Command(BaseCommand):
+    """
+    Compare the DRF serializers and JSONRenderer with the values_list() serializers and FastJSONRenderer
+    of the lean list endpoints on the rows in the database. The responses of every field selection
+    must be byte-identical, the command fails otherwise.
+    """
+    help = 'Benchmark the lean serialization of the list endpoints against the DRF serializers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500, help='Rows per response')
+        parser.add_argument('--repeat', type=int, default=20, help='Responses per measurement')
+
+    def measure(self, repeat, serialize, renderer, results_key):
+        serialize_time = render_time = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            results = serialize()
+            serialized = time.perf_counter()
+            content = renderer.render({results_key: results, 'next': None})
+            render_time += time.perf_counter() - serialized
+            serialize_time += serialized - started
+        return content, serialize_time * 1000 / repeat, render_time * 1000 / repeat
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        # Read on every run, not bound at import
+        encoder = 'orjson' if renderers.orjson is not None else 'json, orjson is not installed'
+        self.stdout.write(f'JSON encoder: {encoder}')
+
+        for endpoint, results_key, queryset, serializer_class, values_serializer_class in ENDPOINTS:
+            queryset = queryset.order_by(*KeysetPagination.ordering)[:options['rows']]
+            fields = serializer_class.get_selectable_fields()
+
+            # Every single field and all of them, as ?fields= selects them
+            for selection in [[field] for field in fields] + [fields]:
+                drf_content = JSONRenderer().render(
+                    {results_key: serialize_objects(queryset, serializer_class, selection), 'next': None}
+                )
+                lean_content = FastJSONRenderer().render(
+                    {results_key: serialize_values(queryset, values_serializer_class, selection), 'next': None}
+                )
+                if drf_content != lean_content:
+                    raise CommandError(f'{endpoint}: the responses with fields={",".join(selection)} differ')
+
+            drf_content, drf_serialize, drf_render = self.measure(
+                repeat, lambda: serialize_objects(queryset, serializer_class, fields), JSONRenderer(), results_key
+            )
+            lean_content, lean_serialize, lean_render = self.measure(
+                repeat, lambda: serialize_values(queryset, values_serializer_class, fields),
+                FastJSONRenderer(), results_key
+            )
+            rows = len(queryset)
+            self.stdout.write(
+                f'{endpoint}, {rows} rows, {len(drf_content)} bytes: '
+                f'DRF {drf_serialize:.2f} ms + {drf_render:.2f} ms render, '
+                f'lean {lean_serialize:.2f} ms + {lean_render:.2f} ms render'
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{endpoint}: byte-identical, speedup '
+                f'{(drf_serialize + drf_render) / max(lean_serialize + lean_render, 1e-9):.2f}x'
+            ))
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.core.health import CameraHealthChecker
+
+
+class Command(BaseCommand):
+    """
+    Probe the RTSP port of every camera and keep Camera.status up to date
+    """
+    help = 'Check the health of the cameras over RTSP, once or continuously'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Run a single sweep and exit')
+        parser.add_argument('--interval', type=float, default=settings.CAMERA_HEALTH_INTERVAL,
+                            help='Seconds between sweeps')
+        parser.add_argument('--concurrency', type=int, default=settings.CAMERA_HEALTH_CONCURRENCY,
+                            help='Maximum number of cameras probed at the same time')
+        parser.add_argument('--timeout', type=float, default=settings.CAMERA_HEALTH_TIMEOUT,
+                            help='Seconds a single probe may take')
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+        checker = CameraHealthChecker(
+            concurrency=options['concurrency'],
+            timeout=options['timeout'],
+            failures=settings.CAMERA_HEALTH_FAILURES,
+            recoveries=settings.CAMERA_HEALTH_RECOVERIES,
+        )
+        if not options['once']:
+            asyncio.run(checker.run(options['interval']))
+            return
+
+        summary = asyncio.run(checker.sweep())
+        self.stdout.write(self.style.SUCCESS(
+            f"Probed {summary['cameras']} cameras in {summary['duration']}s: "
+            f"{summary['healthy']} healthy, {summary['changed']} changed"
+        ))
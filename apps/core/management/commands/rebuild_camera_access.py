@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from apps.core.services import refresh_camera_access
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the UserCameraAccess index from the camera grants of all users
+    """
+    help = 'Rebuild the per-user camera access index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of users refreshed per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = get_user_model().objects.order_by('pk').values_list('pk', flat=True)
+
+        total = 0
+        batch = []
+        for user_id in user_ids.iterator(chunk_size=batch_size):
+            batch.append(user_id)
+            if len(batch) == batch_size:
+                refresh_camera_access(batch)
+                total += len(batch)
+                batch = []
+        refresh_camera_access(batch)
+        total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Camera access index rebuilt for {total} users'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.models import Camera
+from apps.core.provisioning import list_unit_camera_ids, reconcile
+
+
+class Command(BaseCommand):
+    """
+    Reconcile the systemd units of all cameras with the database, including units of deleted cameras
+    """
+    help = 'Reconcile camera stream services with the database'
+
+    def handle(self, *args, **options):
+        camera_ids = set(Camera.objects.values_list('pk', flat=True)) | list_unit_camera_ids()
+        result = reconcile(sorted(camera_ids))
+
+        self.stdout.write(
+            f"Changed: {len(result['changed'])}, unchanged: {len(result['unchanged'])}, "
+            f"removed: {len(result['removed'])}, failed: {len(result['errors'])}"
+        )
+        for camera_id, error in result['errors'].items():
+            self.stderr.write(f'Camera {camera_id}: {error}')
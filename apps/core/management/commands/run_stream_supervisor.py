@@ -0,0 +1,56 @@
+import asyncio
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.supervisor import StreamSupervisor
+
+
+class Command(BaseCommand):
+    """
+    Run the ffmpeg processes of all cameras from a single asyncio supervisor
+    """
+    help = 'Supervise the ffmpeg stream processes of the cameras'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-processes', type=int, default=settings.STREAM_SUPERVISOR_MAX_PROCESSES,
+                            help='Maximum number of concurrent transcodes on this host')
+        parser.add_argument('--refresh-interval', type=float, default=settings.STREAM_SUPERVISOR_REFRESH_INTERVAL,
+                            help='Seconds between reads of the camera list')
+        parser.add_argument('--status-file', default=settings.STREAM_SUPERVISOR_STATUS_FILE,
+                            help='JSON file the process status is written to')
+        parser.add_argument('--ffmpeg', default=None,
+                            help='ffmpeg binary to run instead of FFMPEG_BINARY, e.g. a fake script for testing')
+        parser.add_argument('--on-demand', action='store_true', default=settings.STREAM_ON_DEMAND,
+                            help='Transcode only cameras that are being watched')
+        parser.add_argument('--shard', default='0/1',
+                            help='Handle only cameras with id %% count == index, given as index/count')
+
+    def handle(self, *args, **options):
+        try:
+            index, count = (int(part) for part in options['shard'].split('/'))
+        except ValueError:
+            raise CommandError('--shard must be given as index/count, e.g. 0/2')
+        if not 0 <= index < count:
+            raise CommandError('--shard index must be between 0 and count - 1')
+
+        if settings.CAMERA_STREAM_BACKEND != 'supervisor':
+            self.stderr.write(self.style.WARNING(
+                "CAMERA_STREAM_BACKEND is not 'supervisor', cameras may also be running as systemd units"
+            ))
+
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+        supervisor = StreamSupervisor(
+            max_processes=options['max_processes'],
+            refresh_interval=options['refresh_interval'],
+            backoff_base=settings.STREAM_SUPERVISOR_BACKOFF_BASE,
+            backoff_max=settings.STREAM_SUPERVISOR_BACKOFF_MAX,
+            stable_after=settings.STREAM_SUPERVISOR_STABLE_AFTER,
+            status_file=options['status_file'],
+            ffmpeg_binary=options['ffmpeg'],
+            shard=(index, count),
+            on_demand=options['on_demand'],
+        )
+        asyncio.run(supervisor.run())
@@ -0,0 +1,288 @@
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+
+from apps.core.streaming import get_stream_camera_id
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the serve latency histogram
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Total of the shards of exited workers in METRICS_DIR
+EXITED_SHARD = 'exited.json'
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def merge_shards(shards):
+    """
+    Sum the counters of shards, returns (requests, bytes, latency) like the StreamMetrics attributes
+    """
+    requests, sizes, latency = Counter(), Counter(), {}
+    for shard in shards:
+        for kind, camera_id, status, value in shard['requests']:
+            requests[(kind, camera_id, status)] += value
+        for kind, camera_id, value in shard['bytes']:
+            sizes[(kind, camera_id)] += value
+        for kind, (buckets, total) in shard['latency'].items():
+            merged = latency.setdefault(kind, [[0] * len(buckets), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+    return requests, sizes, latency
+
+
+def to_shard(requests, sizes, latency):
+    return {
+        'requests': [[*key, value] for key, value in requests.items()],
+        'bytes': [[*key, value] for key, value in sizes.items()],
+        'latency': {kind: [list(buckets), total] for kind, (buckets, total) in latency.items()},
+    }
+
+
+def write_json(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as json_file:
+        json.dump(data, json_file)
+    os.replace(tmp_path, path)
+
+
+def get_shard_pid(path):
+    """
+    Pid of the worker that wrote the shard <pid>-<uuid>.json, None for other files
+    """
+    pid = os.path.basename(path).removesuffix('.json').split('-', 1)[0]
+    return int(pid) if pid.isdigit() else None
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def fold_exited_shards(metrics_dir, own_path):
+    """
+    Add the shards of exited workers to <METRICS_DIR>/exited.json and remove them, so the
+    directory holds one file per running worker plus the total of all exited ones.
+    Runs under an flock of <METRICS_DIR>/.lock, the names of the folded shards are kept
+    in exited.json until they are removed, so a shard is never added twice.
+    """
+    exited_path = os.path.join(metrics_dir, EXITED_SHARD)
+    with open(os.path.join(metrics_dir, '.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            with open(exited_path) as exited_file:
+                exited = json.load(exited_file)
+        except FileNotFoundError:
+            exited = {**to_shard(Counter(), Counter(), {}), 'folded': []}
+
+        folded = set(exited['folded'])
+        shards, names = [], []
+        for path in glob.glob(os.path.join(metrics_dir, '*.json')):
+            pid = get_shard_pid(path)
+            if path == own_path or pid is None or is_running(pid):
+                continue
+            name = os.path.basename(path)
+            if name not in folded:
+                try:
+                    with open(path) as shard_file:
+                        shards.append(json.load(shard_file))
+                except ValueError:
+                    # Torn by a crash, its counters are lost either way
+                    pass
+            names.append(name)
+        if not names:
+            return
+
+        total = to_shard(*merge_shards([exited, *shards]))
+        write_json(exited_path, {**total, 'folded': names})
+        for name in names:
+            os.remove(os.path.join(metrics_dir, name))
+        write_json(exited_path, {**total, 'folded': []})
+
+
+class StreamMetrics:
+    """
+    In-process counters of the stream endpoints.
+    Recording is a dict update under a lock. With METRICS_DIR set every process writes its
+    counters to <METRICS_DIR>/<pid>-<uuid>.json at most once per METRICS_FLUSH_INTERVAL seconds
+    and at exit, and the scrape sums the files of all workers. The uuid keeps a worker that got
+    the pid of an exited one from overwriting its shard. Counters are cumulative per process,
+    the scrape folds the shards of exited workers into exited.json, so the sums never go down.
+    A worker killed with SIGKILL loses the requests since its last write.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._shard_name = f'{self._pid}-{uuid.uuid4().hex}.json'
+        self._last_flush = time.monotonic()
+        # (kind, camera_id, status) -> requests
+        self.requests = Counter()
+        # (kind, camera_id) -> bytes
+        self.bytes = Counter()
+        # kind -> [count per bucket + one for +Inf, sum of seconds]
+        self.latency = {}
+
+    def observe(self, kind, camera_id, status, size, duration):
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked worker, the counters inherited from the parent belong to the parent's shard
+                self._reset()
+            self.requests[(kind, camera_id, status)] += 1
+            if size:
+                self.bytes[(kind, camera_id)] += size
+            histogram = self.latency.setdefault(kind, [[0] * (len(LATENCY_BUCKETS) + 1), 0.0])
+            index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if duration <= bound), len(LATENCY_BUCKETS))
+            histogram[0][index] += 1
+            histogram[1] += duration
+
+            flush = settings.METRICS_DIR and time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL
+            if flush:
+                self._last_flush = time.monotonic()
+                shard = self.snapshot()
+        if flush:
+            self.write_shard(shard)
+
+    def flush(self):
+        """
+        Write the shard now, registered with atexit so a worker's last requests are not lost
+        """
+        if not settings.METRICS_DIR:
+            return
+        with self._lock:
+            if os.getpid() != self._pid:
+                self._reset()
+            if not self.requests:
+                return
+            self._last_flush = time.monotonic()
+            shard = self.snapshot()
+        self.write_shard(shard)
+
+    def snapshot(self):
+        return to_shard(self.requests, self.bytes, self.latency)
+
+    def get_shard_path(self):
+        return os.path.join(settings.METRICS_DIR, self._shard_name)
+
+    def write_shard(self, shard):
+        try:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            write_json(self.get_shard_path(), shard)
+        except OSError as e:
+            logger.warning('Could not write the metrics shard: %s', e)
+
+    def collect(self):
+        """
+        Counters of this process merged with the shards of all other workers
+        """
+        with self._lock:
+            if os.getpid() != self._pid:
+                self._reset()
+            shards = [self.snapshot()]
+        if settings.METRICS_DIR:
+            own_path = self.get_shard_path()
+            try:
+                fold_exited_shards(settings.METRICS_DIR, own_path)
+            except OSError as e:
+                logger.warning('Could not fold the metrics shards of exited workers: %s', e)
+            for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+                if path == own_path:
+                    continue
+                try:
+                    with open(path) as shard_file:
+                        shards.append(json.load(shard_file))
+                except (OSError, ValueError):
+                    continue
+        return merge_shards(shards)
+
+
+stream_metrics = StreamMetrics()
+atexit.register(stream_metrics.flush)
+
+
+class StreamMetricsMixin:
+    """
+    Records requests, bytes and latency of a stream view.
+    The camera is taken from the camera_id or file_name url argument.
+    Bytes are those sent by Django, files handed to the front proxy with STREAM_OFFLOAD count as 0.
+    """
+    metrics_kind = None
+
+    def dispatch(self, request, *args, **kwargs):
+        started = time.perf_counter()
+        response = super().dispatch(request, *args, **kwargs)
+        duration = time.perf_counter() - started
+
+        camera_id = kwargs.get('camera_id')
+        if camera_id is None:
+            camera_id = get_stream_camera_id(kwargs.get('file_name', ''))
+        if camera_id is not None:
+            size = 0
+            if response.status_code in (200, 206):
+                if response.streaming:
+                    size = int(response.get('Content-Length', 0))
+                else:
+                    size = len(response.content)
+            stream_metrics.observe(self.metrics_kind, camera_id, response.status_code, size, duration)
+        return response
+
+
+def render_metrics(viewer_counts):
+    """
+    Prometheus text exposition of the merged stream metrics and the current viewers
+    """
+    requests, sizes, latency = stream_metrics.collect()
+    lines = [
+        '# HELP stream_viewers Viewers currently watching the camera.',
+        '# TYPE stream_viewers gauge',
+    ]
+    lines += [f'stream_viewers{{camera="{camera_id}"}} {count}' for camera_id, count in sorted(viewer_counts.items())]
+
+    lines += [
+        '# HELP stream_requests_total Requests to the stream endpoints.',
+        '# TYPE stream_requests_total counter',
+    ]
+    lines += [
+        f'stream_requests_total{{kind="{kind}",camera="{camera_id}",code="{status}"}} {value}'
+        for (kind, camera_id, status), value in sorted(requests.items())
+    ]
+
+    lines += [
+        '# HELP stream_bytes_served_total Response bytes sent by the stream endpoints.',
+        '# TYPE stream_bytes_served_total counter',
+    ]
+    lines += [
+        f'stream_bytes_served_total{{kind="{kind}",camera="{camera_id}"}} {value}'
+        for (kind, camera_id), value in sorted(sizes.items())
+    ]
+
+    lines += [
+        '# HELP stream_request_duration_seconds Time spent serving stream requests.',
+        '# TYPE stream_request_duration_seconds histogram',
+    ]
+    for kind, (buckets, total) in sorted(latency.items()):
+        cumulative = 0
+        for bound, count in zip((*LATENCY_BUCKETS, '+Inf'), buckets):
+            cumulative += count
+            lines.append(f'stream_request_duration_seconds_bucket{{kind="{kind}",le="{bound}"}} {cumulative}')
+        lines.append(f'stream_request_duration_seconds_sum{{kind="{kind}"}} {total}')
+        lines.append(f'stream_request_duration_seconds_count{{kind="{kind}"}} {cumulative}')
+    return '\n'.join(lines) + '\n'
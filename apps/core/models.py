@@ -1,13 +1,77 @@
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils.translation import gettext_lazy as _
 
 from apps.utils.abs_model import AbstractBaseModel
 
 
+class EncodingProfile(AbstractBaseModel):
+    """
+    HLS encoding settings shared by cameras.
+    The renditions of the profile make up the bitrate ladder.
+    """
+    name = models.CharField(max_length=255)
+    hls_time = models.PositiveSmallIntegerField(default=1, help_text='Segment length in seconds')
+    hls_list_size = models.PositiveSmallIntegerField(default=3, help_text='Number of segments in a playlist')
+    preset = models.CharField(max_length=20, default='ultrafast', help_text='libx264 preset of encoded renditions')
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = 'Encoding Profile'
+        verbose_name_plural = 'Encoding Profiles'
+
+
+class EncodingRendition(AbstractBaseModel):
+    """
+    One rung of the bitrate ladder of an encoding profile.
+    A passthrough rendition copies the H.264 stream of the camera as-is,
+    its size and bitrate describe the camera stream.
+    """
+    profile = models.ForeignKey(EncodingProfile, on_delete=models.CASCADE, related_name='renditions')
+    position = models.PositiveSmallIntegerField(default=0, help_text='Order in the ladder, lowest first')
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    bitrate = models.PositiveIntegerField(help_text='Video bitrate in kbit/s')
+    passthrough = models.BooleanField(
+        default=False,
+        help_text='Copy the stream of the camera instead of re-encoding it. The camera must send H.264.'
+    )
+
+    def clean(self):
+        """
+        Check that the profile has only one passthrough rendition
+        """
+        if self.passthrough and EncodingRendition.objects.filter(
+                profile_id=self.profile_id, passthrough=True
+        ).exclude(pk=self.pk).exists():
+            raise ValidationError(_('A profile can only have one passthrough rendition'))
+
+    def __str__(self):
+        return f'{self.profile} - {self.width}x{self.height} {self.bitrate}k'
+
+    class Meta:
+        verbose_name = 'Encoding Rendition'
+        verbose_name_plural = 'Encoding Renditions'
+        ordering = ['position', 'id']
+        unique_together = ('profile', 'position')
+
+
 class Camera(AbstractBaseModel):
     """
     Camera model to store camera information
+    provisioning_state reports whether the ffmpeg service of the camera matches its settings
     """
+    class ProvisioningState(models.TextChoices):
+        """
+        Provisioning states of the camera stream service
+        """
+        PENDING = 'pending', 'Pending'
+        PROVISIONED = 'provisioned', 'Provisioned'
+        FAILED = 'failed', 'Failed'
+
     name = models.CharField(max_length=255)
     ip = models.GenericIPAddressField()
     port = models.IntegerField()
@@ -17,6 +81,24 @@ class Camera(AbstractBaseModel):
 
     status = models.BooleanField(default=True)
 
+    encoding_profile = models.ForeignKey(
+        EncodingProfile,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='cameras',
+        help_text='Leave empty to use the default 360p/720p ladder'
+    )
+
+    provisioning_state = models.CharField(
+        max_length=20,
+        choices=ProvisioningState.choices,
+        default=ProvisioningState.PENDING,
+        editable=False
+    )
+    provisioning_error = models.TextField(blank=True, editable=False)
+    provisioned_at = models.DateTimeField(null=True, blank=True, editable=False)
+
     def __str__(self):
         return f'{self.name} - {self.ip}:{self.port}'
 
@@ -25,6 +107,30 @@ class Camera(AbstractBaseModel):
         verbose_name_plural = 'Cameras'
 
 
+class UserCameraAccess(AbstractBaseModel):
+    """
+    Denormalized index of the cameras each user can watch.
+    It is maintained from RepresentativeChildCamera and RepresentativeChild signals,
+    so the home endpoint reads it without joins.
+    status is a copy of Camera.status, updated with the camera by the health prober and Camera saves.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='camera_access')
+    camera = models.ForeignKey(Camera, on_delete=models.CASCADE, related_name='user_access')
+    status = models.BooleanField(default=True, editable=False)
+
+    def __str__(self):
+        return f'{self.user_id} - {self.camera_id}'
+
+    class Meta:
+        verbose_name = 'User Camera Access'
+        verbose_name_plural = 'User Camera Access'
+        unique_together = ('user', 'camera')
+        indexes = [
+            # Keyset pagination of the cameras of a user
+            models.Index(fields=['user', 'created_at', 'id'], name='camera_access_keyset_idx'),
+        ]
+
+
 # class CameraUser(AbstractBaseModel):
 #     camera = models.ForeignKey(Camera, on_delete=models.CASCADE, related_name='users')
 #
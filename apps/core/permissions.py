@@ -0,0 +1,37 @@
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+from apps.core.models import UserCameraAccess
+from apps.core.streaming import get_stream_camera_id
+
+
+class HasStreamFileAccess(BasePermission):
+    """
+    Allows access only to the stream files of cameras the user can watch.
+    The camera is taken from the camera_id or file_name url argument.
+    """
+
+    def has_permission(self, request, view):
+        camera_id = view.kwargs.get('camera_id')
+        if camera_id is None:
+            camera_id = get_stream_camera_id(view.kwargs.get('file_name', ''))
+        if camera_id is None:
+            return False
+        return UserCameraAccess.objects.filter(user_id=request.user.id, camera_id=camera_id).exists()
+
+
+class IsMetricsClient(BasePermission):
+    """
+    Allows access only to scrapers sending METRICS_TOKEN as a bearer token, e.g. the Prometheus server.
+    The client address can't be trusted for this, behind the front proxy every request comes from 127.0.0.1.
+    Nobody can scrape while METRICS_TOKEN is not set.
+    """
+
+    def has_permission(self, request, view):
+        if not settings.METRICS_TOKEN:
+            return False
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        expected = settings.METRICS_TOKEN.encode()
+        return scheme.lower() == 'bearer' and hmac.compare_digest(token.strip().encode(), expected)
@@ -0,0 +1,240 @@
+import logging
+import os
+import re
+import shlex
+import subprocess
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from apps.core.models import Camera
+from apps.core.transcoding import build_ffmpeg_command
+
+logger = logging.getLogger(__name__)
+
+UNIT_NAME_RE = re.compile(r'^camera_(?P<camera_id>\d+)\.service$')
+
+UNIT_TEMPLATE = """[Unit]
+Description=FFmpeg stream for camera {camera_id}
+After=network.target
+
+[Service]
+ExecStart={exec_start}
+Restart=always
+
+[Install]
+WantedBy=multi-user.target
+"""
+
+
+class ProvisioningError(Exception):
+    pass
+
+
+def get_unit_name(camera_id):
+    return f"camera_{camera_id}.service"
+
+
+def get_unit_path(camera_id):
+    return os.path.join(settings.CAMERA_UNIT_DIR, get_unit_name(camera_id))
+
+
+def list_unit_camera_ids():
+    """
+    Ids of the cameras that have a unit file on disk
+    """
+    try:
+        names = os.listdir(settings.CAMERA_UNIT_DIR)
+    except FileNotFoundError:
+        return set()
+    return {int(match.group('camera_id')) for match in map(UNIT_NAME_RE.match, names) if match}
+
+
+def render_unit(camera):
+    """
+    Desired content of the systemd unit of the camera.
+    systemd expands % specifiers and $ variables in ExecStart, so both are escaped.
+    """
+    exec_start = shlex.join(build_ffmpeg_command(camera)).replace('%', '%%').replace('$', '$$')
+    return UNIT_TEMPLATE.format(camera_id=camera.id, exec_start=exec_start)
+
+
+def read_unit(path):
+    try:
+        with open(path) as unit_file:
+            return unit_file.read()
+    except FileNotFoundError:
+        return None
+
+
+def write_unit(path, content):
+    # Write next to the unit and rename, so systemd never reads a half written file
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as unit_file:
+        unit_file.write(content)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def systemctl(*args):
+    try:
+        subprocess.run(['systemctl', *args], check=True, text=True, capture_output=True)
+    except FileNotFoundError:
+        raise ProvisioningError('systemctl is not available')
+    except subprocess.CalledProcessError as e:
+        raise ProvisioningError(f"systemctl {' '.join(args)} failed: {e.stderr.strip()}")
+
+
+def reconcile(camera_ids):
+    """
+    Bring the unit files of the given cameras in line with the database.
+    Unchanged units are left alone, removed cameras lose their unit
+    and systemd is reloaded once for the whole batch.
+    The outcome is written back to Camera.provisioning_state.
+    With the supervisor backend no unit is desired, so existing units are removed.
+    """
+    cameras = {}
+    if settings.CAMERA_STREAM_BACKEND == 'systemd':
+        queryset = Camera.objects.filter(pk__in=camera_ids).select_related(
+            'encoding_profile'
+        ).prefetch_related('encoding_profile__renditions')
+        cameras = {camera.id: camera for camera in queryset}
+    changed, unchanged, removed = [], [], []
+    errors = {}
+
+    for camera_id in camera_ids:
+        path = get_unit_path(camera_id)
+        current = read_unit(path)
+        camera = cameras.get(camera_id)
+
+        if camera is None:
+            if current is not None:
+                removed.append(camera_id)
+            continue
+
+        desired = render_unit(camera)
+        if desired == current:
+            unchanged.append(camera_id)
+            continue
+
+        try:
+            write_unit(path, desired)
+        except OSError as e:
+            errors[camera_id] = f'Could not write {path}: {e}'
+            continue
+        changed.append(camera_id)
+
+    for camera_id in removed:
+        try:
+            systemctl('disable', '--now', get_unit_name(camera_id))
+        except ProvisioningError as e:
+            logger.warning('Could not stop the service of camera %s: %s', camera_id, e)
+        try:
+            os.remove(get_unit_path(camera_id))
+        except OSError as e:
+            logger.error('Could not remove the unit of camera %s: %s', camera_id, e)
+
+    if changed or removed:
+        try:
+            systemctl('daemon-reload')
+        except ProvisioningError as e:
+            errors.update({camera_id: str(e) for camera_id in changed})
+            changed = []
+
+    if changed:
+        os.makedirs(settings.STREAM_ROOT, exist_ok=True)
+
+    for camera_id in changed:
+        unit_name = get_unit_name(camera_id)
+        try:
+            systemctl('enable', unit_name)
+            systemctl('restart', unit_name)
+        except ProvisioningError as e:
+            errors[camera_id] = str(e)
+
+    report_states(
+        provisioned=[camera_id for camera_id in changed if camera_id not in errors],
+        unchanged=unchanged,
+        errors=errors,
+    )
+    return {'changed': changed, 'unchanged': unchanged, 'removed': removed, 'errors': errors}
+
+
+def report_states(provisioned, unchanged, errors):
+    """
+    Write the provisioning outcome back onto the cameras without triggering their signals
+    """
+    if provisioned:
+        Camera.objects.filter(pk__in=provisioned).update(
+            provisioning_state=Camera.ProvisioningState.PROVISIONED,
+            provisioning_error='',
+            provisioned_at=timezone.now(),
+        )
+    if unchanged:
+        Camera.objects.filter(pk__in=unchanged).exclude(
+            provisioning_state=Camera.ProvisioningState.PROVISIONED
+        ).update(
+            provisioning_state=Camera.ProvisioningState.PROVISIONED,
+            provisioning_error='',
+        )
+    for camera_id, error in errors.items():
+        logger.error('Provisioning of camera %s failed: %s', camera_id, error)
+        Camera.objects.filter(pk=camera_id).update(
+            provisioning_state=Camera.ProvisioningState.FAILED,
+            provisioning_error=error,
+        )
+
+
+class CameraProvisioner:
+    """
+    Background worker reconciling camera units.
+    Cameras queued within CAMERA_PROVISIONING_DEBOUNCE seconds are handled as one batch,
+    so a bulk edit in the admin causes a single daemon-reload.
+    """
+
+    def __init__(self):
+        self._pending = set()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def enqueue(self, camera_ids):
+        with self._condition:
+            self._pending.update(camera_ids)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='camera-provisioner', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+
+            # Let a burst of saves settle before taking the batch
+            time.sleep(settings.CAMERA_PROVISIONING_DEBOUNCE)
+
+            with self._condition:
+                batch, self._pending = sorted(self._pending), set()
+            try:
+                reconcile(batch)
+            except Exception:
+                logger.exception('Provisioning of cameras %s failed', batch)
+            finally:
+                connections.close_all()
+
+
+provisioner = CameraProvisioner()
+
+
+def schedule_provisioning(camera_ids):
+    """
+    Queue cameras for the background worker once the current transaction commits
+    """
+    if not settings.CAMERA_PROVISIONING_ENABLED or settings.CAMERA_STREAM_BACKEND != 'systemd':
+        return
+    camera_ids = list(camera_ids)
+    transaction.on_commit(lambda: provisioner.enqueue(camera_ids))
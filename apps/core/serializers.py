@@ -1,31 +1,70 @@
-from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers
 
-from apps.participants.models import RepresentativeChildCamera as UserCamera
+from apps.core.models import UserCameraAccess
+from apps.core.transcoding import get_rendition_file_name
+from apps.utils.serializers import SelectableFieldsMixin, ValuesSerializer, get_url_template
 
+# Camera id reversed into the stream urls, long enough not to appear in the routes otherwise
+CAMERA_ID_PLACEHOLDER = 987654321987654321
 
-class UserCameraSerializer(serializers.ModelSerializer):
+
+class UserCameraSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     """
-    Serializer for the UserCamera model.
+    Serializer for the UserCameraAccess index.
+    Only camera_id and the status copied from the camera are read, ?fields= narrows them further.
 
     Methods:
+        get_master_file(self, obj)
+            Generates the url of the master playlist listing all renditions of a specific camera.
         get_low_quality_file(self, obj)
-            Generates the file name for the low-quality video file corresponding to a specific camera.
+            Generates the url of the first rendition's playlist, for clients without the master playlist.
         get_high_quality_file(self, obj)
-            Generates the file name for the high-quality video file corresponding to a specific camera.
+            Generates the url of the second rendition's playlist, for clients without the master playlist.
     """
+    master_file = serializers.SerializerMethodField()
     low_quality_file = serializers.SerializerMethodField()
     high_quality_file = serializers.SerializerMethodField()
 
     class Meta:
-        model = UserCamera
+        model = UserCameraAccess
+
+        fields = ['camera', 'status', 'master_file', 'low_quality_file', 'high_quality_file']
+        field_columns = {
+            'master_file': ['camera'],
+            'low_quality_file': ['camera'],
+            'high_quality_file': ['camera'],
+        }
 
-        fields = ['camera', 'low_quality_file', 'high_quality_file']
+    def get_master_file(self, obj):
+        return reverse('get_master_playlist', args=[obj.camera_id])
 
     def get_low_quality_file(self, obj):
-        file_path = f"cameras/camera_{obj.camera.id}_0.m3u8"
-        return f"{settings.MEDIA_URL}{file_path}"
+        return reverse('get_m3u8_url', args=[get_rendition_file_name(obj.camera_id, 0)])
 
     def get_high_quality_file(self, obj):
-        file_path = f"cameras/camera_{obj.camera.id}_1.m3u8"
-        return f"{settings.MEDIA_URL}{file_path}"
+        return reverse('get_m3u8_url', args=[get_rendition_file_name(obj.camera_id, 1)])
+
+
+class UserCameraValuesSerializer(ValuesSerializer):
+    """
+    Lean read path of UserCameraSerializer for the home endpoint, the file urls are formatted
+    from camera_id without the method fields.
+    """
+
+    def get_value_fields(self):
+        # reverse() runs once instead of per row
+        head, tail = get_url_template('get_master_playlist', CAMERA_ID_PLACEHOLDER)
+        low_head, low_tail = get_url_template(
+            'get_m3u8_url', CAMERA_ID_PLACEHOLDER, args=[get_rendition_file_name(CAMERA_ID_PLACEHOLDER, 0)]
+        )
+        high_head, high_tail = get_url_template(
+            'get_m3u8_url', CAMERA_ID_PLACEHOLDER, args=[get_rendition_file_name(CAMERA_ID_PLACEHOLDER, 1)]
+        )
+        return {
+            'camera': ('camera_id', None),
+            'status': ('status', None),
+            'master_file': ('camera_id', lambda camera_id: f'{head}{camera_id}{tail}'),
+            'low_quality_file': ('camera_id', lambda camera_id: f'{low_head}{camera_id}{low_tail}'),
+            'high_quality_file': ('camera_id', lambda camera_id: f'{high_head}{camera_id}{high_tail}'),
+        }
@@ -0,0 +1,106 @@
+import threading
+
+from django.db import transaction
+
+from apps.core.models import UserCameraAccess
+from apps.participants.models import RepresentativeChild, RepresentativeChildCamera
+from apps.utils.response_cache import bump_user_versions
+
+_pending = threading.local()
+
+
+def refresh_camera_access(user_ids) -> None:
+    """
+    Bring the UserCameraAccess index of the given users in line with their camera grants.
+    Only the difference is written, in a fixed number of queries for the whole batch.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+
+    # (user id, camera id) -> camera status
+    desired = {
+        (user_id, camera_id): status
+        for user_id, camera_id, status in RepresentativeChildCamera.objects.filter(
+            representative_child__representative_id__in=user_ids
+        ).values_list('representative_child__representative_id', 'camera_id', 'camera__status')
+    }
+    current = {
+        (user_id, camera_id): pk
+        for pk, user_id, camera_id in UserCameraAccess.objects.filter(
+            user_id__in=user_ids
+        ).values_list('id', 'user_id', 'camera_id')
+    }
+
+    stale = {pair: pk for pair, pk in current.items() if pair not in desired}
+    if stale:
+        UserCameraAccess.objects.filter(pk__in=stale.values()).delete()
+
+    missing = desired.keys() - current.keys()
+    if missing:
+        UserCameraAccess.objects.bulk_create(
+            [UserCameraAccess(user_id=user_id, camera_id=camera_id, status=desired[user_id, camera_id])
+             for user_id, camera_id in missing],
+            ignore_conflicts=True,
+        )
+
+    # The home responses of users whose cameras changed are outdated
+    bump_user_versions({user_id for user_id, _ in stale} | {user_id for user_id, _ in missing})
+
+
+def update_camera_access_status(camera_statuses) -> None:
+    """
+    Copy {camera id: status} to the UserCameraAccess rows of the cameras, one UPDATE per status
+    """
+    for status in (True, False):
+        camera_ids = [camera_id for camera_id, camera_status in camera_statuses.items() if camera_status == status]
+        if camera_ids:
+            UserCameraAccess.objects.filter(camera_id__in=camera_ids).exclude(status=status).update(status=status)
+
+
+def sync_camera_access_status() -> int:
+    """
+    Fix the UserCameraAccess rows whose status differs from their camera's, e.g. rows made before
+    the status was copied. Returns the number of rows changed.
+    """
+    return sum(
+        UserCameraAccess.objects.filter(camera__status=status).exclude(status=status).update(status=status)
+        for status in (True, False)
+    )
+
+
+def bump_camera_user_versions(camera_ids) -> None:
+    """
+    Outdate the cached responses of the users who can watch the cameras
+    """
+    bump_user_versions(
+        UserCameraAccess.objects.filter(camera_id__in=camera_ids).values_list('user_id', flat=True).distinct()
+    )
+
+
+def schedule_camera_access_refresh(user_ids=(), representative_child_ids=()) -> None:
+    """
+    Queue users for an index refresh once the current transaction commits.
+    Changes made in one transaction, e.g. a cascade delete, are refreshed in a single batch.
+    """
+    if not hasattr(_pending, 'user_ids'):
+        _pending.user_ids, _pending.representative_child_ids = set(), set()
+    _pending.user_ids.update(user_ids)
+    _pending.representative_child_ids.update(representative_child_ids)
+    transaction.on_commit(_flush_camera_access)
+
+
+def _flush_camera_access() -> None:
+    user_ids, representative_child_ids = _pending.user_ids, _pending.representative_child_ids
+    if not user_ids and not representative_child_ids:
+        return
+    _pending.user_ids, _pending.representative_child_ids = set(), set()
+
+    if representative_child_ids:
+        # Links deleted in the same transaction are covered by their own post_delete signal
+        user_ids.update(
+            RepresentativeChild.objects.filter(
+                pk__in=representative_child_ids
+            ).values_list('representative_id', flat=True)
+        )
+    refresh_camera_access(user_ids)
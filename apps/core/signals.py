@@ -1,89 +1,146 @@
-import os
-import subprocess
+import sys
 
-from django.conf import settings
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from apps.core.models import Camera
+from apps.core.models import Camera, EncodingProfile, EncodingRendition
+from apps.core.provisioning import schedule_provisioning
+from apps.core.services import (
+    bump_camera_user_versions, schedule_camera_access_refresh, sync_camera_access_status, update_camera_access_status
+)
+from apps.core.transcoding import invalidate_master_playlists
+from apps.participants.models import Child, RepresentativeChild, RepresentativeChildCamera
+from apps.utils.response_cache import bump_user_versions
 
 
-def run_command(command):
-    try:
-        result = subprocess.run(command, shell=True, check=True, text=True, stderr=subprocess.PIPE)
-        return result
-    except subprocess.CalledProcessError as e:
-        print(f"Command failed: {command}\nError: {e.stderr}")
+# Fields the ffmpeg service of a camera is built from
+STREAM_FIELDS = ('ip', 'port', 'username', 'password', 'encoding_profile')
+
+
+@receiver(pre_save, sender=Camera)
+def mark_camera_pending(sender, instance, **kwargs):
+    """
+    Mark the camera as pending when it is new or a field used by its stream service changed.
+    Saves that only touch e.g. name or status don't reprovision the camera.
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not set(update_fields).intersection(STREAM_FIELDS):
+        instance._provisioning_required = False
+        return
+
+    attnames = [sender._meta.get_field(field).attname for field in STREAM_FIELDS]
+    old = None
+    if instance.pk is not None:
+        old = sender.objects.filter(pk=instance.pk).values(*attnames).first()
+
+    instance._provisioning_required = old is None or any(
+        old[attname] != getattr(instance, attname) for attname in attnames
+    )
+    if instance._provisioning_required:
+        instance.provisioning_state = Camera.ProvisioningState.PENDING
 
 
 @receiver(post_save, sender=Camera)
-def create_service_file(sender, instance, **kwargs):
-    print('keldi')
-    camera_folder = os.path.join(settings.MEDIA_ROOT, f"cameras/camera_{instance.id}")
+def provision_camera(sender, instance, **kwargs):
+    """
+    Hand the camera over to the background provisioner instead of running systemctl here
+    """
+    if getattr(instance, '_provisioning_required', False):
+        invalidate_master_playlists([instance.pk])
+        schedule_provisioning([instance.pk])
 
-    os.makedirs(camera_folder, exist_ok=True)
 
-    output_file = os.path.join(camera_folder, f"camera_{instance.id}_%v.m3u8")
+@receiver(post_delete, sender=Camera)
+def deprovision_camera(sender, instance, **kwargs):
+    """
+    The provisioner removes the unit of cameras that no longer exist
+    """
+    invalidate_master_playlists([instance.pk])
+    schedule_provisioning([instance.pk])
 
-    service_name = f"camera_{instance.id}.service"
-    service_path = f"/etc/systemd/system/{service_name}"
 
-    rtsp_url = f"rtsp://{instance.username}:{instance.password}@{instance.ip}:{instance.port}/Streaming/Channels/101"
+@receiver(post_save, sender=EncodingProfile)
+def provision_profile_cameras(sender, instance, **kwargs):
+    """
+    Reprovision the cameras using the profile after its settings changed
+    """
+    camera_ids = list(instance.cameras.values_list('pk', flat=True))
+    invalidate_master_playlists(camera_ids)
+    schedule_provisioning(camera_ids)
+
 
-    service_content = f"""
-    [Unit]
-    Description=FFmpeg stream for Camera {instance.name}
-    After=network.target
+@receiver(post_save, sender=EncodingRendition)
+@receiver(post_delete, sender=EncodingRendition)
+def provision_rendition_cameras(sender, instance, **kwargs):
+    """
+    Reprovision the cameras using the profile after its ladder changed
+    """
+    camera_ids = list(Camera.objects.filter(encoding_profile_id=instance.profile_id).values_list('pk', flat=True))
+    invalidate_master_playlists(camera_ids)
+    schedule_provisioning(camera_ids)
 
-    [Service]
-    ExecStart=/usr/bin/ffmpeg -rtsp_transport tcp -i {rtsp_url} \\
-        -c:v libx264 -preset ultrafast -tune zerolatency \\
-        -map 0:v:0 -b:v:0 500k -s:v:0 640x360 \\
-        -map 0:v:0 -b:v:1 1000k -s:v:1 1280x720 \\
-        -f hls -hls_time 1 -hls_list_size 3 -hls_flags delete_segments \\
-        -var_stream_map "v:0,name:low v:1,name:high" {output_file}
-    Restart=always
 
-    [Install]
-    WantedBy=multi-user.target
+@receiver(post_save, sender=RepresentativeChildCamera)
+@receiver(post_delete, sender=RepresentativeChildCamera)
+def update_camera_access_for_grant(sender, instance, **kwargs):
+    """
+    Refresh the camera access index of the representative the grant belongs to
     """
+    schedule_camera_access_refresh(representative_child_ids=[instance.representative_child_id])
 
-    try:
-        with open(service_path, "w") as service_file:
-            service_file.write(service_content)
 
-        os.chmod(service_path, 0o644)
+@receiver(post_save, sender=RepresentativeChild)
+@receiver(post_delete, sender=RepresentativeChild)
+def update_camera_access_for_representative(sender, instance, **kwargs):
+    """
+    Refresh the camera access index of the representative when a child link changes
+    """
+    schedule_camera_access_refresh(user_ids=[instance.representative_id])
 
-        subprocess.run("systemctl daemon-reload", shell=True, check=True)
-        subprocess.run(f"systemctl enable {service_name}", shell=True, check=True)
-        subprocess.run(f"systemctl start {service_name}", shell=True, check=True)
 
-        print(f"Service for camera {instance.name} created and started successfully.")
+def sync_access_status_after_migrate(sender, verbosity=1, stdout=None, **kwargs):
+    """
+    Copy the camera status to the access rows made before it was copied, on every migrate.
+    Connected in CoreConfig.ready().
+    """
+    changed = sync_camera_access_status()
+    if changed and verbosity >= 1:
+        (stdout or sys.stdout).write(f'  Copied the camera status to {changed} camera access rows\n')
 
-    except PermissionError:
-        print(
-            f"Permission denied while creating service file for {instance.name}. Run the script with superuser privileges.")
-    except Exception as e:
-        print(f"Error while creating service file for {instance.name}: {str(e)}")
 
+@receiver(post_save, sender=Camera)
+def copy_camera_status(sender, instance, created, **kwargs):
+    """
+    Copy the status to the camera access rows, the home endpoint reads it from there
+    """
+    update_fields = kwargs.get('update_fields')
+    if created or (update_fields is not None and 'status' not in update_fields):
+        return
+    update_camera_access_status({instance.pk: instance.status})
 
-@receiver(pre_delete, sender=Camera)
-def delete_service_file(sender, instance, **kwargs):
-    service_name = f"camera_{instance.id}.service"
-    service_path = f"/etc/systemd/system/{service_name}"
 
-    try:
-        run_command(f"systemctl stop {service_name}")
-        run_command(f"systemctl disable {service_name}")
+@receiver(post_save, sender=Camera)
+@receiver(pre_delete, sender=Camera)
+def outdate_camera_responses(sender, instance, **kwargs):
+    """
+    Outdate the cached home responses showing the camera, before a delete removes the access rows
+    """
+    bump_camera_user_versions([instance.pk])
 
-        if os.path.exists(service_path):
-            os.remove(service_path)
 
-        run_command("systemctl daemon-reload")
+@receiver(post_save, sender=RepresentativeChild)
+@receiver(post_delete, sender=RepresentativeChild)
+def outdate_representative_responses(sender, instance, **kwargs):
+    """
+    Outdate the cached children responses of the representative.
+    Changes of the grants reach the home responses through the camera access refresh.
+    """
+    bump_user_versions([instance.representative_id])
 
-        print(f"Service for camera {instance.name} deleted successfully.")
 
-    except PermissionError:
-        print(
-            f"Permission denied while deleting service file for {instance.name}. Run the script with superuser privileges.")
-    except Exception as e:
-        print(f"Error while deleting service file for {instance.name}: {str(e)}")
+@receiver(post_save, sender=Child)
+@receiver(post_delete, sender=Child)
+def outdate_child_responses(sender, instance, **kwargs):
+    """
+    Outdate the cached children responses of the child's representatives
+    """
+    bump_user_versions(instance.representatives.values_list('representative_id', flat=True))
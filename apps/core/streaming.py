@@ -0,0 +1,261 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+# Every file written for a camera is named camera_<id>_..., e.g. camera_12_0.m3u8
+STREAM_FILE_RE = re.compile(r'^camera_(?P<camera_id>\d+)_[\w.-]+$')
+RANGE_RE = re.compile(r'^bytes=(?P<start>\d*)-(?P<end>\d*)$')
+
+PLAYLIST_CONTENT_TYPE = 'application/vnd.apple.mpegurl'
+PLAYLIST_EXTENSIONS = ('.m3u8',)
+SEGMENT_CONTENT_TYPES = {
+    '.ts': 'video/mp2t',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4',
+}
+
+OFFLOAD_X_ACCEL_REDIRECT = 'x-accel-redirect'
+OFFLOAD_X_SENDFILE = 'x-sendfile'
+
+
+def get_stream_camera_id(file_name):
+    """
+    Return the id of the camera a stream file belongs to, or None for unknown names
+    """
+    match = STREAM_FILE_RE.match(file_name)
+    if match is None:
+        return None
+    return int(match.group('camera_id'))
+
+
+def get_stream_file_path(file_name):
+    """
+    Return the absolute path of a stream file inside STREAM_ROOT.
+    Returns None for names that are not stream files, which also rules out path traversal.
+    """
+    if get_stream_camera_id(file_name) is None:
+        return None
+    return os.path.join(settings.STREAM_ROOT, file_name)
+
+
+def get_file_etag(stat_result):
+    """
+    Strong ETag built from inode, size and mtime, so it changes whenever ffmpeg rewrites the file
+    """
+    return f'"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def parse_range_header(header, size):
+    """
+    Parse a single "bytes=start-end" range.
+    Returns (start, end) with an inclusive end, None to serve the whole file,
+    or False when the range can't be satisfied.
+    Multiple ranges are answered with the whole file, which RFC 9110 allows.
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+
+    start, end = match.group('start'), match.group('end')
+    if not start and not end:
+        return None
+
+    if not start:
+        # Suffix range: the last <end> bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start > end or start >= size:
+        return False
+    return start, min(end, size - 1)
+
+
+class FileRange:
+    """
+    File-like view of a byte range of an open file, so FileResponse can stream and close it
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class PlaylistCache:
+    """
+    Per-process LRU cache of playlist bytes.
+    Entries are keyed by inode, size and mtime, so a hit costs a single stat
+    and ffmpeg rewriting the file is noticed on the next request.
+    """
+
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        if self._max_size is None:
+            return settings.STREAM_PLAYLIST_CACHE_SIZE
+        return self._max_size
+
+    @staticmethod
+    def _version(stat_result):
+        return stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns
+
+    def get(self, file_path):
+        """
+        Return (stat_result, data) for the file, or None if it does not exist
+        """
+        try:
+            stat_result = os.stat(file_path)
+        except (FileNotFoundError, NotADirectoryError):
+            self.discard(file_path)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry is not None and self._version(entry[0]) == self._version(stat_result):
+                self._entries.move_to_end(file_path)
+                return entry
+
+        try:
+            with open(file_path, 'rb') as file:
+                # Stat the open file, so the version always matches the bytes read
+                stat_result = os.fstat(file.fileno())
+                data = file.read()
+        except FileNotFoundError:
+            self.discard(file_path)
+            return None
+
+        entry = (stat_result, data)
+        with self._lock:
+            self._entries[file_path] = entry
+            self._entries.move_to_end(file_path)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def discard(self, file_path):
+        with self._lock:
+            self._entries.pop(file_path, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+playlist_cache = PlaylistCache()
+
+
+def offload_response(file_name, content_type):
+    """
+    Hand the file over to the front proxy through an internal redirect header.
+    Django only authenticates and authorizes the request, the proxy sends the bytes
+    and takes care of ranges and conditional requests.
+    """
+    response = HttpResponse(content_type=content_type)
+    if settings.STREAM_OFFLOAD == OFFLOAD_X_ACCEL_REDIRECT:
+        response['X-Accel-Redirect'] = f'{settings.STREAM_OFFLOAD_PREFIX}{quote(file_name)}'
+    elif settings.STREAM_OFFLOAD == OFFLOAD_X_SENDFILE:
+        response['X-Sendfile'] = get_stream_file_path(file_name)
+    else:
+        raise ValueError(f'Unknown STREAM_OFFLOAD mode: {settings.STREAM_OFFLOAD}')
+    return response
+
+
+def serve_stream_file(request, file_name, content_type, cache_control, use_cache=False):
+    """
+    Serve a stream file, through the front proxy when STREAM_OFFLOAD is set,
+    otherwise from Python, which is meant for development.
+    The Python path answers conditional requests with 304 and single byte ranges with 206.
+    With use_cache the bytes come from the in-memory playlist cache.
+    Returns None if the file does not exist.
+    """
+    file_path = get_stream_file_path(file_name)
+    if file_path is None:
+        return None
+
+    if settings.STREAM_OFFLOAD:
+        response = offload_response(file_name, content_type)
+        response['Cache-Control'] = cache_control
+        return response
+
+    data = None
+    if use_cache:
+        entry = playlist_cache.get(file_path)
+        if entry is None:
+            return None
+        stat_result, data = entry
+    else:
+        try:
+            stat_result = os.stat(file_path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    etag = get_file_etag(stat_result)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat_result.st_mtime),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+    }
+
+    placeholder = HttpResponse(headers=headers)
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(stat_result.st_mtime),
+                                           response=placeholder)
+    if conditional is not placeholder:
+        return conditional
+
+    size = stat_result.st_size
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+        byte_range = parse_range_header(range_header, size)
+
+    if byte_range is False:
+        headers['Content-Range'] = f'bytes */{size}'
+        return HttpResponse(status=416, headers=headers)
+
+    if data is not None:
+        if byte_range is None:
+            return HttpResponse(data, content_type=content_type, headers=headers)
+        start, end = byte_range
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return HttpResponse(data[start:end + 1], status=206, content_type=content_type, headers=headers)
+
+    try:
+        file = open(file_path, 'rb')
+    except FileNotFoundError:
+        # ffmpeg removed the segment after the stat
+        return None
+
+    if byte_range is None:
+        return FileResponse(file, content_type=content_type, headers=headers)
+
+    start, end = byte_range
+    length = end - start + 1
+    headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    headers['Content-Length'] = str(length)
+    return FileResponse(FileRange(file, start, length), status=206, content_type=content_type, headers=headers)
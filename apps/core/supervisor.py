@@ -0,0 +1,326 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import random
+import re
+import signal
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from apps.core.models import Camera
+from apps.core.transcoding import build_ffmpeg_command
+from apps.core.viewers import get_active_cameras
+
+logger = logging.getLogger(__name__)
+
+# ffmpeg ends its progress lines with \r, so stderr is read in chunks and split on both
+STDERR_CHUNK_SIZE = 4096
+STDERR_LINE_BREAK = re.compile(rb'[\r\n]')
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def read_process_usage(pid):
+    """
+    Total CPU seconds and resident memory in bytes of a process, read from /proc.
+    Returns (None, None) where /proc is not available.
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as stat_file:
+            # The command name may contain spaces, the fields we need come after it
+            fields = stat_file.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/statm') as statm_file:
+            resident_pages = int(statm_file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None, None
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    return cpu_seconds, resident_pages * PAGE_SIZE
+
+
+class StreamProcess:
+    """
+    State of the ffmpeg process of one camera
+    """
+
+    def __init__(self, camera_id, command):
+        self.camera_id = camera_id
+        self.command = command
+        self.process = None
+        self.started_at = None
+        self.failures = 0
+        self.restarts = 0
+        self.next_start = 0.0
+        self.stderr_tail = deque(maxlen=20)
+        self.cpu_sample = None
+        self.cpu_percent = None
+        self.rss = None
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.returncode is None
+
+    def sample_usage(self, now):
+        cpu_seconds, self.rss = read_process_usage(self.process.pid)
+        if cpu_seconds is not None and self.cpu_sample is not None:
+            sampled_at, sampled_cpu = self.cpu_sample
+            if now > sampled_at:
+                self.cpu_percent = round(100 * (cpu_seconds - sampled_cpu) / (now - sampled_at), 1)
+        self.cpu_sample = (now, cpu_seconds) if cpu_seconds is not None else None
+
+    def as_dict(self, now):
+        return {
+            'camera_id': self.camera_id,
+            'pid': self.process.pid if self.running else None,
+            'running': self.running,
+            'uptime': round(now - self.started_at, 1) if self.running else None,
+            'cpu_percent': self.cpu_percent if self.running else None,
+            'rss': self.rss if self.running else None,
+            'restarts': self.restarts,
+            'failures': self.failures,
+            'next_start': round(max(self.next_start - now, 0), 1) if not self.running else None,
+        }
+
+
+class StreamSupervisor:
+    """
+    Runs the ffmpeg processes of all cameras from one asyncio loop.
+    The desired cameras are read from the database every refresh interval.
+    Crashed processes are restarted with exponential backoff and jitter,
+    and at most max_processes run at the same time.
+    With on_demand only cameras that had a viewer within STREAM_IDLE_GRACE seconds are transcoded.
+    """
+
+    def __init__(self, max_processes, refresh_interval, backoff_base, backoff_max, stable_after,
+                 status_file=None, ffmpeg_binary=None, shard=(0, 1), on_demand=False):
+        self.max_processes = max_processes
+        self.refresh_interval = refresh_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.status_file = status_file
+        self.ffmpeg_binary = ffmpeg_binary
+        self.shard = shard
+        self.on_demand = on_demand
+        self.streams = {}
+        # asyncio keeps only weak references to tasks, a watcher must not be collected while it runs
+        self._watchers = set()
+        self._stopping = asyncio.Event()
+        self._waiting_reported = 0
+
+    def load_desired_commands(self):
+        """
+        ffmpeg command of every camera this supervisor is responsible for
+        """
+        index, count = self.shard
+        commands = {}
+        cameras = Camera.objects.select_related('encoding_profile').prefetch_related('encoding_profile__renditions')
+        for camera in cameras:
+            if camera.id % count != index:
+                continue
+            command = build_ffmpeg_command(camera)
+            if self.ffmpeg_binary:
+                command[0] = self.ffmpeg_binary
+            commands[camera.id] = command
+        return commands
+
+    def filter_watched(self, commands):
+        """
+        Commands of the cameras that currently have viewers
+        """
+        active = get_active_cameras(commands.keys())
+        return {camera_id: command for camera_id, command in commands.items() if camera_id in active}
+
+    @staticmethod
+    def remove_stream_files(camera_id):
+        """
+        Remove the playlists and segments left behind, so the next viewer
+        doesn't get a stale playlist while the pipeline starts again
+        """
+        for path in glob.glob(os.path.join(settings.STREAM_ROOT, f'camera_{camera_id}_*')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get_backoff(self, failures):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** max(failures - 1, 0))
+        return delay * random.uniform(0.5, 1.5)
+
+    async def start(self, stream):
+        os.makedirs(settings.STREAM_ROOT, exist_ok=True)
+        try:
+            stream.process = await asyncio.create_subprocess_exec(
+                *stream.command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except OSError as e:
+            logger.error('Could not start ffmpeg for camera %s: %s', stream.camera_id, e)
+            stream.process = None
+            self.schedule_restart(stream)
+            return
+
+        stream.started_at = time.monotonic()
+        stream.cpu_sample = None
+        stream.cpu_percent = None
+        logger.info('Started ffmpeg for camera %s (pid %s)', stream.camera_id, stream.process.pid)
+        watcher = asyncio.create_task(self.watch(stream, stream.process))
+        self._watchers.add(watcher)
+        watcher.add_done_callback(self._watchers.discard)
+
+    @staticmethod
+    async def drain_stderr(stream, process):
+        """
+        Read stderr until the process closes it, keeping the last lines.
+        Lines end with \n or \r, a line without an end is cut to the chunk size.
+        """
+        pending = b''
+        while chunk := await process.stderr.read(STDERR_CHUNK_SIZE):
+            lines = STDERR_LINE_BREAK.split(pending + chunk)
+            pending = lines.pop()[-STDERR_CHUNK_SIZE:]
+            stream.stderr_tail.extend(line.decode(errors='replace').strip() for line in lines if line.strip())
+        if pending.strip():
+            stream.stderr_tail.append(pending.decode(errors='replace').strip())
+
+    async def watch(self, stream, process):
+        """
+        Drain stderr of the process and schedule a restart when it exits
+        """
+        try:
+            await self.drain_stderr(stream, process)
+        except Exception:
+            logger.exception('Could not read the output of ffmpeg for camera %s, restarting it', stream.camera_id)
+            # ffmpeg blocks once the undrained pipe is full, a restart is better than a hung stream
+            if process.returncode is None:
+                process.kill()
+        returncode = await process.wait()
+
+        if stream.process is not process or self.streams.get(stream.camera_id) is not stream:
+            # Stopped on purpose
+            return
+
+        if time.monotonic() - stream.started_at >= self.stable_after:
+            stream.failures = 0
+        logger.warning(
+            'ffmpeg for camera %s exited with %s: %s',
+            stream.camera_id, returncode, ' | '.join(list(stream.stderr_tail)[-3:])
+        )
+        stream.process = None
+        self.schedule_restart(stream)
+
+    def schedule_restart(self, stream):
+        stream.failures += 1
+        stream.restarts += 1
+        stream.next_start = time.monotonic() + self.get_backoff(stream.failures)
+
+    async def stop(self, stream, timeout=5):
+        process, stream.process = stream.process, None
+        if process is None or process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+        logger.info('Stopped ffmpeg for camera %s', stream.camera_id)
+
+    async def reconcile(self, desired):
+        for camera_id in list(self.streams):
+            stream = self.streams[camera_id]
+            if desired.get(camera_id) != stream.command:
+                del self.streams[camera_id]
+                await self.stop(stream)
+                if self.on_demand and camera_id not in desired:
+                    logger.info('Camera %s has no viewers', camera_id)
+                    self.remove_stream_files(camera_id)
+
+        for camera_id, command in desired.items():
+            if camera_id not in self.streams:
+                self.streams[camera_id] = StreamProcess(camera_id, command)
+
+        now = time.monotonic()
+        running = sum(stream.running for stream in self.streams.values())
+        waiting = [stream for stream in self.streams.values() if not stream.running and stream.next_start <= now]
+        started = 0
+        for stream in sorted(waiting, key=lambda item: item.next_start):
+            if running >= self.max_processes:
+                break
+            await self.start(stream)
+            running += stream.running
+            started += 1
+
+        blocked = len(waiting) - started
+        if blocked and blocked != self._waiting_reported:
+            logger.warning('Transcode limit of %s reached, %s cameras waiting', self.max_processes, blocked)
+        self._waiting_reported = blocked
+
+    def collect_status(self):
+        now = time.monotonic()
+        for stream in self.streams.values():
+            if stream.running:
+                stream.sample_usage(now)
+        return {
+            'updated_at': time.time(),
+            'max_processes': self.max_processes,
+            'running': sum(stream.running for stream in self.streams.values()),
+            'streams': [stream.as_dict(now) for stream in self.streams.values()],
+        }
+
+    def write_status(self, status):
+        if not self.status_file:
+            return
+        tmp_path = f'{self.status_file}.tmp'
+        with open(tmp_path, 'w') as status_file:
+            json.dump(status, status_file)
+        os.replace(tmp_path, self.status_file)
+
+    def request_stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.request_stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        next_refresh = 0.0
+        commands = {}
+        try:
+            while not self._stopping.is_set():
+                if time.monotonic() >= next_refresh:
+                    try:
+                        commands = await sync_to_async(self.load_desired_commands)()
+                    except Exception:
+                        logger.exception('Could not load cameras, keeping the current set')
+                    next_refresh = time.monotonic() + self.refresh_interval
+
+                desired = commands
+                if self.on_demand:
+                    # Checked every tick, so a first viewer doesn't wait for the next camera refresh
+                    try:
+                        desired = await sync_to_async(self.filter_watched)(commands)
+                    except Exception:
+                        logger.exception('Could not read viewers, keeping the running streams')
+                        desired = {camera_id: commands[camera_id] for camera_id in self.streams
+                                   if camera_id in commands}
+
+                await self.reconcile(desired)
+                self.write_status(self.collect_status())
+
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            streams, self.streams = list(self.streams.values()), {}
+            await asyncio.gather(*(self.stop(stream) for stream in streams))
+            await asyncio.gather(*self._watchers, return_exceptions=True)
@@ -1,3 +1,557 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from apps.authentication.models import CustomUser
+from apps.core import viewers
+from apps.core.health import CameraHealthChecker, probe_camera
+from apps.core.metrics import EXITED_SHARD, StreamMetrics
+from apps.core.models import Camera, UserCameraAccess
+from apps.core.serializers import UserCameraSerializer, UserCameraValuesSerializer
+from apps.core.services import refresh_camera_access
+from apps.core.signals import sync_access_status_after_migrate
+from apps.core.supervisor import StreamSupervisor
+from apps.core.viewers import get_active_cameras, get_viewer_counts, record_viewer
+from apps.authentication.services import generate_jwt_token
+from apps.kindergarten.models import District, KinderGarten, Region
+from apps.participants.models import Child, Group, RepresentativeChild, RepresentativeChildCamera
+from apps.utils.renderers import orjson
+
+# Stands in for ffmpeg: 'progress' floods stderr with \r-terminated progress lines before failing,
+# 'crash' fails at once and 'run' keeps running until it is stopped
+FAKE_FFMPEG = '''
+import sys
+import time
+
+mode = sys.argv[1]
+if mode == 'progress':
+    for frame in range(20000):
+        sys.stderr.write(f'frame={frame} fps=25 q=-1.0 size=N/A time=00:00:01.00 bitrate=N/A speed=1x\\r')
+if mode in ('progress', 'crash'):
+    sys.stderr.write('Connection refused\\n')
+    sys.exit(1)
+time.sleep(60)
+'''
+
+
+class StreamSupervisorTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.fake_ffmpeg = os.path.join(cls.directory, 'ffmpeg.py')
+        with open(cls.fake_ffmpeg, 'w') as script:
+            script.write(FAKE_FFMPEG)
+        cls.enterClassContext(override_settings(STREAM_ROOT=os.path.join(cls.directory, 'streams')))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def command(self, mode):
+        return [sys.executable, self.fake_ffmpeg, mode]
+
+    def run_supervisor(self, scenario, **options):
+        async def run():
+            supervisor = StreamSupervisor(**{
+                'max_processes': 4, 'refresh_interval': 1, 'backoff_base': 0.1, 'backoff_max': 1,
+                'stable_after': 30, **options,
+            })
+            try:
+                await asyncio.wait_for(scenario(supervisor), 20)
+            finally:
+                await asyncio.gather(*(supervisor.stop(stream) for stream in supervisor.streams.values()))
+
+        asyncio.run(run())
+
+    @staticmethod
+    async def wait_for_exit(supervisor):
+        await asyncio.gather(*supervisor._watchers)
+
+    def test_progress_output_is_drained_and_crash_is_reported(self):
+        async def scenario(supervisor):
+            await supervisor.reconcile({1: self.command('progress')})
+            stream = supervisor.streams[1]
+            self.assertTrue(stream.running)
+
+            await self.wait_for_exit(supervisor)
+            self.assertIsNone(stream.process)
+            self.assertEqual(stream.failures, 1)
+            self.assertEqual(stream.restarts, 1)
+            self.assertEqual(stream.stderr_tail[-1], 'Connection refused')
+            self.assertTrue(stream.stderr_tail[-2].startswith('frame='))
+            self.assertGreater(stream.next_start, time.monotonic())
+
+        self.run_supervisor(scenario)
+
+    def test_crashed_process_is_restarted_after_backoff(self):
+        async def scenario(supervisor):
+            await supervisor.reconcile({1: self.command('crash')})
+            stream = supervisor.streams[1]
+            first_pid = stream.process.pid
+            await self.wait_for_exit(supervisor)
+
+            # Still backing off
+            await supervisor.reconcile({1: self.command('crash')})
+            self.assertFalse(stream.running)
+
+            await asyncio.sleep(stream.next_start - time.monotonic())
+            await supervisor.reconcile({1: self.command('crash')})
+            self.assertNotEqual(stream.process.pid, first_pid)
+            await self.wait_for_exit(supervisor)
+            self.assertEqual(stream.failures, 2)
+            self.assertEqual(stream.restarts, 2)
+
+        self.run_supervisor(scenario)
+
+    def test_stable_process_resets_failures(self):
+        async def scenario(supervisor):
+            await supervisor.reconcile({1: self.command('crash')})
+            stream = supervisor.streams[1]
+            await self.wait_for_exit(supervisor)
+            await asyncio.sleep(stream.next_start - time.monotonic())
+            await supervisor.reconcile({1: self.command('crash')})
+            await self.wait_for_exit(supervisor)
+            self.assertEqual(stream.failures, 1)
+            self.assertEqual(stream.restarts, 2)
+
+        self.run_supervisor(scenario, stable_after=0)
+
+    def test_backoff_grows_exponentially_up_to_the_maximum(self):
+        supervisor = StreamSupervisor(max_processes=1, refresh_interval=1, backoff_base=1, backoff_max=10,
+                                      stable_after=30)
+        with mock.patch('apps.core.supervisor.random.uniform', return_value=1):
+            self.assertEqual([supervisor.get_backoff(failures) for failures in range(1, 7)], [1, 2, 4, 8, 10, 10])
+        for _ in range(100):
+            self.assertTrue(2 <= supervisor.get_backoff(3) <= 6)
+
+    def test_concurrent_processes_are_limited(self):
+        async def scenario(supervisor):
+            await supervisor.reconcile({camera_id: self.command('run') for camera_id in (1, 2, 3)})
+            status = supervisor.collect_status()
+            self.assertEqual(status['running'], 2)
+            running = [stream for stream in status['streams'] if stream['running']]
+            self.assertTrue(all(stream['pid'] and stream['uptime'] is not None for stream in running))
+
+        self.run_supervisor(scenario, max_processes=2)
+
+    def test_removed_camera_is_stopped(self):
+        async def scenario(supervisor):
+            await supervisor.reconcile({1: self.command('run')})
+            process = supervisor.streams[1].process
+            await supervisor.reconcile({})
+            self.assertEqual(supervisor.streams, {})
+            self.assertIsNotNone(process.returncode)
+
+        self.run_supervisor(scenario)
+
+
+@override_settings(STREAM_VIEWER_TIMEOUT=10, STREAM_IDLE_GRACE=60)
+class ViewerTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        viewers._recorded.clear()
+
+    def record_from_new_worker(self, camera_id, user_id):
+        # Every worker process has its own memo of recorded viewers
+        viewers._recorded.clear()
+        record_viewer(camera_id, user_id)
+
+    def test_concurrent_viewers_are_all_counted(self):
+        barrier = threading.Barrier(40)
+
+        def watch(user_id):
+            barrier.wait()
+            record_viewer(1, user_id)
+
+        threads = [threading.Thread(target=watch, args=(user_id,)) for user_id in range(40)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(get_viewer_counts([1, 2]), {1: 40, 2: 0})
+
+    def test_viewer_is_counted_once_per_window(self):
+        for _ in range(3):
+            self.record_from_new_worker(1, 7)
+        self.record_from_new_worker(1, 8)
+        self.assertEqual(get_viewer_counts([1]), {1: 2})
+
+    def test_viewer_is_gone_two_windows_after_leaving(self):
+        now = time.time()
+        with mock.patch('apps.core.viewers.time.time', return_value=now):
+            record_viewer(1, 7)
+        with mock.patch('apps.core.viewers.time.time', return_value=now + 10):
+            self.assertEqual(get_viewer_counts([1]), {1: 1})
+        with mock.patch('apps.core.viewers.time.time', return_value=now + 20):
+            self.assertEqual(get_viewer_counts([1]), {1: 0})
+            self.assertEqual(get_active_cameras([1]), {1})
+        with mock.patch('apps.core.viewers.time.time', return_value=now + 61):
+            self.assertEqual(get_active_cameras([1]), set())
+
+
+@contextlib.asynccontextmanager
+async def fake_rtsp_server(answers, delay=0):
+    """
+    RTSP server on a free local port answering the n-th connection with answers[n % len(answers)],
+    None answers nothing. server.peak is the highest number of connections open at the same time.
+    """
+    connections = {'count': 0}
+    # Handler task -> writer of the connections still open
+    handlers = {}
+
+    async def handle(reader, writer):
+        answer = answers[connections['count'] % len(answers)]
+        connections['count'] += 1
+        handlers[asyncio.current_task()] = writer
+        server.peak = max(server.peak, len(handlers))
+        try:
+            await reader.readuntil(b'\r\n\r\n')
+            await asyncio.sleep(delay)
+            if answer is None:
+                # Silent until the prober gives up or the server closes the connection
+                await reader.read()
+                return
+            writer.write(answer)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            del handlers[asyncio.current_task()]
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    server.peak = 0
+    server.port = server.sockets[0].getsockname()[1]
+    async with server:
+        try:
+            yield server
+        finally:
+            # Let the handlers of silent connections finish before the event loop goes away
+            tasks = list(handlers)
+            for writer in handlers.values():
+                writer.close()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class ProbeCameraTests(SimpleTestCase):
+
+    def probe(self, answer):
+        async def scenario():
+            async with fake_rtsp_server([answer]) as server:
+                return await probe_camera('127.0.0.1', server.port, 0.5)
+
+        return asyncio.run(scenario())
+
+    def test_rtsp_answers(self):
+        self.assertEqual(self.probe(b'RTSP/1.0 200 OK\r\nCSeq: 1\r\n\r\n'), (True, 'RTSP 200'))
+        # Reachable, it just wants credentials
+        self.assertEqual(self.probe(b'RTSP/1.0 401 Unauthorized\r\n\r\n'), (True, 'RTSP 401'))
+        self.assertEqual(self.probe(b'RTSP/1.0 503 Service Unavailable\r\n\r\n'), (False, 'RTSP 503'))
+        self.assertEqual(self.probe(b'HTTP/1.1 200 OK\r\n\r\n'), (False, 'not an RTSP response'))
+
+    def test_silent_camera_times_out(self):
+        self.assertEqual(self.probe(None), (False, 'timeout'))
+
+    def test_closed_port_is_down(self):
+        async def scenario():
+            async with fake_rtsp_server([b'']) as server:
+                port = server.port
+            return await probe_camera('127.0.0.1', port, 0.5)
+
+        healthy, _ = asyncio.run(scenario())
+        self.assertFalse(healthy)
+
+
+@override_settings(CAMERA_PROVISIONING_ENABLED=False)
+class CameraHealthCheckerTests(TestCase):
+    OK = b'RTSP/1.0 200 OK\r\n\r\n'
+    UNAVAILABLE = b'RTSP/1.0 503 Service Unavailable\r\n\r\n'
+
+    def create_cameras(self, count):
+        return [Camera.objects.create(name=f'camera {index}', ip='127.0.0.1', port=0) for index in range(count)]
+
+    def sweep(self, checker, answers, **server_options):
+        """
+        Sweep with all cameras pointed at a fake RTSP server, returns (summary, peak open connections)
+        """
+        async def scenario():
+            async with fake_rtsp_server(answers, **server_options) as server:
+                await sync_to_async(Camera.objects.update)(port=server.port)
+                return await checker.sweep(), server.peak
+
+        return async_to_sync(scenario)()
+
+    def get_statuses(self):
+        return set(Camera.objects.values_list('status', flat=True))
+
+    def test_probes_are_bounded_by_the_concurrency(self):
+        self.create_cameras(12)
+        checker = CameraHealthChecker(concurrency=3, timeout=1, failures=1, recoveries=1)
+        summary, peak = self.sweep(checker, [self.OK], delay=0.05)
+        self.assertEqual((summary['cameras'], summary['healthy']), (12, 12))
+        self.assertEqual(peak, 3)
+
+    def test_status_flips_after_consecutive_probes_with_one_update(self):
+        self.create_cameras(3)
+        checker = CameraHealthChecker(concurrency=10, timeout=0.3, failures=2, recoveries=1)
+
+        summary, _ = self.sweep(checker, [self.UNAVAILABLE])
+        self.assertEqual(summary['changed'], 0)
+        self.assertEqual(self.get_statuses(), {True})
+
+        with CaptureQueriesContext(connection) as queries:
+            summary, _ = self.sweep(checker, [self.UNAVAILABLE, None])
+        self.assertEqual(summary['changed'], 3)
+        self.assertEqual(self.get_statuses(), {False})
+        camera_updates = [query for query in queries if query['sql'].startswith('UPDATE "core_camera" SET "status"')]
+        self.assertEqual(len(camera_updates), 1)
+
+        summary, _ = self.sweep(checker, [self.OK])
+        self.assertEqual(summary['changed'], 3)
+        self.assertEqual(self.get_statuses(), {True})
+
+    def test_success_resets_the_failure_streak(self):
+        self.create_cameras(1)
+        checker = CameraHealthChecker(concurrency=10, timeout=0.3, failures=2, recoveries=1)
+        self.sweep(checker, [self.UNAVAILABLE])
+        self.sweep(checker, [self.OK])
+        summary, _ = self.sweep(checker, [self.UNAVAILABLE])
+        self.assertEqual(summary['changed'], 0)
+        self.assertEqual(self.get_statuses(), {True})
+
+
+@override_settings(CAMERA_PROVISIONING_ENABLED=False, METRICS_DIR=None)
+class StreamMetricsTests(TestCase):
+
+    def scrape(self, **headers):
+        # The test client connects from 127.0.0.1, like every request forwarded by the front proxy
+        return self.client.get('/metrics/', **headers)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_bearer_token_is_required(self):
+        Camera.objects.create(name='camera', ip='127.0.0.1', port=554)
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Basic secret').status_code, 403)
+
+        response = self.scrape(HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'stream_viewers{camera=', response.content)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_are_closed_without_a_token(self):
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+
+
+class MetricsShardTests(SimpleTestCase):
+    """
+    Shards in METRICS_DIR, one per worker plus the total of the exited ones
+    """
+
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+        override = override_settings(METRICS_DIR=self.metrics_dir, METRICS_FLUSH_INTERVAL=3600)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    @staticmethod
+    def get_total(metrics):
+        requests, sizes, latency = metrics.collect()
+        return sum(requests.values()), sum(sizes.values()), sum(sum(buckets) for buckets, _ in latency.values())
+
+    def write_exited_shard(self, requests):
+        # A worker that is gone, the pid of a finished child process is not reused this soon
+        child = subprocess.Popen([sys.executable, '-c', 'pass'])
+        child.wait()
+        metrics = StreamMetrics()
+        for _ in range(requests):
+            metrics.observe('playlist', 1, 200, 10, 0.001)
+        metrics._shard_name = f'{child.pid}-{metrics._shard_name.split("-", 1)[1]}'
+        metrics.flush()
+
+    def test_workers_with_the_same_pid_keep_their_shards(self):
+        first, second = StreamMetrics(), StreamMetrics()
+        first.observe('playlist', 1, 200, 10, 0.001)
+        first.flush()
+        second.observe('playlist', 1, 200, 10, 0.001)
+        second.flush()
+        self.assertEqual(len(os.listdir(self.metrics_dir)), 2)
+        self.assertEqual(self.get_total(StreamMetrics()), (2, 20, 2))
+
+    def test_exited_shards_are_folded_once(self):
+        self.write_exited_shard(2)
+        self.write_exited_shard(3)
+        metrics = StreamMetrics()
+        self.assertEqual(self.get_total(metrics), (5, 50, 5))
+        self.assertEqual(sorted(name for name in os.listdir(self.metrics_dir) if name.endswith('.json')),
+                         [EXITED_SHARD])
+
+        self.write_exited_shard(1)
+        self.assertEqual(self.get_total(metrics), (6, 60, 6))
+        self.assertEqual(self.get_total(metrics), (6, 60, 6))
+
+    def test_folded_shard_left_by_a_crash_is_not_added_twice(self):
+        self.write_exited_shard(2)
+        self.assertEqual(self.get_total(StreamMetrics()), (2, 20, 2))
+        # Crashed after exited.json named the shard and before it was removed
+        self.write_exited_shard(2)
+        name = next(name for name in os.listdir(self.metrics_dir) if name.endswith('.json') and name != EXITED_SHARD)
+        exited_path = os.path.join(self.metrics_dir, EXITED_SHARD)
+        with open(exited_path) as exited_file:
+            exited = json.load(exited_file)
+        with open(exited_path, 'w') as exited_file:
+            json.dump({**exited, 'folded': [name]}, exited_file)
+
+        self.assertEqual(self.get_total(StreamMetrics()), (2, 20, 2))
+        self.assertEqual([name for name in os.listdir(self.metrics_dir) if name.endswith('.json')], [EXITED_SHARD])
+
+    def test_shard_is_written_at_exit(self):
+        script = (
+            'from django.conf import settings\n'
+            f'settings.configure(METRICS_DIR={self.metrics_dir!r}, METRICS_FLUSH_INTERVAL=3600)\n'
+            'from apps.core.metrics import stream_metrics\n'
+            'stream_metrics.observe("playlist", 1, 200, 10, 0.001)\n'
+        )
+        project_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        subprocess.run([sys.executable, '-c', script], check=True, cwd=project_dir)
+        self.assertEqual(self.get_total(StreamMetrics()), (1, 10, 1))
+
+
+@override_settings(CAMERA_PROVISIONING_ENABLED=False)
+class LeanSerializationTests(TestCase):
+    """
+    The values_list() serializers and FastJSONRenderer give the bytes of the DRF serializers and JSONRenderer
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        region = Region.objects.create(name='Region')
+        district = District.objects.create(region=region, name='District')
+        kindergarten = KinderGarten.objects.create(name='Kindergarten', district=district, description='',
+                                                   phone='1', inn='1')
+        group = Group.objects.create(kindergarten=kindergarten, name='Group', limit=100)
+        for index in range(30):
+            Child.objects.create(kindergarten=kindergarten, group=group, first_name=f'Ўғил \u2028{index}',
+                                 last_name='O\'Neil "Jr"', age=index % 5)
+        user = CustomUser.objects.create(phone_number='998901234567', first_name='First')
+        for index in range(30):
+            camera = Camera.objects.create(name=f'Camera {index}', ip='127.0.0.1', port=554, status=index % 2 == 0)
+            UserCameraAccess.objects.create(user=user, camera=camera)
+
+    def benchmark(self):
+        out = io.StringIO()
+        call_command('benchmark_serializers', rows=30, repeat=1, stdout=out)
+        return out.getvalue()
+
+    @skipUnless(orjson, 'orjson is not installed')
+    def test_every_field_selection_is_byte_identical(self):
+        output = self.benchmark()
+        self.assertIn('JSON encoder: orjson', output)
+        self.assertIn('home: byte-identical', output)
+        self.assertIn('children: byte-identical', output)
+
+    def test_byte_identical_without_orjson(self):
+        with mock.patch('apps.utils.renderers.orjson', None):
+            output = self.benchmark()
+        self.assertIn('home: byte-identical', output)
+        self.assertIn('children: byte-identical', output)
+
+    def test_file_urls_match_the_drf_serializer(self):
+        access = UserCameraAccess.objects.order_by('pk').first()
+        serializer = UserCameraValuesSerializer(['master_file', 'low_quality_file', 'high_quality_file'])
+        expected = UserCameraSerializer(access, fields=['master_file', 'low_quality_file', 'high_quality_file']).data
+        self.assertEqual(serializer.serialize([(access.camera_id,)]), [dict(expected)])
+
+    def test_rendition_urls_are_served_by_the_stream_view(self):
+        access = UserCameraAccess.objects.order_by('pk').first()
+        data = UserCameraSerializer(access, fields=['low_quality_file', 'high_quality_file']).data
+        for url, index in ((data['low_quality_file'], 0), (data['high_quality_file'], 1)):
+            match = resolve(url)
+            self.assertEqual(match.url_name, 'get_m3u8_url')
+            self.assertEqual(match.kwargs['file_name'], f'camera_{access.camera_id}_{index}.m3u8')
+
+
+@override_settings(CAMERA_PROVISIONING_ENABLED=False)
+class CameraAccessStatusTests(TestCase):
+    """
+    The home endpoint reads the camera status copied to UserCameraAccess
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(phone_number='998901234567', first_name='First')
+        self.cameras = [Camera.objects.create(name=f'Camera {index}', ip='127.0.0.1', port=554) for index in range(2)]
+        for camera in self.cameras:
+            UserCameraAccess.objects.create(user=self.user, camera=camera)
+
+    def get_statuses(self):
+        return dict(UserCameraAccess.objects.values_list('camera_id', 'status'))
+
+    def test_home_reads_no_camera_join(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('home'), HTTP_AUTHORIZATION=f'Bearer {generate_jwt_token(self.user).access_token}'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([camera['status'] for camera in response.json()['cameras']], [True, True])
+        access_queries = [query['sql'] for query in queries if 'core_usercameraaccess' in query['sql']]
+        self.assertTrue(access_queries)
+        self.assertFalse([sql for sql in access_queries if 'JOIN' in sql])
+
+    def test_prober_copies_the_status(self):
+        self.cameras[0].status = False
+        CameraHealthChecker(concurrency=1, timeout=1, failures=1, recoveries=1).save_statuses([self.cameras[0]])
+        self.assertEqual(self.get_statuses(), {self.cameras[0].pk: False, self.cameras[1].pk: True})
+
+    def test_camera_save_copies_the_status(self):
+        self.cameras[1].status = False
+        self.cameras[1].save()
+        self.assertEqual(self.get_statuses(), {self.cameras[0].pk: True, self.cameras[1].pk: False})
+
+    def test_new_access_rows_get_the_status(self):
+        Camera.objects.filter(pk=self.cameras[1].pk).update(status=False)
+        UserCameraAccess.objects.all().delete()
+        region = Region.objects.create(name='Region')
+        district = District.objects.create(region=region, name='District')
+        kindergarten = KinderGarten.objects.create(name='Kindergarten', district=district, description='',
+                                                   phone='1', inn='1')
+        group = Group.objects.create(kindergarten=kindergarten, name='Group', limit=10)
+        child = Child.objects.create(kindergarten=kindergarten, group=group, first_name='First', last_name='Last')
+        link = RepresentativeChild.objects.create(representative=self.user, child=child)
+        for camera in self.cameras:
+            RepresentativeChildCamera.objects.create(representative_child=link, camera=camera)
+
+        refresh_camera_access([self.user.pk])
+        self.assertEqual(self.get_statuses(), {self.cameras[0].pk: True, self.cameras[1].pk: False})
+
+    def test_older_rows_get_the_status_after_migrate(self):
+        Camera.objects.filter(pk=self.cameras[0].pk).update(status=False)
+        out = io.StringIO()
+        sync_access_status_after_migrate(sender=None, stdout=out)
+        self.assertEqual(self.get_statuses(), {self.cameras[0].pk: False, self.cameras[1].pk: True})
+        self.assertIn('1 camera access rows', out.getvalue())
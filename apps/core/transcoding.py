@@ -0,0 +1,155 @@
+import os
+from collections import namedtuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import reverse
+
+from apps.core.models import Camera
+from apps.utils.cache import get_shared_timeout
+
+Rendition = namedtuple('Rendition', ['width', 'height', 'bitrate', 'passthrough'])
+EncodingSettings = namedtuple('EncodingSettings', ['renditions', 'hls_time', 'hls_list_size', 'preset'])
+
+MASTER_PLAYLIST_CACHE_KEY = 'stream:master:{}'
+RTSP_STREAM_PATH = '/Streaming/Channels/101'
+
+# Used by cameras without an encoding profile
+DEFAULT_ENCODING = EncodingSettings(
+    renditions=(
+        Rendition(width=640, height=360, bitrate=500, passthrough=False),
+        Rendition(width=1280, height=720, bitrate=1000, passthrough=False),
+    ),
+    hls_time=1,
+    hls_list_size=3,
+    preset='ultrafast',
+)
+
+
+def build_rtsp_url(camera):
+    """
+    RTSP url of the main stream of the camera, credentials are url-encoded
+    """
+    username = quote(camera.username, safe='')
+    password = quote(camera.password, safe='')
+    return f"rtsp://{username}:{password}@{camera.ip}:{camera.port}{RTSP_STREAM_PATH}"
+
+
+def get_playlist_pattern(camera):
+    """
+    Output playlist of the camera, ffmpeg replaces %v with the rendition index
+    """
+    return os.path.join(settings.STREAM_ROOT, f"camera_{camera.id}_%v.m3u8")
+
+
+def get_encoding_settings(camera):
+    """
+    Encoding settings of the camera from its profile, or the default ladder.
+    Prefetch encoding_profile__renditions when building many cameras.
+    """
+    profile = camera.encoding_profile
+    if profile is None:
+        return DEFAULT_ENCODING
+
+    renditions = tuple(
+        Rendition(rendition.width, rendition.height, rendition.bitrate, rendition.passthrough)
+        for rendition in profile.renditions.all()
+    )
+    return EncodingSettings(
+        renditions=renditions or DEFAULT_ENCODING.renditions,
+        hls_time=profile.hls_time,
+        hls_list_size=profile.hls_list_size,
+        preset=profile.preset,
+    )
+
+
+def build_ffmpeg_command(camera):
+    """
+    ffmpeg arguments producing one HLS rendition per rung of the camera's ladder.
+    Passthrough rungs copy the camera stream, the others are encoded with libx264
+    with keyframes forced on segment boundaries, so all renditions switch cleanly.
+    """
+    encoding = get_encoding_settings(camera)
+
+    command = [
+        settings.FFMPEG_BINARY,
+        # No progress lines, stderr only carries what is worth logging
+        '-nostats', '-loglevel', 'warning',
+        '-rtsp_transport', 'tcp',
+        '-i', build_rtsp_url(camera),
+    ]
+    for _ in encoding.renditions:
+        command += ['-map', '0:v:0']
+    for index, rendition in enumerate(encoding.renditions):
+        if rendition.passthrough:
+            command += [f'-c:v:{index}', 'copy']
+            continue
+        command += [
+            f'-c:v:{index}', 'libx264',
+            f'-preset:v:{index}', encoding.preset,
+            f'-tune:v:{index}', 'zerolatency',
+            f'-b:v:{index}', f'{rendition.bitrate}k',
+            f'-s:v:{index}', f'{rendition.width}x{rendition.height}',
+            f'-force_key_frames:v:{index}', f'expr:gte(t,n_forced*{encoding.hls_time})',
+        ]
+    command += [
+        '-f', 'hls',
+        '-hls_time', str(encoding.hls_time),
+        '-hls_list_size', str(encoding.hls_list_size),
+        '-hls_flags', 'delete_segments',
+        '-hls_base_url', settings.STREAM_SEGMENT_URL,
+        '-var_stream_map', ' '.join(f'v:{index}' for index in range(len(encoding.renditions))),
+        get_playlist_pattern(camera),
+    ]
+    return command
+
+
+def get_rendition_file_name(camera_id, index):
+    return f"camera_{camera_id}_{index}.m3u8"
+
+
+def build_master_playlist(camera):
+    """
+    HLS master playlist listing every rendition of the camera with its bandwidth and resolution,
+    so players switch between them on their own
+    """
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    renditions = get_encoding_settings(camera).renditions
+    for index, rendition in sorted(enumerate(renditions), key=lambda item: item[1].bitrate):
+        lines.append(
+            f'#EXT-X-STREAM-INF:BANDWIDTH={rendition.bitrate * 1000},'
+            f'RESOLUTION={rendition.width}x{rendition.height}'
+        )
+        lines.append(reverse('get_m3u8_url', args=[get_rendition_file_name(camera.id, index)]))
+    return '\n'.join(lines) + '\n'
+
+
+def get_master_playlist(camera_id):
+    """
+    Master playlist of the camera from the cache, built on a miss.
+    Saved profiles delete it from the cache, a local-memory cache only of the saving process,
+    so there it expires after LOCAL_CACHE_TIMEOUT seconds, see get_shared_timeout.
+    Returns None for unknown cameras.
+    """
+    key = MASTER_PLAYLIST_CACHE_KEY.format(camera_id)
+    playlist = cache.get(key)
+    if playlist is None:
+        camera = Camera.objects.filter(pk=camera_id).select_related(
+            'encoding_profile'
+        ).prefetch_related('encoding_profile__renditions').first()
+        if camera is None:
+            return None
+        playlist = build_master_playlist(camera)
+        cache.set(key, playlist, get_shared_timeout(cache, settings.STREAM_MASTER_PLAYLIST_CACHE_TIMEOUT))
+    return playlist
+
+
+def invalidate_master_playlists(camera_ids):
+    """
+    Drop the cached master playlists once the current transaction commits,
+    so a concurrent request can't cache the old ladder again
+    """
+    keys = [MASTER_PLAYLIST_CACHE_KEY.format(camera_id) for camera_id in camera_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Viewers are counted per window of STREAM_VIEWER_TIMEOUT seconds, (camera id, window) -> viewers
+VIEWER_COUNT_CACHE_KEY = 'stream:viewers:{}:{}'
+# Marks a viewer as counted in a window, (camera id, user id, window)
+VIEWER_WINDOW_CACHE_KEY = 'stream:viewer:{}:{}:{}'
+LAST_VIEW_CACHE_KEY = 'stream:last_view:{}'
+
+# Last window this process recorded (camera_id, user_id) in, to keep cache writes rare
+_recorded = {}
+_recorded_lock = threading.Lock()
+
+
+def get_window(now):
+    return int(now // settings.STREAM_VIEWER_TIMEOUT)
+
+
+def record_viewer(camera_id, user_id):
+    """
+    Record that the user is watching the camera.
+    Only atomic cache operations are used, so concurrent fetches from other workers can't drop a viewer:
+    add() of the viewer's key of the current window succeeds for the first fetch of the viewer in the window,
+    whichever worker serves it, and only that fetch increments the camera's counter of the window.
+    Players fetch the playlist about once a second, each process writes the cache once per viewer and window.
+    """
+    now = time.time()
+    window = get_window(now)
+    key = (camera_id, user_id)
+    with _recorded_lock:
+        if _recorded.get(key) == window:
+            return
+        _recorded[key] = window
+        if len(_recorded) > 10000:
+            for stale_key in [k for k, recorded in _recorded.items() if recorded < window]:
+                del _recorded[stale_key]
+
+    # A window's entries are read until the next window ends
+    timeout = 2 * settings.STREAM_VIEWER_TIMEOUT
+    if cache.add(VIEWER_WINDOW_CACHE_KEY.format(camera_id, user_id, window), True, timeout):
+        count_key = VIEWER_COUNT_CACHE_KEY.format(camera_id, window)
+        if not cache.add(count_key, 1, timeout):
+            try:
+                cache.incr(count_key)
+            except ValueError:
+                # Expired between add() and incr()
+                cache.add(count_key, 1, timeout)
+    cache.set(LAST_VIEW_CACHE_KEY.format(camera_id), now, settings.STREAM_VIEWER_TIMEOUT + settings.STREAM_IDLE_GRACE)
+
+
+def get_viewer_counts(camera_ids):
+    """
+    Number of viewers currently watching each camera, the larger count of the current window,
+    still filling up, and the previous one, so a viewer is gone at most two windows after leaving
+    """
+    window = get_window(time.time())
+    keys = {
+        VIEWER_COUNT_CACHE_KEY.format(camera_id, counted_window): camera_id
+        for camera_id in camera_ids for counted_window in (window - 1, window)
+    }
+    counts = dict.fromkeys(camera_ids, 0)
+    for key, count in cache.get_many(keys).items():
+        counts[keys[key]] = max(counts[keys[key]], count)
+    return counts
+
+
+def get_active_cameras(camera_ids):
+    """
+    Cameras watched within the last STREAM_IDLE_GRACE seconds, so their pipeline should run
+    """
+    now = time.time()
+    keys = {LAST_VIEW_CACHE_KEY.format(camera_id): camera_id for camera_id in camera_ids}
+    return {
+        keys[key] for key, last_view in cache.get_many(keys).items()
+        if now - last_view <= settings.STREAM_IDLE_GRACE
+    }
@@ -1,49 +1,130 @@
+import hashlib
 import os
 
-from django.http import FileResponse
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
-from apps.core.serializers import UserCameraSerializer
-from apps.participants.models import RepresentativeChildCamera as UserCamera
+from apps.authentication.authentication import CustomJWTAuthentication
+from apps.core.metrics import PROMETHEUS_CONTENT_TYPE, StreamMetricsMixin, render_metrics
+from apps.core.models import Camera, UserCameraAccess
+from apps.core.permissions import HasStreamFileAccess, IsMetricsClient
+from apps.core.serializers import UserCameraSerializer, UserCameraValuesSerializer
+from apps.core.streaming import (
+    PLAYLIST_CONTENT_TYPE, PLAYLIST_EXTENSIONS, SEGMENT_CONTENT_TYPES, get_stream_camera_id, serve_stream_file
+)
+from apps.core.transcoding import get_master_playlist
+from apps.core.viewers import get_viewer_counts, record_viewer
+from apps.utils.renderers import FastJSONRenderer
+from apps.utils.response_cache import UserVersionedCacheMixin
+from apps.utils.views import KeysetListAPIView
 
 
-class HomeAPIView(APIView):
+class HomeAPIView(UserVersionedCacheMixin, KeysetListAPIView):
     """
     API endpoint that allows users to be viewed.
     Can only be accessed by authenticated users.
+    Responses are cached per user until the user's cameras change.
+    Rows are serialized from values_list() and rendered with FastJSONRenderer, the output is the one of
+    UserCameraSerializer and JSONRenderer, manage.py benchmark_serializers compares both.
     """
+    cache_name = 'home'
 
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CustomJWTAuthentication]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    serializer_class = UserCameraSerializer
+    values_serializer_class = UserCameraValuesSerializer
+    results_key = 'cameras'
 
     def get_queryset(self):
-        user = self.request.user
-        return UserCamera.objects.filter(representative_child__representative_id=1)
+        return UserCameraAccess.objects.filter(user_id=self.request.user.id)
 
-    def get(self, request):
-        queryset = self.get_queryset()
-        serializer = UserCameraSerializer(queryset, many=True)
 
-        cameras = serializer.data
-        return Response({"cameras": cameras})
+class M3U8FileAPIView(StreamMetricsMixin, APIView):
+    """
+    API endpoint to serve the m3u8 stream files for cameras.
+    With STREAM_OFFLOAD set the file is sent by the front proxy,
+    otherwise it is served from the in-memory playlist cache.
+    Every fetch counts as a viewer heartbeat for on-demand transcoding.
+    """
+    permission_classes = [IsAuthenticated, HasStreamFileAccess]
+    authentication_classes = [CustomJWTAuthentication]
+    metrics_kind = 'playlist'
+
+    def get(self, request, file_name):
+        if not file_name.endswith(PLAYLIST_EXTENSIONS):
+            return Response({"error": "File not found"}, status=404)
+
+        record_viewer(get_stream_camera_id(file_name), request.user.id)
+
+        response = serve_stream_file(request, file_name, PLAYLIST_CONTENT_TYPE,
+                                     settings.STREAM_PLAYLIST_CACHE_CONTROL, use_cache=True)
+        if response is None:
+            if settings.STREAM_ON_DEMAND:
+                # The first viewer just started the pipeline, the player should retry shortly
+                return Response({"error": "Stream is starting"}, status=503, headers={'Retry-After': '2'})
+            return Response({"error": "File not found"}, status=404)
+        return response
 
 
-class M3U8FileAPIView(APIView):
+class MasterPlaylistAPIView(StreamMetricsMixin, APIView):
     """
-    API endpoint to serve the m3u8 stream files for cameras.
+    API endpoint to serve the HLS master playlist of a camera.
+    It lists all renditions of the camera's encoding profile, so the player picks
+    and switches quality itself. Counts as a viewer heartbeat, so an on-demand
+    pipeline starts while the player is still reading the master playlist.
     """
-    permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated, HasStreamFileAccess]
+    authentication_classes = [CustomJWTAuthentication]
+    metrics_kind = 'master'
+
+    def get(self, request, camera_id):
+        playlist = get_master_playlist(camera_id)
+        if playlist is None:
+            return Response({"error": "File not found"}, status=404)
+
+        record_viewer(camera_id, request.user.id)
+
+        etag = f'"{hashlib.md5(playlist.encode()).hexdigest()}"'
+        response = HttpResponse(playlist, content_type=PLAYLIST_CONTENT_TYPE, headers={
+            'ETag': etag,
+            'Cache-Control': settings.STREAM_MASTER_PLAYLIST_CACHE_CONTROL,
+        })
+        return get_conditional_response(request, etag=etag, response=response)
+
+
+class StreamSegmentAPIView(StreamMetricsMixin, APIView):
+    """
+    API endpoint to serve the media segments of camera streams.
+    Supports byte ranges and conditional requests, segments are cached as immutable.
+    """
+    permission_classes = [IsAuthenticated, HasStreamFileAccess]
+    authentication_classes = [CustomJWTAuthentication]
+    metrics_kind = 'segment'
 
     def get(self, request, file_name):
-        camera_file_path = os.path.join('/var/lib/streams', file_name)
+        response = None
+        content_type = SEGMENT_CONTENT_TYPES.get(os.path.splitext(file_name)[1])
+        if content_type is not None:
+            response = serve_stream_file(request, file_name, content_type, settings.STREAM_SEGMENT_CACHE_CONTROL)
+        if response is None:
+            return Response({"error": "File not found"}, status=404)
+        return response
 
-        print(camera_file_path)
 
-        if os.path.exists(camera_file_path):
-            return FileResponse(open(camera_file_path, 'rb'), content_type='application/vnd.apple.mpegurl')
+class StreamMetricsAPIView(APIView):
+    """
+    Prometheus endpoint with the viewers, requests, bytes and latency of the stream endpoints,
+    merged over all worker processes. Only reachable with the METRICS_TOKEN bearer token.
+    """
+    permission_classes = [IsMetricsClient]
+    authentication_classes = []
 
-        return Response({"error": "File not found"}, status=404)
+    def get(self, request):
+        viewer_counts = get_viewer_counts(list(Camera.objects.values_list('id', flat=True)))
+        return HttpResponse(render_metrics(viewer_counts), content_type=PROMETHEUS_CONTENT_TYPE)
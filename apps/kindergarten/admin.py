@@ -1,8 +1,12 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.template.response import TemplateResponse
 
 from apps.core.models import Camera
 from apps.kindergarten.models import Region, District
 from apps.kindergarten.models.kindergarten import KinderGartenCamera, KinderGarten
+from apps.participants.forms import RosterImportForm
+from apps.participants.roster import RosterError, RosterImporter, read_roster
 
 admin.site.register(Region)
 admin.site.register(District)
@@ -28,12 +32,59 @@ class KinderGartenAdmin(admin.ModelAdmin):
     list_display = ['name', 'district', 'phone', 'inn']
     search_fields = ['name', 'district__name', 'phone', 'inn']
     list_filter = ['district']
+    actions = ['import_roster']
+
+    @admin.action(description='Import a roster into the selected kindergarten')
+    def import_roster(self, request, queryset):
+        """
+        Upload a roster file for one kindergarten, the same import as manage.py import_roster
+        """
+        if queryset.count() != 1:
+            self.message_user(request, 'Select exactly one kindergarten to import a roster into', messages.ERROR)
+            return None
+        kindergarten = queryset.get()
+
+        if 'apply' in request.POST:
+            form = RosterImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                roster = form.cleaned_data['roster']
+                importer = RosterImporter(kindergarten_id=kindergarten.pk)
+                try:
+                    importer.run(read_roster(roster.file, roster.name))
+                except RosterError as e:
+                    self.message_user(request, str(e), messages.ERROR)
+                    return None
+
+                stats = importer.stats
+                self.message_user(request, (
+                    f'{stats["rows"]} rows imported into {kindergarten.name}: {stats["groups_created"]} groups, '
+                    f'{stats["children_created"]} children and {stats["users_created"]} users created, '
+                    f'{stats["links_created"]} links created, {stats["links_existing"]} already linked'
+                ), messages.SUCCESS)
+                for line, errors in importer.errors:
+                    self.message_user(request, f'Line {line}: {errors}', messages.WARNING)
+                if stats['errors'] > len(importer.errors):
+                    self.message_user(request, f'{stats["errors"] - len(importer.errors)} more rows with errors',
+                                      messages.WARNING)
+                return None
+        else:
+            form = RosterImportForm()
+
+        return TemplateResponse(request, 'admin/kindergarten/kindergarten/import_roster.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Import a roster',
+            'opts': self.model._meta,
+            'kindergarten': kindergarten,
+            'form': form,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
 
 @admin.register(Camera)
 class CameraAdmin(admin.ModelAdmin):
     """
     Admin View for Camera
     """
-    list_display = ['name', 'ip', 'port']
+    list_display = ['name', 'ip', 'port', 'status', 'provisioning_state']
     search_fields = ['name', 'ip', 'port']
-    list_filter = ['name', 'ip', 'port']
\ No newline at end of file
+    list_filter = ['name', 'ip', 'port', 'provisioning_state', 'encoding_profile']
+    readonly_fields = ['provisioning_state', 'provisioning_error', 'provisioned_at']
\ No newline at end of file
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class KindergartenConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.kindergarten'
+
+    def ready(self):
+        import apps.kindergarten.signals
+
+        post_migrate.connect(apps.kindergarten.signals.create_stats_after_migrate, sender=self)
@@ -0,0 +1,88 @@
+import math
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Precision of the stored geohashes, a cell of about 4.8 x 4.8 meters
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    value = 0
+    even = True
+    while len(geohash) < precision:
+        # Bits alternate between longitude and latitude, starting with longitude
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            geohash.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(geohash)
+
+
+def get_cell_size(precision):
+    """
+    (height, width) in degrees of the geohash cells of the precision
+    """
+    lat_bits = 5 * precision // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+
+def get_search_precision(latitude, radius_km):
+    """
+    Longest geohash precision whose cells are at least radius_km high and wide at the latitude,
+    so the cell of the center and its eight neighbours cover the whole circle
+    """
+    lon_factor = max(math.cos(math.radians(min(abs(latitude) + radius_km / KM_PER_DEGREE, 90))), 1e-6)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = get_cell_size(precision)
+        if height * KM_PER_DEGREE >= radius_km and width * KM_PER_DEGREE * lon_factor >= radius_km:
+            return precision
+    return 1
+
+
+def get_covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes of the cells around the point that cover the circle of radius_km
+    """
+    precision = get_search_precision(latitude, radius_km)
+    height, width = get_cell_size(precision)
+    cells = set()
+    for lat_step in (-1, 0, 1):
+        for lon_step in (-1, 0, 1):
+            cell_latitude = min(max(latitude + lat_step * height, -90.0), 90.0)
+            cell_longitude = (longitude + lon_step * width + 180) % 360 - 180
+            cells.add(encode_geohash(cell_latitude, cell_longitude, precision))
+    return sorted(cells)
+
+
+def get_prefix_range(prefix):
+    """
+    (start, end) of the geohashes starting with the prefix, end is None when there is no upper bound.
+    A range instead of LIKE 'prefix%', which SQLite doesn't run on an index.
+    """
+    stripped = prefix.rstrip(GEOHASH_ALPHABET[-1])
+    if not stripped:
+        return prefix, None
+    last = GEOHASH_ALPHABET[GEOHASH_ALPHABET.index(stripped[-1]) + 1]
+    return prefix, stripped[:-1] + last
+
+
+def haversine_km(latitude1, longitude1, latitude2, longitude2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (latitude1, longitude1, latitude2, longitude2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(math.sqrt(a), 1.0))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.kindergarten.stats import recompute_stats
+from apps.participants.services import recompute_group_occupancy
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the region, district and kindergarten counters and the group occupancy from the tables.
+    The counters are kept up to date incrementally, run this periodically, e.g. nightly from cron,
+    to fix drift from updates that bypass the signals.
+    """
+    help = 'Recompute the region, district and kindergarten rollup counters and the group occupancy'
+
+    def handle(self, *args, **options):
+        total = recompute_stats()
+        self.stdout.write(self.style.SUCCESS(f'Counters recomputed for {total} kindergartens'))
+        changed = recompute_group_occupancy()
+        self.stdout.write(self.style.SUCCESS(f'Occupancy corrected for {changed} groups'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from apps.kindergarten.models import KinderGarten
+
+
+class Command(BaseCommand):
+    """
+    Recompute the geohash of every kindergarten from its coordinates
+    """
+    help = 'Recompute the geohashes used by the nearby kindergarten search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of kindergartens updated per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        kindergartens = KinderGarten.objects.only('pk', 'latitude', 'longitude', 'geohash').order_by('pk')
+
+        changed = []
+        total = 0
+        for kindergarten in kindergartens.iterator(chunk_size=batch_size):
+            geohash = kindergarten.geohash
+            kindergarten.update_geohash()
+            if kindergarten.geohash != geohash:
+                changed.append(kindergarten)
+            if len(changed) == batch_size:
+                KinderGarten.objects.bulk_update(changed, ['geohash'])
+                total += len(changed)
+                changed = []
+        KinderGarten.objects.bulk_update(changed, ['geohash'])
+        total += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f'Geohashes updated for {total} kindergartens'))
@@ -1,2 +1,3 @@
 from .district import District, Region
-from .kindergarten import KinderGarten, KinderGartenCamera
\ No newline at end of file
+from .kindergarten import KinderGarten, KinderGartenCamera
+from .stats import DistrictStats, KinderGartenStats, RegionStats
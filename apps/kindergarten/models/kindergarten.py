@@ -1,5 +1,6 @@
 from django.db import models
 
+from apps.kindergarten.geo import encode_geohash
 from apps.utils.abs_model import AbstractBaseModel
 
 
@@ -14,6 +15,22 @@ class KinderGarten(AbstractBaseModel):
     latitude = models.FloatField(null=True, blank=True, help_text='Latitude of the location')
     phone = models.CharField(max_length=255, help_text='Enter the phone number of the kindergarten')
     inn = models.CharField(max_length=255, help_text='Enter the INN of the kindergarten')
+    # Geohash of the location, empty without one. Kept by save(), fill it with
+    # manage.py update_kindergarten_geohashes after changing locations with update()
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
+
+    def update_geohash(self):
+        if self.latitude is None or self.longitude is None:
+            self.geohash = ''
+        else:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        self.update_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -21,6 +38,10 @@ class KinderGarten(AbstractBaseModel):
     class Meta:
         verbose_name = 'Kinder Garden'
         verbose_name_plural = 'Kinder Gardens'
+        indexes = [
+            # Nearby search scans geohash ranges and reads the coordinates from the index
+            models.Index(fields=['geohash', 'latitude', 'longitude'], name='kindergarten_geohash_idx'),
+        ]
 
 
 class KinderGartenCamera(AbstractBaseModel):
@@ -0,0 +1,66 @@
+from django.db import models
+
+# Counters kept by every rollup level
+STATS_FIELDS = ('children', 'groups', 'cameras', 'online_cameras', 'parents')
+
+
+class AbstractStats(models.Model):
+    """
+    Rollup counters, updated with F() deltas by apps.kindergarten.stats and
+    recomputed from scratch by manage.py recompute_stats.
+    A parent counts once per kindergarten, the districts and regions sum their kindergartens.
+    """
+    children = models.IntegerField(default=0)
+    groups = models.IntegerField(default=0)
+    cameras = models.IntegerField(default=0)
+    online_cameras = models.IntegerField(default=0)
+    parents = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class RegionStats(AbstractStats):
+    """
+    Counters of all kindergartens of the region
+    """
+    region = models.OneToOneField('kindergarten.Region', on_delete=models.CASCADE, primary_key=True,
+                                  related_name='stats')
+
+    def __str__(self):
+        return f'Stats of {self.region_id}'
+
+    class Meta:
+        verbose_name = 'Region Stats'
+        verbose_name_plural = 'Region Stats'
+
+
+class DistrictStats(AbstractStats):
+    """
+    Counters of all kindergartens of the district
+    """
+    district = models.OneToOneField('kindergarten.District', on_delete=models.CASCADE, primary_key=True,
+                                    related_name='stats')
+
+    def __str__(self):
+        return f'Stats of {self.district_id}'
+
+    class Meta:
+        verbose_name = 'District Stats'
+        verbose_name_plural = 'District Stats'
+
+
+class KinderGartenStats(AbstractStats):
+    """
+    Counters of one kindergarten
+    """
+    kindergarten = models.OneToOneField('kindergarten.KinderGarten', on_delete=models.CASCADE, primary_key=True,
+                                        related_name='stats')
+
+    def __str__(self):
+        return f'Stats of {self.kindergarten_id}'
+
+    class Meta:
+        verbose_name = 'Kinder Garden Stats'
+        verbose_name_plural = 'Kinder Garden Stats'
@@ -0,0 +1,57 @@
+from django.conf import settings
+from rest_framework import serializers
+
+from apps.kindergarten.models import KinderGarten
+
+
+class NearbyQuerySerializer(serializers.Serializer):
+    """
+    This serializer is used to validate the query parameters of the nearby search
+    """
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(min_value=0.01, required=False)
+
+    def validate_radius(self, value):
+        if value > settings.KINDERGARTEN_NEARBY_MAX_RADIUS:
+            raise serializers.ValidationError(
+                f'Ensure this value is less than or equal to {settings.KINDERGARTEN_NEARBY_MAX_RADIUS}.'
+            )
+        return value
+
+
+class NearbyKinderGartenSerializer(serializers.ModelSerializer):
+    """
+    This serializer is used to serialize the kindergartens found by the nearby search
+    """
+    district = serializers.CharField(source='district.name')
+    distance = serializers.SerializerMethodField()
+
+    class Meta:
+        model = KinderGarten
+        fields = ['id', 'name', 'district', 'phone', 'latitude', 'longitude', 'distance']
+
+    def get_distance(self, obj):
+        # Kilometers, rounded to meters
+        return round(obj.distance, 3)
+
+
+class StatsSerializer(serializers.Serializer):
+    """
+    This serializer is used to serialize the rollup counters of a region, district or kindergarten
+    """
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    children = serializers.IntegerField()
+    groups = serializers.IntegerField()
+    cameras = serializers.IntegerField()
+    online_cameras = serializers.IntegerField()
+    parents = serializers.IntegerField()
+
+
+class StatsQuerySerializer(serializers.Serializer):
+    """
+    This serializer is used to validate the query parameters of the stats endpoint
+    """
+    region = serializers.IntegerField(required=False)
+    district = serializers.IntegerField(required=False)
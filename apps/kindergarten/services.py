@@ -0,0 +1,36 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from apps.kindergarten.geo import get_covering_cells, get_prefix_range, haversine_km
+from apps.kindergarten.models import KinderGarten
+
+
+def find_nearby_kindergartens(latitude, longitude, radius_km, limit):
+    """
+    Kindergartens within radius_km of the point, nearest first, with their distance in km.
+    Candidates come from range scans of the geohash index over the cells covering the circle,
+    only their coordinates are read. The exact haversine distance then drops the corners
+    of the cells, and only the kindergartens returned are loaded.
+    """
+    ranges = []
+    for cell in get_covering_cells(latitude, longitude, radius_km):
+        start, end = get_prefix_range(cell)
+        ranges.append(Q(geohash__gte=start, geohash__lt=end) if end else Q(geohash__gte=start))
+
+    candidates = KinderGarten.objects.filter(reduce(or_, ranges)).values_list('pk', 'latitude', 'longitude')
+    distances = {}
+    for pk, candidate_latitude, candidate_longitude in candidates:
+        distance = haversine_km(latitude, longitude, candidate_latitude, candidate_longitude)
+        if distance <= radius_km:
+            distances[pk] = distance
+
+    nearest = sorted(distances, key=distances.get)[:limit]
+    kindergartens = KinderGarten.objects.select_related('district').in_bulk(nearest)
+    result = []
+    for pk in nearest:
+        kindergarten = kindergartens[pk]
+        kindergarten.distance = distances[pk]
+        result.append(kindergarten)
+    return result
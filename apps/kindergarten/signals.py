@@ -0,0 +1,100 @@
+import sys
+
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from apps.core.models import Camera
+from apps.kindergarten.models import (
+    District, DistrictStats, KinderGarten, KinderGartenStats, Region, RegionStats
+)
+from apps.kindergarten.stats import apply_camera_status_deltas, create_missing_stats, move_stats
+
+
+def create_stats_after_migrate(sender, verbosity=1, stdout=None, **kwargs):
+    """
+    Create the missing stats rows of the existing regions, districts and kindergartens on every migrate,
+    so the deployment that adds the rollups fills them. Connected in KindergartenConfig.ready().
+    """
+    if create_missing_stats() and verbosity >= 1:
+        (stdout or sys.stdout).write(
+            '  Recomputed the region, district and kindergarten stats, some rows were missing\n'
+        )
+
+
+@receiver(post_save, sender=Region)
+def create_region_stats(sender, instance, created, **kwargs):
+    if created:
+        RegionStats.objects.get_or_create(region=instance)
+
+
+@receiver(pre_save, sender=District)
+def remember_district_region(sender, instance, **kwargs):
+    """
+    Keep the previous region, so the counters of the district can follow it
+    """
+    instance._previous_region_id = None
+    if instance.pk is not None:
+        instance._previous_region_id = sender.objects.filter(pk=instance.pk).values_list(
+            'region_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=District)
+def update_district_stats(sender, instance, created, **kwargs):
+    """
+    Create the counters of a new district, move them to the new region of a moved one
+    """
+    if created:
+        DistrictStats.objects.get_or_create(district=instance)
+        return
+    previous_region_id = getattr(instance, '_previous_region_id', None)
+    if previous_region_id is not None and previous_region_id != instance.region_id:
+        move_stats(DistrictStats, instance.pk, RegionStats, previous_region_id, instance.region_id)
+
+
+@receiver(pre_save, sender=KinderGarten)
+def remember_kindergarten_district(sender, instance, **kwargs):
+    """
+    Keep the previous district, so the counters of the kindergarten can follow it
+    """
+    instance._previous_district = None
+    if instance.pk is not None:
+        instance._previous_district = sender.objects.filter(pk=instance.pk).values_list(
+            'district_id', 'district__region_id'
+        ).first()
+
+
+@receiver(post_save, sender=KinderGarten)
+def update_kindergarten_stats(sender, instance, created, **kwargs):
+    """
+    Create the counters of a new kindergarten, move them to the new district and region of a moved one
+    """
+    if created:
+        KinderGartenStats.objects.get_or_create(kindergarten=instance)
+        return
+    previous = getattr(instance, '_previous_district', None)
+    if previous is None or previous[0] == instance.district_id:
+        return
+    previous_district_id, previous_region_id = previous
+    move_stats(KinderGartenStats, instance.pk, DistrictStats, previous_district_id, instance.district_id)
+    region_id = District.objects.filter(pk=instance.district_id).values_list('region_id', flat=True).first()
+    if previous_region_id != region_id:
+        move_stats(KinderGartenStats, instance.pk, RegionStats, previous_region_id, region_id)
+
+
+@receiver(pre_save, sender=Camera)
+def remember_camera_status(sender, instance, **kwargs):
+    """
+    Keep the previous status, the online camera counters change when it flips
+    """
+    instance._previous_status = None
+    update_fields = kwargs.get('update_fields')
+    if instance.pk is not None and (update_fields is None or 'status' in update_fields):
+        instance._previous_status = sender.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Camera)
+def update_online_cameras(sender, instance, created, **kwargs):
+    previous_status = getattr(instance, '_previous_status', None)
+    if not created and previous_status is not None and previous_status != instance.status:
+        apply_camera_status_deltas({instance.pk: 1 if instance.status else -1})
@@ -0,0 +1,181 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from apps.core.models import Camera
+from apps.kindergarten.models import (
+    District, DistrictStats, KinderGarten, KinderGartenCamera, KinderGartenStats, Region, RegionStats
+)
+from apps.kindergarten.models.stats import STATS_FIELDS
+from apps.participants.models import Child, Group, RepresentativeChild
+
+
+def _update_counters(model, deltas) -> None:
+    """
+    Add the deltas to the counters of the rows, rows with the same deltas share one UPDATE
+    """
+    pks_by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        delta = tuple(sorted((field, value) for field, value in delta.items() if value))
+        if delta:
+            pks_by_delta[delta].append(pk)
+
+    now = timezone.now()
+    for delta, pks in pks_by_delta.items():
+        model.objects.filter(pk__in=pks).update(
+            updated_at=now, **{field: F(field) + value for field, value in delta}
+        )
+
+
+def apply_stats_deltas(deltas) -> None:
+    """
+    Add {kindergarten id: {counter: delta}} to the kindergartens and to their districts and regions.
+    Counters are changed with F() expressions in the caller's transaction, so concurrent changes
+    don't overwrite each other and a rollback takes the deltas back as well.
+    Kindergartens without a stats row are skipped, the rows are created with the kindergartens
+    and, for rows made before the rollups existed, by create_missing_stats after migrate.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if any(delta.values())}
+    if not deltas:
+        return
+
+    district_deltas = defaultdict(Counter)
+    region_deltas = defaultdict(Counter)
+    for pk, district_id, region_id in KinderGarten.objects.filter(pk__in=deltas).values_list(
+        'pk', 'district_id', 'district__region_id'
+    ):
+        district_deltas[district_id].update(deltas[pk])
+        region_deltas[region_id].update(deltas[pk])
+
+    _update_counters(KinderGartenStats, deltas)
+    _update_counters(DistrictStats, district_deltas)
+    _update_counters(RegionStats, region_deltas)
+
+
+def get_parent_deltas(pairs, sign, exclude=Q()):
+    """
+    Deltas of the parents counters for (representative id, kindergarten id) pairs that gained (sign 1)
+    or lost (sign -1) a link. A parent counts once per kindergarten, so a pair only changes the counter
+    when the representative has no other link to a child of the kindergarten. Links matching exclude
+    are not taken into account, e.g. the links just created.
+    """
+    pairs = set(pairs)
+    deltas = defaultdict(Counter)
+    if not pairs:
+        return deltas
+
+    other_links = set(
+        RepresentativeChild.objects.filter(
+            representative_id__in={representative_id for representative_id, _ in pairs},
+            child__kindergarten_id__in={kindergarten_id for _, kindergarten_id in pairs},
+        ).exclude(exclude).values_list('representative_id', 'child__kindergarten_id')
+    )
+    for _, kindergarten_id in pairs - other_links:
+        deltas[kindergarten_id]['parents'] += sign
+    return deltas
+
+
+def get_camera_deltas(links, sign):
+    """
+    Deltas of the camera counters for (kindergarten id, camera id) links that were added (sign 1)
+    or removed (sign -1)
+    """
+    links = list(links)
+    online = set(Camera.objects.filter(
+        pk__in={camera_id for _, camera_id in links}, status=True
+    ).values_list('pk', flat=True))
+    deltas = defaultdict(Counter)
+    for kindergarten_id, camera_id in links:
+        deltas[kindergarten_id]['cameras'] += sign
+        deltas[kindergarten_id]['online_cameras'] += sign * (camera_id in online)
+    return deltas
+
+
+def apply_camera_status_deltas(camera_deltas) -> None:
+    """
+    Apply {camera id: 1 when it came online, -1 when it went offline} to the kindergartens of the cameras
+    """
+    deltas = defaultdict(Counter)
+    for kindergarten_id, camera_id in KinderGartenCamera.objects.filter(
+        camera_id__in=camera_deltas
+    ).values_list('kindergarten_id', 'camera_id'):
+        deltas[kindergarten_id]['online_cameras'] += camera_deltas[camera_id]
+    apply_stats_deltas(deltas)
+
+
+def move_stats(model, pk, parent_model, old_parent_id, new_parent_id) -> None:
+    """
+    Move the counters of a kindergarten or district row between its old and new parent rows
+    """
+    counters = model.objects.filter(pk=pk).values(*STATS_FIELDS).first()
+    if counters is None:
+        return
+    _update_counters(parent_model, {
+        old_parent_id: {field: -value for field, value in counters.items()},
+        new_parent_id: counters,
+    })
+
+
+def recompute_stats() -> int:
+    """
+    Recompute all counters from the tables with a few grouped queries and overwrite the rollups,
+    creating the missing rows. Fixes any drift of the incremental updates.
+    Returns the number of kindergartens.
+    """
+    counters = defaultdict(Counter)
+    for kindergarten_id, total in Child.objects.values_list('kindergarten_id').annotate(total=Count('pk')):
+        counters[kindergarten_id]['children'] = total
+    for kindergarten_id, total in Group.objects.values_list('kindergarten_id').annotate(total=Count('pk')):
+        counters[kindergarten_id]['groups'] = total
+    for kindergarten_id, total, online in KinderGartenCamera.objects.values_list('kindergarten_id').annotate(
+        total=Count('pk'), online=Count('pk', filter=Q(camera__status=True))
+    ):
+        counters[kindergarten_id]['cameras'] = total
+        counters[kindergarten_id]['online_cameras'] = online
+    for kindergarten_id, total in RepresentativeChild.objects.values_list('child__kindergarten_id').annotate(
+        total=Count('representative_id', distinct=True)
+    ):
+        counters[kindergarten_id]['parents'] = total
+
+    district_counters = defaultdict(Counter)
+    region_counters = defaultdict(Counter)
+    kindergarten_rows = []
+    for pk, district_id, region_id in KinderGarten.objects.values_list('pk', 'district_id', 'district__region_id'):
+        district_counters[district_id].update(counters[pk])
+        region_counters[region_id].update(counters[pk])
+        kindergarten_rows.append(KinderGartenStats(kindergarten_id=pk, **counters[pk]))
+    district_rows = [
+        DistrictStats(district_id=pk, **district_counters[pk]) for pk in District.objects.values_list('pk', flat=True)
+    ]
+    region_rows = [
+        RegionStats(region_id=pk, **region_counters[pk]) for pk in Region.objects.values_list('pk', flat=True)
+    ]
+
+    with transaction.atomic():
+        for model, rows, key in (
+            (KinderGartenStats, kindergarten_rows, 'kindergarten'),
+            (DistrictStats, district_rows, 'district'),
+            (RegionStats, region_rows, 'region'),
+        ):
+            model.objects.bulk_create(
+                rows, batch_size=1000, update_conflicts=True, unique_fields=[key],
+                update_fields=[*STATS_FIELDS, 'updated_at'],
+            )
+    return len(kindergarten_rows)
+
+
+def create_missing_stats() -> bool:
+    """
+    Recompute the counters when a region, district or kindergarten has no stats row, e.g. rows made
+    before the rollups existed or with bulk_create. Returns whether they were recomputed.
+    """
+    if not (
+        Region.objects.filter(stats__isnull=True).exists()
+        or District.objects.filter(stats__isnull=True).exists()
+        or KinderGarten.objects.filter(stats__isnull=True).exists()
+    ):
+        return False
+    recompute_stats()
+    return True
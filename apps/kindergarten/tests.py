@@ -1,3 +1,141 @@
-from django.test import TestCase
+import io
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from apps.authentication.models import CustomUser
+from apps.core.models import Camera
+from apps.kindergarten.models import (
+    District, DistrictStats, KinderGarten, KinderGartenCamera, KinderGartenStats, Region, RegionStats
+)
+from apps.kindergarten.models.stats import STATS_FIELDS
+from apps.kindergarten.signals import create_stats_after_migrate
+from apps.kindergarten.stats import create_missing_stats, recompute_stats
+from apps.participants.models import Child, Group, RepresentativeChild
+
+
+@override_settings(CAMERA_PROVISIONING_ENABLED=False)
+class StatsRollupTests(TestCase):
+
+    def setUp(self):
+        self.region = Region.objects.create(name='Region')
+        self.district = District.objects.create(region=self.region, name='District')
+        self.kindergarten = self.create_kindergarten(self.district)
+        self.group = Group.objects.create(kindergarten=self.kindergarten, name='Group', limit=10)
+
+    @staticmethod
+    def create_kindergarten(district, name='Kindergarten'):
+        return KinderGarten.objects.create(name=name, district=district, description='', phone='1', inn='1')
+
+    def create_child(self, group=None):
+        group = group or self.group
+        return Child.objects.create(kindergarten=group.kindergarten, group=group, first_name='First', last_name='Last')
+
+    @staticmethod
+    def get_counters(model, pk):
+        return model.objects.filter(pk=pk).values(*STATS_FIELDS).get()
+
+    def assertCounters(self, pk, **expected):
+        counters = self.get_counters(KinderGartenStats, pk)
+        self.assertEqual({field: counters[field] for field in expected}, expected)
+
+    def assertRollupsMatchRecompute(self):
+        """
+        The incrementally kept counters are the ones recompute_stats computes from the tables
+        """
+        incremental = [list(model.objects.order_by('pk').values_list(*STATS_FIELDS))
+                       for model in (KinderGartenStats, DistrictStats, RegionStats)]
+        recompute_stats()
+        recomputed = [list(model.objects.order_by('pk').values_list(*STATS_FIELDS))
+                      for model in (KinderGartenStats, DistrictStats, RegionStats)]
+        self.assertEqual(incremental, recomputed)
+
+    def test_rows_are_created_with_their_objects(self):
+        self.assertTrue(RegionStats.objects.filter(pk=self.region.pk).exists())
+        self.assertTrue(DistrictStats.objects.filter(pk=self.district.pk).exists())
+        self.assertTrue(KinderGartenStats.objects.filter(pk=self.kindergarten.pk).exists())
+
+    def test_children_and_groups_roll_up(self):
+        self.create_child()
+        self.create_child()
+        self.assertCounters(self.kindergarten.pk, children=2, groups=1)
+        self.assertEqual(self.get_counters(DistrictStats, self.district.pk)['children'], 2)
+        self.assertEqual(self.get_counters(RegionStats, self.region.pk)['children'], 2)
+
+        Child.objects.first().delete()
+        self.assertCounters(self.kindergarten.pk, children=1)
+        self.assertEqual(self.get_counters(RegionStats, self.region.pk)['children'], 1)
+        self.assertRollupsMatchRecompute()
+
+    def test_parents_count_once_per_kindergarten(self):
+        user = CustomUser.objects.create(phone_number='998901234567', first_name='First')
+        links = [RepresentativeChild.objects.create(representative=user, child=self.create_child()) for _ in range(2)]
+        self.assertCounters(self.kindergarten.pk, parents=1)
+        links[0].delete()
+        self.assertCounters(self.kindergarten.pk, parents=1)
+        links[1].delete()
+        self.assertCounters(self.kindergarten.pk, parents=0)
+
+    def test_cameras_and_their_status_roll_up(self):
+        cameras = [Camera.objects.create(name=f'Camera {index}', ip='127.0.0.1', port=554) for index in range(2)]
+        for camera in cameras:
+            KinderGartenCamera.objects.create(kindergarten=self.kindergarten, camera=camera)
+        self.assertCounters(self.kindergarten.pk, cameras=2, online_cameras=2)
+
+        cameras[0].status = False
+        cameras[0].save()
+        self.assertCounters(self.kindergarten.pk, cameras=2, online_cameras=1)
+        self.assertEqual(self.get_counters(RegionStats, self.region.pk)['online_cameras'], 1)
+
+        KinderGartenCamera.objects.filter(camera=cameras[1]).delete()
+        self.assertCounters(self.kindergarten.pk, cameras=1, online_cameras=0)
+        self.assertRollupsMatchRecompute()
+
+    def test_moved_child_moves_its_counters(self):
+        user = CustomUser.objects.create(phone_number='998901234567', first_name='First')
+        child = self.create_child()
+        RepresentativeChild.objects.create(representative=user, child=child)
+        other_district = District.objects.create(region=self.region, name='Other district')
+        other = self.create_kindergarten(other_district, 'Other kindergarten')
+
+        child.kindergarten = other
+        child.group = Group.objects.create(kindergarten=other, name='Group', limit=10)
+        child.save()
+        self.assertCounters(self.kindergarten.pk, children=0, parents=0)
+        self.assertCounters(other.pk, children=1, parents=1)
+        self.assertEqual(self.get_counters(DistrictStats, self.district.pk)['children'], 0)
+        self.assertEqual(self.get_counters(DistrictStats, other_district.pk)['children'], 1)
+        self.assertEqual(self.get_counters(RegionStats, self.region.pk)['children'], 1)
+        self.assertRollupsMatchRecompute()
+
+    def test_moved_kindergarten_moves_its_counters(self):
+        self.create_child()
+        other_region = Region.objects.create(name='Other region')
+        other_district = District.objects.create(region=other_region, name='Other district')
+
+        self.kindergarten.district = other_district
+        self.kindergarten.save()
+        self.assertEqual(self.get_counters(DistrictStats, self.district.pk)['children'], 0)
+        self.assertEqual(self.get_counters(RegionStats, self.region.pk)['children'], 0)
+        self.assertEqual(self.get_counters(DistrictStats, other_district.pk)['children'], 1)
+        self.assertEqual(self.get_counters(RegionStats, other_region.pk)['children'], 1)
+        self.assertRollupsMatchRecompute()
+
+    def test_missing_rows_are_created_with_their_counters(self):
+        # Rows made before the rollups existed
+        self.create_child()
+        for model in (KinderGartenStats, DistrictStats, RegionStats):
+            model.objects.all().delete()
+
+        self.assertTrue(create_missing_stats())
+        self.assertCounters(self.kindergarten.pk, children=1, groups=1)
+        self.assertEqual(self.get_counters(RegionStats, self.region.pk)['children'], 1)
+        self.assertFalse(create_missing_stats())
+
+    def test_missing_rows_are_created_after_migrate(self):
+        self.create_child()
+        KinderGartenStats.objects.all().delete()
+
+        out = io.StringIO()
+        create_stats_after_migrate(sender=None, stdout=out)
+        self.assertCounters(self.kindergarten.pk, children=1, groups=1)
+        self.assertIn('some rows were missing', out.getvalue())
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from apps.kindergarten.views import NearbyKinderGartenAPIView, StatsAPIView
+
+urlpatterns = [
+    path('nearby/', NearbyKinderGartenAPIView.as_view(), name='kindergartens-nearby'),
+    path('stats/', StatsAPIView.as_view(), name='kindergartens-stats'),
+]
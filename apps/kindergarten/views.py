@@ -1,2 +1,80 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.db.models import F
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from apps.authentication.authentication import CustomJWTAuthentication
+from apps.authentication.permissions import IsAdminUserType
+from apps.kindergarten.models import DistrictStats, KinderGartenStats, RegionStats
+from apps.kindergarten.models.stats import STATS_FIELDS
+from apps.kindergarten.serializers import (
+    NearbyKinderGartenSerializer, NearbyQuerySerializer, StatsQuerySerializer, StatsSerializer
+)
+from apps.kindergarten.services import find_nearby_kindergartens
+
+
+class NearbyKinderGartenAPIView(APIView):
+    """
+    This view is used to find the kindergartens around a location, nearest first.
+    radius is in kilometers.
+    """
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CustomJWTAuthentication]
+
+    def get(self, request):
+        query = NearbyQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        kindergartens = find_nearby_kindergartens(
+            query.validated_data['lat'],
+            query.validated_data['lon'],
+            query.validated_data.get('radius', settings.KINDERGARTEN_NEARBY_RADIUS),
+            settings.KINDERGARTEN_NEARBY_LIMIT,
+        )
+        return Response({'kindergartens': NearbyKinderGartenSerializer(kindergartens, many=True).data})
+
+
+class StatsAPIView(APIView):
+    """
+    This view is used to read the rollup counters.
+    Without parameters it lists the regions, with ?region= the districts of the region and
+    with ?district= the kindergartens of the district, each with the totals of the level above.
+    The counters are read from the rollup tables, nothing is aggregated on request.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUserType]
+    authentication_classes = [CustomJWTAuthentication]
+
+    def get(self, request):
+        query = StatsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        region_id = query.validated_data.get('region')
+        district_id = query.validated_data.get('district')
+
+        if district_id is not None:
+            total = DistrictStats.objects.filter(pk=district_id).annotate(
+                id=F('district_id'), name=F('district__name')
+            )
+            items = KinderGartenStats.objects.filter(kindergarten__district_id=district_id).annotate(
+                id=F('kindergarten_id'), name=F('kindergarten__name')
+            )
+        elif region_id is not None:
+            total = RegionStats.objects.filter(pk=region_id).annotate(id=F('region_id'), name=F('region__name'))
+            items = DistrictStats.objects.filter(district__region_id=region_id).annotate(
+                id=F('district_id'), name=F('district__name')
+            )
+        else:
+            total = None
+            items = RegionStats.objects.annotate(id=F('region_id'), name=F('region__name'))
+
+        fields = ['id', 'name', *STATS_FIELDS]
+        items = list(items.order_by('name').values(*fields))
+        if total is not None:
+            total = total.values(*fields).first()
+            if total is None:
+                return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'total': StatsSerializer(total).data if total is not None else None,
+            'items': StatsSerializer(items, many=True).data,
+        })
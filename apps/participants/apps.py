@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ParticipantsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.participants'
+
+    def ready(self):
+        import apps.participants.signals
+
+        post_migrate.connect(apps.participants.signals.fill_occupancy_after_migrate, sender=self)
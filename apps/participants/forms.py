@@ -0,0 +1,16 @@
+import os
+
+from django import forms
+
+
+class RosterImportForm(forms.Form):
+    """
+    Upload of a roster file in the admin
+    """
+    roster = forms.FileField(help_text='A .csv or .xlsx file with a header row')
+
+    def clean_roster(self):
+        roster = self.cleaned_data['roster']
+        if os.path.splitext(roster.name)[1].lower() not in ('.csv', '.xlsx'):
+            raise forms.ValidationError('Only .csv and .xlsx files can be imported')
+        return roster
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.participants.roster import OPTIONAL_COLUMNS, REQUIRED_COLUMNS, RosterError, RosterImporter, read_roster
+
+
+class Command(BaseCommand):
+    """
+    Onboard the groups, children and representatives of a .csv or .xlsx roster file
+    """
+    help = (
+        'Import a roster file with the columns '
+        f'{", ".join(sorted(REQUIRED_COLUMNS))} and optionally {", ".join(sorted(OPTIONAL_COLUMNS))}'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path of the .csv or .xlsx file')
+        parser.add_argument('--kindergarten', type=int, help='Kindergarten id of the rows without a kindergarten column')
+        parser.add_argument('--batch-size', type=int, help='Rows written per transaction, ROSTER_BATCH_SIZE by default')
+
+    def handle(self, *args, **options):
+        importer = RosterImporter(kindergarten_id=options['kindergarten'], batch_size=options['batch_size'])
+        try:
+            with open(options['path'], 'rb') as roster_file:
+                importer.run(read_roster(roster_file, options['path']))
+        except (OSError, RosterError) as e:
+            raise CommandError(e)
+
+        for line, errors in importer.errors:
+            self.stderr.write(f'Line {line}: {errors}')
+        if importer.stats['errors'] > len(importer.errors):
+            self.stderr.write(f'... and {importer.stats["errors"] - len(importer.errors)} more errors')
+
+        stats = importer.stats
+        self.stdout.write(self.style.SUCCESS(
+            f'{stats["rows"]} rows imported: {stats["groups_created"]} groups, {stats["children_created"]} children, '
+            f'{stats["users_created"]} users created, {stats["users_updated"]} users updated, '
+            f'{stats["links_created"]} links created, {stats["links_existing"]} already linked, '
+            f'{stats["errors"]} rows with errors'
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.participants.models import RepresentativeChild
+from apps.participants.services import materialize_camera_grants
+
+
+class Command(BaseCommand):
+    """
+    Give all representative links the grants of their child's kindergarten cameras they are missing,
+    e.g. for links made before grants were derived. Existing grants are kept.
+    """
+    help = 'Add the missing camera grants of all representatives from the kindergarten cameras'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of links handled per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        link_ids = RepresentativeChild.objects.order_by('pk').values_list('pk', flat=True)
+
+        total = 0
+        batch = []
+        for link_id in link_ids.iterator(chunk_size=batch_size):
+            batch.append(link_id)
+            if len(batch) == batch_size:
+                with transaction.atomic():
+                    materialize_camera_grants(batch)
+                total += len(batch)
+                batch = []
+        with transaction.atomic():
+            materialize_camera_grants(batch)
+        total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Camera grants materialized for {total} links'))
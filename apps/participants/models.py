@@ -1,5 +1,7 @@
 from django.conf import settings
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F
 from django.utils.translation import gettext_lazy as _
 
 from apps.authentication.models import CustomUser
@@ -39,11 +41,53 @@ class Employee(AbstractBaseModel):
     class Meta:
         verbose_name = 'Employee',
         verbose_name_plural = 'Employees'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='employee_keyset_idx'),
+        ]
 
 
-class Group(models.Model):
+class GroupFullError(ValidationError):
     """
-    This model is used to store the information of the groups
+    The group has no free place for the child
+    """
+    pass
+
+
+class GroupManager(models.Manager):
+    def reserve_places(self, counts):
+        """
+        Take places in the groups, counts is {group id: places wanted}.
+        Each group is one conditional UPDATE ... WHERE occupancy + places <= limit, so concurrent
+        enrolments can't overfill a group. When a group can't take all of them, as many as are free
+        are taken. Returns {group id: places taken}.
+        """
+        taken = {}
+        for group_id, places in counts.items():
+            if self.filter(pk=group_id, occupancy__lte=F('limit') - places).update(
+                occupancy=F('occupancy') + places
+            ):
+                taken[group_id] = places
+                continue
+            group = self.select_for_update().filter(pk=group_id).values('limit', 'occupancy').first()
+            taken[group_id] = min(places, max(group['limit'] - group['occupancy'], 0)) if group else 0
+            if taken[group_id]:
+                self.filter(pk=group_id).update(occupancy=F('occupancy') + taken[group_id])
+        return taken
+
+    def release_places(self, counts):
+        """
+        Give back places, counts is {group id: places}
+        """
+        for group_id, places in counts.items():
+            if places:
+                self.filter(pk=group_id).update(occupancy=F('occupancy') - places)
+
+
+class Group(AbstractBaseModel):
+    """
+    This model is used to store the information of the groups.
+    occupancy is the number of children in the group, kept by Child.save() and the child post_delete signal,
+    so the limit is checked without counting the children. Groups older than the counter are counted after migrate.
     """
     kindergarten = models.ForeignKey(
         'kindergarten.KinderGarten',
@@ -52,6 +96,7 @@ class Group(models.Model):
     )
     name = models.CharField(max_length=255)
     limit = models.IntegerField()
+    occupancy = models.PositiveIntegerField(default=0, editable=False)
     first_employee = models.ForeignKey(
         Employee,
         on_delete=models.SET_NULL,
@@ -67,15 +112,30 @@ class Group(models.Model):
         related_name='second_employee'
     )
 
+    objects = GroupManager()
+
+    def save(self, *args, **kwargs):
+        # occupancy is only changed with UPDATEs, don't overwrite it with the value loaded earlier
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname != 'occupancy'
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f'{self.name}: {self.kindergarten.name}'
 
     class Meta:
         verbose_name = 'Group'
         verbose_name_plural = 'Groups'
+        indexes = [
+            # Keyset pagination of the groups of a kindergarten
+            models.Index(fields=['kindergarten', 'created_at', 'id'], name='group_kindergarten_keyset_idx'),
+        ]
 
 
-class Child(models.Model):
+class Child(AbstractBaseModel):
     """
     This model is used to store the information of the children
     """
@@ -94,9 +154,37 @@ class Child(models.Model):
         related_name='children',
     )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The group the child takes a place in, a changed group_id moves the place on save
+        instance._saved_group_id = instance.__dict__.get('group_id')
+        return instance
+
     def clean(self):
         if self.kindergarten_id != self.group.kindergarten_id:
             raise ValueError('The group should be in the same kindergarten as the child')
+        if self.group_id != getattr(self, '_saved_group_id', None) and self.group.occupancy >= self.group.limit:
+            raise ValidationError({'group': 'The group is full'})
+
+    def save(self, *args, **kwargs):
+        """
+        Take a place in the group when the child is added or moved, raises GroupFullError when it is full
+        """
+        previous_group_id = getattr(self, '_saved_group_id', None)
+        if previous_group_id is None and self.pk is not None and not self._state.adding:
+            previous_group_id = Child.objects.filter(pk=self.pk).values_list('group_id', flat=True).first()
+        if self.group_id == previous_group_id:
+            super().save(*args, **kwargs)
+            return
+
+        with transaction.atomic():
+            if not Group.objects.reserve_places({self.group_id: 1})[self.group_id]:
+                raise GroupFullError({'group': 'The group is full'})
+            if previous_group_id is not None:
+                Group.objects.release_places({previous_group_id: 1})
+            super().save(*args, **kwargs)
+        self._saved_group_id = self.group_id
 
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
@@ -104,6 +192,11 @@ class Child(models.Model):
     class Meta:
         verbose_name = 'Child',
         verbose_name_plural = 'Children'
+        indexes = [
+            # Keyset pagination of the children of a kindergarten or group
+            models.Index(fields=['kindergarten', 'created_at', 'id'], name='child_kindergarten_keyset_idx'),
+            models.Index(fields=['group', 'created_at', 'id'], name='child_group_keyset_idx'),
+        ]
 
 
 class RepresentativeChild(AbstractBaseModel):
@@ -158,6 +251,7 @@ class RepresentativeChild(AbstractBaseModel):
     class Meta:
         verbose_name = 'Child Representative',
         verbose_name_plural = 'Children Representatives'
+        unique_together = ('representative', 'child')
 
 
 class RepresentativeChildCamera(AbstractBaseModel):
@@ -0,0 +1,370 @@
+import csv
+import io
+import os
+from collections import Counter
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from apps.authentication.models import CustomUser
+from apps.kindergarten.models.kindergarten import KinderGarten
+from apps.kindergarten.stats import apply_stats_deltas
+from apps.participants.models import Child, Group, RepresentativeChild
+from apps.participants.services import bulk_link_representatives
+from apps.utils.validators import validate_phone_number
+
+# Columns of a roster file, the kindergarten column may be left out when it is given to the import
+REQUIRED_COLUMNS = {'group', 'child_first_name', 'child_last_name', 'parent_phone'}
+OPTIONAL_COLUMNS = {'kindergarten', 'child_birth_date', 'parent_first_name', 'parent_last_name', 'relation'}
+
+RELATIONS = {status.lower(): status for status in RepresentativeChild.StatusRepresentative.values}
+
+
+class RosterError(Exception):
+    """
+    The roster file can't be read at all
+    """
+    pass
+
+
+def read_csv_rows(file):
+    reader = csv.DictReader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    for row in reader:
+        yield row
+
+
+def read_xlsx_rows(file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RosterError('openpyxl must be installed to import .xlsx files')
+
+    # read_only streams the rows from the archive instead of loading the whole sheet
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(value) if value is not None else '' for value in next(rows, ())]
+        for values in rows:
+            if any(value is not None for value in values):
+                yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def read_roster(file, file_name):
+    """
+    Yield the rows of a .csv or .xlsx roster as dicts, one at a time.
+    file is opened in binary mode.
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == '.csv':
+        return read_csv_rows(file)
+    if extension == '.xlsx':
+        return read_xlsx_rows(file)
+    raise RosterError(f'Unsupported roster file type: {extension or file_name}')
+
+
+def get_age(birth_date):
+    today = date.today()
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+
+class RosterImporter:
+    """
+    Create the groups, children and representatives of a roster file and link them.
+    Rows are handled in batches of batch_size, each in its own transaction: the existing users,
+    groups and children of a batch are fetched with one query each and the missing ones are
+    written with bulk_create, so the work per batch is a fixed number of queries and the memory
+    doesn't grow with the file. Re-importing a file creates nothing new.
+    Children are matched on kindergarten, group, name and birth date, users on the phone number.
+    """
+    # Row errors kept for the report, the rest is only counted
+    max_errors = 100
+
+    def __init__(self, kindergarten_id=None, batch_size=None):
+        self.kindergarten_id = kindergarten_id
+        self.batch_size = batch_size or settings.ROSTER_BATCH_SIZE
+        self.kindergartens = set()
+        self.stats = Counter()
+        self.errors = []
+
+    def add_error(self, line, messages):
+        self.stats['errors'] += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, messages))
+
+    def run(self, rows):
+        """
+        Import the rows, the first row of the file is the header, so data starts on line 2
+        """
+        batch = []
+        for line, row in enumerate(rows, start=2):
+            if line == 2:
+                self.check_columns(row)
+            batch.append((line, row))
+            if len(batch) == self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self
+
+    def check_columns(self, row):
+        columns = {self.normalize_column(column) for column in row}
+        missing = REQUIRED_COLUMNS - columns
+        if self.kindergarten_id is None and 'kindergarten' not in columns:
+            missing.add('kindergarten')
+        if missing:
+            raise RosterError(f'Missing columns: {", ".join(sorted(missing))}')
+
+    @staticmethod
+    def normalize_column(column):
+        return str(column or '').strip().lower()
+
+    def parse_row(self, row):
+        values = {
+            self.normalize_column(column): str(value).strip() if value is not None else ''
+            for column, value in row.items()
+            if column is not None
+        }
+        errors = {}
+
+        kindergarten_id = values.get('kindergarten') or self.kindergarten_id
+        try:
+            kindergarten_id = int(kindergarten_id)
+        except (TypeError, ValueError):
+            errors['kindergarten'] = ['A valid kindergarten id is required']
+
+        for column in ('group', 'child_first_name', 'child_last_name'):
+            if not values.get(column):
+                errors[column] = ['This field is required']
+
+        try:
+            phone_number = validate_phone_number(values.get('parent_phone', ''))
+        except ValidationError as e:
+            errors['parent_phone'] = e.messages
+
+        birth_date = None
+        if values.get('child_birth_date'):
+            # xlsx cells come as datetimes, only the date part is used
+            birth_date = parse_date(values['child_birth_date'][:10])
+            if birth_date is None:
+                errors['child_birth_date'] = ['Date has wrong format. Use YYYY-MM-DD']
+
+        relation = RepresentativeChild.StatusRepresentative.PARENT
+        if values.get('relation'):
+            relation = RELATIONS.get(values['relation'].lower())
+        if relation is None:
+            errors['relation'] = [f'Must be one of: {", ".join(RepresentativeChild.StatusRepresentative.values)}']
+
+        if errors:
+            raise ValidationError(errors)
+        return {
+            'kindergarten': kindergarten_id,
+            'group': values['group'],
+            'first_name': values['child_first_name'],
+            'last_name': values['child_last_name'],
+            'birth_date': birth_date,
+            'phone_number': phone_number,
+            'parent_first_name': values.get('parent_first_name', ''),
+            'parent_last_name': values.get('parent_last_name', ''),
+            'relation': relation,
+        }
+
+    def import_batch(self, batch):
+        rows = []
+        for line, row in batch:
+            self.stats['rows'] += 1
+            try:
+                rows.append((line, self.parse_row(row)))
+            except ValidationError as e:
+                self.add_error(line, e.message_dict)
+
+        rows = self.check_kindergartens(rows)
+        if not rows:
+            return
+
+        with transaction.atomic():
+            groups = self.resolve_groups(rows)
+            users = self.resolve_users(rows)
+            children = self.resolve_children(rows, groups)
+            self.link(self.check_children(rows, children), users, children)
+
+    def check_kindergartens(self, rows):
+        unknown = {row['kindergarten'] for _, row in rows} - self.kindergartens
+        if unknown:
+            self.kindergartens.update(KinderGarten.objects.filter(pk__in=unknown).values_list('pk', flat=True))
+
+        valid_rows = []
+        for line, row in rows:
+            if row['kindergarten'] in self.kindergartens:
+                valid_rows.append((line, row))
+            else:
+                self.add_error(line, {'kindergarten': ['Kindergarten not found']})
+        return valid_rows
+
+    def resolve_groups(self, rows):
+        """
+        (kindergarten id, group name) -> group id, creating the missing groups
+        """
+        keys = {(row['kindergarten'], row['group']) for _, row in rows}
+        groups = {}
+        # Lowest pk wins when a kindergarten has several groups of the same name
+        for group_id, kindergarten_id, name in Group.objects.filter(
+            kindergarten_id__in={kindergarten_id for kindergarten_id, _ in keys},
+            name__in={name for _, name in keys},
+        ).order_by('-pk').values_list('pk', 'kindergarten_id', 'name'):
+            groups[(kindergarten_id, name)] = group_id
+
+        new_groups = [
+            Group(kindergarten_id=kindergarten_id, name=name, limit=settings.ROSTER_GROUP_LIMIT)
+            for kindergarten_id, name in keys if (kindergarten_id, name) not in groups
+        ]
+        for group in Group.objects.bulk_create(new_groups):
+            groups[(group.kindergarten_id, group.name)] = group.pk
+        # bulk_create sends no post_save, count the new groups and children here
+        apply_stats_deltas({
+            kindergarten_id: {'groups': total}
+            for kindergarten_id, total in Counter(group.kindergarten_id for group in new_groups).items()
+        })
+        self.stats['groups_created'] += len(new_groups)
+        return groups
+
+    def resolve_users(self, rows):
+        """
+        phone number -> user, creating the missing representatives without a usable password,
+        they set one through the OTP flow. Blank names of existing users are filled in.
+        """
+        User = get_user_model()
+        users = {
+            user.phone_number: user for user in User.objects.filter(
+                phone_number__in={row['phone_number'] for _, row in rows}
+            ).only('pk', 'phone_number', 'first_name', 'last_name')
+        }
+
+        new_users = {}
+        updated_users = {}
+        for _, row in rows:
+            phone_number = row['phone_number']
+            user = users.get(phone_number)
+            if user is None:
+                if phone_number not in new_users:
+                    new_users[phone_number] = User(
+                        phone_number=phone_number,
+                        first_name=row['parent_first_name'],
+                        last_name=row['parent_last_name'],
+                        ut=CustomUser.UserTypes.USER,
+                        password=make_password(None),
+                    )
+            elif not user.first_name and not user.last_name and (row['parent_first_name'] or row['parent_last_name']):
+                user.first_name = row['parent_first_name']
+                user.last_name = row['parent_last_name']
+                updated_users[user.pk] = user
+
+        for user in User.objects.bulk_create(new_users.values()):
+            users[user.phone_number] = user
+        User.objects.bulk_update(updated_users.values(), ['first_name', 'last_name'])
+        self.stats['users_created'] += len(new_users)
+        self.stats['users_updated'] += len(updated_users)
+        return users
+
+    @staticmethod
+    def get_child_key(group_id, first_name, last_name, birth_date):
+        return group_id, first_name, last_name, birth_date
+
+    def resolve_children(self, rows, groups):
+        """
+        Child key -> child id, creating the missing children that fit in their group
+        """
+        for _, row in rows:
+            row['group_id'] = groups[(row['kindergarten'], row['group'])]
+
+        children = {}
+        for child_id, group_id, first_name, last_name, birth_date in Child.objects.filter(
+            group_id__in={row['group_id'] for _, row in rows},
+            first_name__in={row['first_name'] for _, row in rows},
+            last_name__in={row['last_name'] for _, row in rows},
+        ).order_by('-pk').values_list('pk', 'group_id', 'first_name', 'last_name', 'birth_date'):
+            children[self.get_child_key(group_id, first_name, last_name, birth_date)] = child_id
+
+        new_children = {}
+        for _, row in rows:
+            key = self.get_child_key(row['group_id'], row['first_name'], row['last_name'], row['birth_date'])
+            if key not in children and key not in new_children:
+                child = Child(
+                    kindergarten_id=row['kindergarten'],
+                    group_id=row['group_id'],
+                    first_name=row['first_name'],
+                    last_name=row['last_name'],
+                    birth_date=row['birth_date'],
+                )
+                if row['birth_date']:
+                    child.age = get_age(row['birth_date'])
+                new_children[key] = child
+
+        # bulk_create skips Child.save(), take the places of the new children per group here.
+        # Children that don't fit in their group are left out, their rows are reported.
+        free_places = Group.objects.reserve_places(Counter(child.group_id for child in new_children.values()))
+        for key, child in list(new_children.items()):
+            if free_places[child.group_id]:
+                free_places[child.group_id] -= 1
+            else:
+                del new_children[key]
+
+        for key, child in zip(new_children, Child.objects.bulk_create(new_children.values())):
+            children[key] = child.pk
+        apply_stats_deltas({
+            kindergarten_id: {'children': total}
+            for kindergarten_id, total in Counter(child.kindergarten_id for child in new_children.values()).items()
+        })
+        self.stats['children_created'] += len(new_children)
+        return children
+
+    def check_children(self, rows, children):
+        valid_rows = []
+        for line, row in rows:
+            if self.get_child_key(row['group_id'], row['first_name'], row['last_name'], row['birth_date']) in children:
+                valid_rows.append((line, row))
+            else:
+                self.add_error(line, {'group': ['The group is full']})
+        return valid_rows
+
+    def link(self, rows, users, children):
+        """
+        Link the representatives through bulk_link_representatives, which checks the linking rules
+        and grants the kindergarten cameras. Links that already exist are skipped.
+        """
+        for _, row in rows:
+            row['child_id'] = children[
+                self.get_child_key(row['group_id'], row['first_name'], row['last_name'], row['birth_date'])
+            ]
+            row['representative_id'] = users[row['phone_number']].pk
+
+        existing_links = set(RepresentativeChild.objects.filter(
+            child_id__in={row['child_id'] for _, row in rows},
+        ).values_list('representative_id', 'child_id'))
+
+        links = []
+        lines = []
+        for line, row in rows:
+            pair = (row['representative_id'], row['child_id'])
+            if pair in existing_links:
+                self.stats['links_existing'] += 1
+                continue
+            existing_links.add(pair)
+            links.append({
+                'representative': row['representative_id'],
+                'child': row['child_id'],
+                'status': row['relation'],
+            })
+            lines.append(line)
+
+        created, errors = bulk_link_representatives(links)
+        for index, link_errors in errors.items():
+            self.add_error(lines[index], link_errors)
+        self.stats['links_created'] += len(created)
@@ -1,9 +1,10 @@
 from rest_framework import serializers
 
-from apps.participants.models import Child, RepresentativeChild
+from apps.participants.models import Child, Employee, Group, RepresentativeChild
+from apps.utils.serializers import SelectableFieldsMixin, ValuesSerializer
 
 
-class ChildSerializer(serializers.ModelSerializer):
+class ChildSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     """
     This serializer is used to serialize the children of the user
     """
@@ -13,12 +14,70 @@ class ChildSerializer(serializers.ModelSerializer):
         fields = ['id', 'first_name', 'last_name', 'age']
 
 
-class RepresentativeChildSerializer(serializers.ModelSerializer):
+class ChildValuesSerializer(ValuesSerializer):
     """
-    This serializer is used to serialize the children of the user
+    Lean read path of ChildSerializer for the children of the user
+    """
+    value_fields = {
+        'id': ('id', None),
+        'first_name': ('first_name', None),
+        'last_name': ('last_name', None),
+        'age': ('age', None),
+    }
+
+
+class RepresentativeChildLinkSerializer(serializers.Serializer):
+    """
+    This serializer is used to validate one link of a bulk linking request
+    """
+    representative = serializers.IntegerField()
+    child = serializers.IntegerField()
+    status = serializers.ChoiceField(
+        choices=RepresentativeChild.StatusRepresentative.choices,
+        default=RepresentativeChild.StatusRepresentative.PARENT
+    )
+
+
+class GroupOccupancySerializer(serializers.ModelSerializer):
+    """
+    This serializer is used to serialize the occupancy of the groups
+    """
+    free = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Group
+        fields = ['id', 'name', 'limit', 'occupancy', 'free']
+
+    def get_free(self, obj):
+        return max(obj.limit - obj.occupancy, 0)
+
+
+class StaffChildSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    """
+    This serializer is used to list the children of a kindergarten for the staff
+    """
+
+    class Meta:
+        model = Child
+        fields = ['id', 'first_name', 'last_name', 'age', 'birth_date', 'kindergarten', 'group', 'created_at']
+
+
+class StaffGroupSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    """
+    This serializer is used to list the groups of a kindergarten for the staff
+    """
+
+    class Meta:
+        model = Group
+        fields = ['id', 'name', 'limit', 'occupancy', 'kindergarten', 'first_employee', 'second_employee', 'created_at']
+
+
+class StaffEmployeeSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    """
+    This serializer is used to list the employees for the staff
     """
-    child = ChildSerializer()
 
     class Meta:
-        model = RepresentativeChild
-        fields = ['child']
+        model = Employee
+        fields = ['id', 'first_name', 'last_name', 'phone', 'position', 'experience', 'start_date', 'end_date',
+                  'created_at']
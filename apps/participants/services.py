@@ -0,0 +1,194 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+
+from apps.authentication.models import CustomUser
+from apps.core.services import schedule_camera_access_refresh
+from apps.kindergarten.models import KinderGartenCamera
+from apps.kindergarten.stats import apply_stats_deltas, get_parent_deltas
+from apps.participants.models import Child, Group, RepresentativeChild, RepresentativeChildCamera
+from apps.utils.response_cache import bump_user_versions
+
+MAX_REPRESENTATIVES = 2
+
+
+def bulk_link_representatives(links):
+    """
+    Link representatives to children in bulk.
+    links is a list of dicts with representative, child and status.
+    The rules of RepresentativeChild.clean() are checked for the whole batch with a few
+    grouped queries instead of two queries per link, the valid links are inserted with bulk_create.
+    Pairs a concurrent request linked in between are reported as already linked.
+    Returns (created links, {index of the link: errors}).
+    """
+    representative_ids = {link['representative'] for link in links}
+    child_ids = {link['child'] for link in links}
+
+    with transaction.atomic():
+        # Lock the children, so concurrent batches can't push a child over the limit
+        # child id -> kindergarten id
+        existing_children = dict(
+            Child.objects.select_for_update().filter(pk__in=child_ids).values_list('pk', 'kindergarten_id')
+        )
+        representatives = set(
+            get_user_model().objects.filter(
+                pk__in=representative_ids, ut=CustomUser.UserTypes.USER
+            ).values_list('pk', flat=True)
+        )
+        existing_links = set(
+            RepresentativeChild.objects.filter(
+                child_id__in=child_ids, representative_id__in=representative_ids
+            ).values_list('representative_id', 'child_id')
+        )
+        counts = Counter({
+            row['child_id']: row['total'] for row in RepresentativeChild.objects.filter(
+                child_id__in=child_ids
+            ).values('child_id').annotate(total=Count('id'))
+        })
+
+        errors = {}
+        # index of the link -> new RepresentativeChild
+        new_links = {}
+        for index, link in enumerate(links):
+            pair = (link['representative'], link['child'])
+            if link['representative'] not in representatives:
+                errors[index] = {'representative': ['User not found or is not a representative']}
+            elif link['child'] not in existing_children:
+                errors[index] = {'child': ['Child not found']}
+            elif pair in existing_links:
+                errors[index] = {'non_field_errors': ['The user is already a representative of the child']}
+            elif counts[link['child']] >= MAX_REPRESENTATIVES:
+                errors[index] = {'non_field_errors': [f'This child already has {MAX_REPRESENTATIVES} representatives']}
+            else:
+                # Later rows of the batch see the links added before them
+                existing_links.add(pair)
+                counts[link['child']] += 1
+                new_links[index] = RepresentativeChild(
+                    representative_id=link['representative'],
+                    child_id=link['child'],
+                    status=link['status'],
+                )
+
+        try:
+            with transaction.atomic():
+                created = RepresentativeChild.objects.bulk_create(new_links.values(), batch_size=1000)
+        except IntegrityError:
+            # Another request linked some of the pairs after they were read, insert one by one to find them
+            created = []
+            for index, new_link in new_links.items():
+                try:
+                    with transaction.atomic():
+                        created += RepresentativeChild.objects.bulk_create([new_link])
+                except IntegrityError:
+                    if not RepresentativeChild.objects.filter(
+                        representative_id=new_link.representative_id, child_id=new_link.child_id
+                    ).exists():
+                        raise
+                    errors[index] = {'non_field_errors': ['The user is already a representative of the child']}
+        materialize_camera_grants([link.pk for link in created])
+        # bulk_create sends no post_save, count the new parents and outdate their cached children here
+        apply_stats_deltas(get_parent_deltas(
+            {(link.representative_id, existing_children[link.child_id]) for link in created}, 1,
+            exclude=Q(pk__in=[link.pk for link in created])
+        ))
+        bump_user_versions({link.representative_id for link in created})
+    return created, errors
+
+
+def materialize_camera_grants(representative_child_ids) -> None:
+    """
+    Give the given links the grants of their child's kindergarten cameras they don't have yet.
+    Grants are never removed here, other grants may have been given by hand.
+    Only the difference is written, in a fixed number of queries for the whole batch.
+    """
+    representative_child_ids = set(representative_child_ids)
+    if not representative_child_ids:
+        return
+
+    desired = set(
+        RepresentativeChild.objects.filter(
+            pk__in=representative_child_ids, child__kindergarten__cameras__isnull=False
+        ).values_list('pk', 'child__kindergarten__cameras__camera_id')
+    )
+    current = set(
+        RepresentativeChildCamera.objects.filter(
+            representative_child_id__in=representative_child_ids
+        ).values_list('representative_child_id', 'camera_id')
+    )
+
+    missing = desired.difference(current)
+    if missing:
+        RepresentativeChildCamera.objects.bulk_create(
+            [RepresentativeChildCamera(representative_child_id=link_id, camera_id=camera_id)
+             for link_id, camera_id in missing],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+        # bulk_create sends no post_save, refresh the access index here
+        schedule_camera_access_refresh(representative_child_ids={link_id for link_id, _ in missing})
+
+
+def move_camera_grants(representative_child_ids, previous_kindergarten_id, kindergarten_id) -> None:
+    """
+    Move the grants of links whose child changed kindergarten. Only the grants of the previous
+    kindergarten's cameras are removed, cameras the new kindergarten has too and grants of other
+    cameras are kept. The post_delete signal of the grants refreshes the access index.
+    """
+    representative_child_ids = set(representative_child_ids)
+    if not representative_child_ids:
+        return
+
+    RepresentativeChildCamera.objects.filter(
+        representative_child_id__in=representative_child_ids,
+        camera_id__in=KinderGartenCamera.objects.filter(kindergarten_id=previous_kindergarten_id).values('camera_id'),
+    ).exclude(
+        camera_id__in=KinderGartenCamera.objects.filter(kindergarten_id=kindergarten_id).values('camera_id'),
+    ).delete()
+    materialize_camera_grants(representative_child_ids)
+
+
+def grant_kindergarten_camera(kindergarten_id, camera_id) -> None:
+    """
+    Grant the camera to every representative of the children of the kindergarten
+    """
+    links = list(
+        RepresentativeChild.objects.filter(child__kindergarten_id=kindergarten_id).values_list(
+            'pk', 'representative_id'
+        )
+    )
+    if not links:
+        return
+    RepresentativeChildCamera.objects.bulk_create(
+        [RepresentativeChildCamera(representative_child_id=link_id, camera_id=camera_id) for link_id, _ in links],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+    schedule_camera_access_refresh(user_ids={representative_id for _, representative_id in links})
+
+
+def revoke_kindergarten_camera(kindergarten_id, camera_id) -> None:
+    """
+    Remove the grants of the camera given through the kindergarten.
+    The post_delete signal of the grants refreshes the access index.
+    """
+    RepresentativeChildCamera.objects.filter(
+        camera_id=camera_id,
+        representative_child__child__kindergarten_id=kindergarten_id,
+    ).delete()
+
+
+def recompute_group_occupancy() -> int:
+    """
+    Set the occupancy of every group to its number of children, fixing drift of the maintained counters.
+    Returns the number of groups changed.
+    """
+    counts = dict(Child.objects.values_list('group_id').annotate(total=Count('pk')))
+    changed = []
+    for group in Group.objects.only('pk', 'occupancy').iterator(chunk_size=1000):
+        if group.occupancy != counts.get(group.pk, 0):
+            group.occupancy = counts.get(group.pk, 0)
+            changed.append(group)
+    Group.objects.bulk_update(changed, ['occupancy'], batch_size=1000)
+    return len(changed)
@@ -1,4 +1,191 @@
-from django.db.models.signals import post_save
+import sys
+from collections import Counter, defaultdict
 
-from apps.participants.models import Employee
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 
+from apps.kindergarten.models import KinderGartenCamera
+from apps.kindergarten.stats import apply_stats_deltas, get_camera_deltas, get_parent_deltas
+from apps.participants.models import Child, Group, RepresentativeChild
+from apps.participants.services import (
+    grant_kindergarten_camera, materialize_camera_grants, move_camera_grants, recompute_group_occupancy,
+    revoke_kindergarten_camera
+)
+
+
+def fill_occupancy_after_migrate(sender, verbosity=1, stdout=None, **kwargs):
+    """
+    Count the children of the groups made before occupancy was kept, whose occupancy is still
+    the default 0, on every migrate. Connected in ParticipantsConfig.ready().
+    """
+    if Group.objects.filter(occupancy=0, children__isnull=False).exists():
+        changed = recompute_group_occupancy()
+        if verbosity >= 1:
+            (stdout or sys.stdout).write(f'  Filled in the occupancy of {changed} groups\n')
+
+
+@receiver(pre_save, sender=KinderGartenCamera)
+def remember_kindergarten_camera(sender, instance, **kwargs):
+    """
+    Keep the previous kindergarten and camera, so an edit can revoke the old grants
+    """
+    instance._previous_link = None
+    if instance.pk is not None:
+        instance._previous_link = sender.objects.filter(pk=instance.pk).values_list(
+            'kindergarten_id', 'camera_id'
+        ).first()
+
+
+@receiver(post_save, sender=KinderGartenCamera)
+def grant_camera(sender, instance, **kwargs):
+    """
+    Grant the camera to the representatives of the kindergarten's children
+    """
+    link = (instance.kindergarten_id, instance.camera_id)
+    previous = getattr(instance, '_previous_link', None)
+    if previous == link:
+        return
+    deltas = get_camera_deltas([link], 1)
+    if previous is not None:
+        revoke_kindergarten_camera(*previous)
+        for kindergarten_id, delta in get_camera_deltas([previous], -1).items():
+            deltas[kindergarten_id].update(delta)
+    grant_kindergarten_camera(*link)
+    apply_stats_deltas(deltas)
+
+
+@receiver(post_delete, sender=KinderGartenCamera)
+def revoke_camera(sender, instance, **kwargs):
+    """
+    Remove the grants given through the deleted kindergarten camera
+    """
+    revoke_kindergarten_camera(instance.kindergarten_id, instance.camera_id)
+    apply_stats_deltas(get_camera_deltas([(instance.kindergarten_id, instance.camera_id)], -1))
+
+
+@receiver(pre_save, sender=Child)
+def remember_child_placement(sender, instance, **kwargs):
+    """
+    Keep the previous kindergarten and group of the child
+    """
+    instance._previous_placement = None
+    if instance.pk is not None:
+        instance._previous_placement = sender.objects.filter(pk=instance.pk).values_list(
+            'kindergarten_id', 'group_id'
+        ).first()
+
+
+@receiver(post_save, sender=Child)
+def update_child_grants(sender, instance, created, **kwargs):
+    """
+    Move the camera grants of the child's representatives after the child moved to another kindergarten.
+    Grants don't depend on the group, moves within the kindergarten change nothing.
+    """
+    previous = getattr(instance, '_previous_placement', None)
+    if created or previous is None or previous[0] == instance.kindergarten_id:
+        return
+    move_camera_grants(instance.representatives.values_list('pk', flat=True), previous[0], instance.kindergarten_id)
+
+
+@receiver(post_save, sender=Child)
+def update_child_stats(sender, instance, created, **kwargs):
+    """
+    Count a new child, or move the child and its parents to the new kindergarten
+    """
+    if created:
+        apply_stats_deltas({instance.kindergarten_id: {'children': 1}})
+        return
+    previous = getattr(instance, '_previous_placement', None)
+    if previous is None or previous[0] == instance.kindergarten_id:
+        return
+
+    previous_kindergarten_id = previous[0]
+    representative_ids = set(instance.representatives.values_list('representative_id', flat=True))
+    deltas = defaultdict(Counter, {
+        previous_kindergarten_id: Counter(children=-1),
+        instance.kindergarten_id: Counter(children=1),
+    })
+    # The child is already saved in the new kindergarten, only the other children count in the old one
+    for kindergarten_id, delta in get_parent_deltas(
+        {(representative_id, previous_kindergarten_id) for representative_id in representative_ids}, -1
+    ).items():
+        deltas[kindergarten_id].update(delta)
+    for kindergarten_id, delta in get_parent_deltas(
+        {(representative_id, instance.kindergarten_id) for representative_id in representative_ids}, 1,
+        exclude=Q(child_id=instance.pk)
+    ).items():
+        deltas[kindergarten_id].update(delta)
+    apply_stats_deltas(deltas)
+
+
+@receiver(post_delete, sender=Child)
+def release_group_place(sender, instance, **kwargs):
+    """
+    Free the place of the child, here instead of Child.delete() to cover queryset deletes too
+    """
+    Group.objects.release_places({instance.group_id: 1})
+
+
+@receiver(post_delete, sender=Child)
+def remove_child_stats(sender, instance, **kwargs):
+    # RepresentativeChild.child is protected, the links and their parents are gone already
+    apply_stats_deltas({instance.kindergarten_id: {'children': -1}})
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_kindergarten(sender, instance, **kwargs):
+    """
+    Keep the previous kindergarten of the group
+    """
+    instance._previous_kindergarten_id = None
+    if instance.pk is not None:
+        instance._previous_kindergarten_id = sender.objects.filter(pk=instance.pk).values_list(
+            'kindergarten_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=Group)
+def update_group_stats(sender, instance, created, **kwargs):
+    if created:
+        apply_stats_deltas({instance.kindergarten_id: {'groups': 1}})
+        return
+    previous_kindergarten_id = getattr(instance, '_previous_kindergarten_id', None)
+    if previous_kindergarten_id is not None and previous_kindergarten_id != instance.kindergarten_id:
+        apply_stats_deltas({previous_kindergarten_id: {'groups': -1}, instance.kindergarten_id: {'groups': 1}})
+
+
+@receiver(post_delete, sender=Group)
+def remove_group_stats(sender, instance, **kwargs):
+    apply_stats_deltas({instance.kindergarten_id: {'groups': -1}})
+
+
+@receiver(post_save, sender=RepresentativeChild)
+def grant_link_cameras(sender, instance, **kwargs):
+    """
+    Give a new or changed link the cameras of its child's kindergarten
+    """
+    materialize_camera_grants([instance.pk])
+
+
+@receiver(post_save, sender=RepresentativeChild)
+def count_link_parent(sender, instance, created, **kwargs):
+    """
+    Count the representative as a parent of the child's kindergarten, unless already counted
+    """
+    if not created:
+        return
+    kindergarten_id = Child.objects.filter(pk=instance.child_id).values_list('kindergarten_id', flat=True).first()
+    apply_stats_deltas(get_parent_deltas(
+        {(instance.representative_id, kindergarten_id)}, 1, exclude=Q(pk=instance.pk)
+    ))
+
+
+@receiver(post_delete, sender=RepresentativeChild)
+def uncount_link_parent(sender, instance, **kwargs):
+    """
+    Stop counting the representative in the kindergarten when this was the last child there
+    """
+    kindergarten_id = Child.objects.filter(pk=instance.child_id).values_list('kindergarten_id', flat=True).first()
+    if kindergarten_id is not None:
+        apply_stats_deltas(get_parent_deltas({(instance.representative_id, kindergarten_id)}, -1))
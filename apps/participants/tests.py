@@ -1,3 +1,425 @@
-from django.test import TestCase
+import io
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.authentication.models import CustomUser
+from apps.authentication.services import generate_jwt_token
+from apps.core.models import Camera
+from apps.kindergarten.models import District, KinderGarten, KinderGartenCamera, Region
+from apps.participants.models import Child, Group, GroupFullError, RepresentativeChild, RepresentativeChildCamera
+from apps.participants.services import bulk_link_representatives, materialize_camera_grants
+from apps.participants.signals import fill_occupancy_after_migrate
+
+
+class ParticipantsTestCase(TestCase):
+    """
+    A kindergarten with a group and helpers to add children and users
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.region = Region.objects.create(name='Region')
+        cls.district = District.objects.create(region=cls.region, name='District')
+        cls.kindergarten = cls.create_kindergarten()
+        cls.group = Group.objects.create(kindergarten=cls.kindergarten, name='Group', limit=100)
+
+    @classmethod
+    def create_kindergarten(cls, name='Kindergarten'):
+        return KinderGarten.objects.create(name=name, district=cls.district, description='', phone='1', inn='1')
+
+    @staticmethod
+    def create_user(index, ut=CustomUser.UserTypes.USER):
+        return CustomUser.objects.create(phone_number=f'99890{index:07d}', first_name='First', ut=ut)
+
+    def create_children(self, count, group=None):
+        group = group or self.group
+        return [
+            Child.objects.create(kindergarten=group.kindergarten, group=group, first_name=f'Child {index}',
+                                 last_name='Last')
+            for index in range(count)
+        ]
+
+
+class BulkLinkRepresentativesTests(ParticipantsTestCase):
+
+    def test_valid_links_are_created(self):
+        children = self.create_children(2)
+        users = [self.create_user(index) for index in range(2)]
+        created, errors = bulk_link_representatives([
+            {'representative': users[0].pk, 'child': children[0].pk, 'status': 'Parent'},
+            {'representative': users[1].pk, 'child': children[0].pk, 'status': 'Guardian'},
+            {'representative': users[0].pk, 'child': children[1].pk, 'status': 'Parent'},
+        ])
+        self.assertEqual(len(created), 3)
+        self.assertEqual(errors, {})
+        self.assertEqual(RepresentativeChild.objects.filter(child=children[0]).count(), 2)
+        self.assertEqual(
+            RepresentativeChild.objects.get(representative=users[1], child=children[0]).status, 'Guardian'
+        )
+
+    def test_rows_are_checked_against_the_database_and_the_batch(self):
+        child, = self.create_children(1)
+        users = [self.create_user(index) for index in range(4)]
+        RepresentativeChild.objects.create(representative=users[0], child=child)
+        admin = self.create_user(9, ut=CustomUser.UserTypes.ADMIN)
+
+        created, errors = bulk_link_representatives([
+            {'representative': users[0].pk, 'child': child.pk, 'status': 'Parent'},
+            {'representative': users[1].pk, 'child': child.pk, 'status': 'Parent'},
+            {'representative': users[1].pk, 'child': child.pk, 'status': 'Parent'},
+            {'representative': users[2].pk, 'child': child.pk, 'status': 'Parent'},
+            {'representative': admin.pk, 'child': child.pk, 'status': 'Parent'},
+            {'representative': users[3].pk, 'child': 0, 'status': 'Parent'},
+        ])
+        self.assertEqual([(link.representative_id, link.child_id) for link in created], [(users[1].pk, child.pk)])
+        self.assertEqual(sorted(errors), [0, 2, 3, 4, 5])
+        self.assertIn('already a representative', errors[0]['non_field_errors'][0])
+        self.assertIn('already a representative', errors[2]['non_field_errors'][0])
+        self.assertIn('2 representatives', errors[3]['non_field_errors'][0])
+        self.assertIn('representative', errors[4])
+        self.assertIn('child', errors[5])
+
+    def test_pairs_linked_by_a_concurrent_request_are_reported(self):
+        children = self.create_children(2)
+        user = self.create_user(0)
+        objects_filter = RepresentativeChild.objects.filter
+
+        def link_concurrently(*args, **kwargs):
+            # Committed by another request after the existing links were read, before the representatives are counted
+            if set(kwargs) == {'child_id__in'}:
+                RepresentativeChild.objects.create(representative=user, child=children[0])
+            return objects_filter(*args, **kwargs)
+
+        with mock.patch.object(RepresentativeChild.objects, 'filter', side_effect=link_concurrently):
+            created, errors = bulk_link_representatives([
+                {'representative': user.pk, 'child': children[0].pk, 'status': 'Parent'},
+                {'representative': user.pk, 'child': children[1].pk, 'status': 'Parent'},
+            ])
+        self.assertEqual([(link.representative_id, link.child_id) for link in created], [(user.pk, children[1].pk)])
+        self.assertEqual(list(errors), [0])
+        self.assertIn('already a representative', errors[0]['non_field_errors'][0])
+        self.assertEqual(RepresentativeChild.objects.filter(representative=user).count(), 2)
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        children = self.create_children(20)
+        users = [self.create_user(index) for index in range(20)]
+
+        def count_queries(links):
+            with CaptureQueriesContext(connection) as queries:
+                created, _ = bulk_link_representatives(links)
+            self.assertEqual(len(created), len(links))
+            return len(queries)
+
+        small = count_queries([
+            {'representative': users[index].pk, 'child': children[index].pk, 'status': 'Parent'}
+            for index in range(2)
+        ])
+        large = count_queries([
+            {'representative': users[index].pk, 'child': children[index].pk, 'status': 'Parent'}
+            for index in range(2, 20)
+        ])
+        self.assertEqual(small, large)
+
+
+class BulkLinkAPITests(ParticipantsTestCase):
+
+    def post(self, user, links):
+        return self.client.post(
+            reverse('representatives-bulk-link'), {'links': links}, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {generate_jwt_token(user).access_token}',
+        )
+
+    def test_only_admins_link(self):
+        child, = self.create_children(1)
+        user = self.create_user(0)
+        response = self.post(user, [{'representative': user.pk, 'child': child.pk}])
+        self.assertEqual(response.status_code, 403)
+
+    def test_created_and_errors_are_reported(self):
+        child, = self.create_children(1)
+        user = self.create_user(0)
+        admin = self.create_user(9, ut=CustomUser.UserTypes.ADMIN)
+
+        response = self.post(admin, [{'representative': user.pk, 'child': child.pk}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'created': 1, 'errors': []})
+
+        response = self.post(admin, [
+            {'representative': self.create_user(1).pk, 'child': child.pk},
+            {'representative': user.pk, 'child': child.pk},
+            {'child': child.pk},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1, 2])
+
+    def test_nothing_created_is_a_bad_request(self):
+        admin = self.create_user(9, ut=CustomUser.UserTypes.ADMIN)
+        self.assertEqual(self.post(admin, []).status_code, 400)
+        self.assertEqual(self.post(admin, [{'representative': 0, 'child': 0}]).status_code, 400)
+
+
+@override_settings(CAMERA_PROVISIONING_ENABLED=False)
+class CameraGrantTests(ParticipantsTestCase):
+
+    def setUp(self):
+        self.cameras = [Camera.objects.create(name=f'Camera {index}', ip='127.0.0.1', port=554) for index in range(4)]
+        KinderGartenCamera.objects.create(kindergarten=self.kindergarten, camera=self.cameras[0])
+        self.child, = self.create_children(1)
+        self.link = RepresentativeChild.objects.create(representative=self.create_user(0), child=self.child)
+
+    def get_grants(self, link=None):
+        return set(RepresentativeChildCamera.objects.filter(
+            representative_child=link or self.link
+        ).values_list('camera_id', flat=True))
+
+    def test_new_link_gets_the_kindergarten_cameras(self):
+        self.assertEqual(self.get_grants(), {self.cameras[0].pk})
+
+    def test_kindergarten_camera_is_granted_and_revoked(self):
+        kindergarten_camera = KinderGartenCamera.objects.create(kindergarten=self.kindergarten, camera=self.cameras[1])
+        self.assertEqual(self.get_grants(), {self.cameras[0].pk, self.cameras[1].pk})
+        kindergarten_camera.delete()
+        self.assertEqual(self.get_grants(), {self.cameras[0].pk})
+
+    def test_bulk_links_get_the_kindergarten_cameras(self):
+        child, = self.create_children(1)
+        created, _ = bulk_link_representatives([
+            {'representative': self.create_user(1).pk, 'child': child.pk, 'status': 'Parent'}
+        ])
+        self.assertEqual(self.get_grants(created[0]), {self.cameras[0].pk})
+
+    def test_group_move_keeps_manual_grants(self):
+        RepresentativeChildCamera.objects.create(representative_child=self.link, camera=self.cameras[3])
+        self.child.group = Group.objects.create(kindergarten=self.kindergarten, name='Other group', limit=10)
+        self.child.save()
+        self.assertEqual(self.get_grants(), {self.cameras[0].pk, self.cameras[3].pk})
+
+    def test_kindergarten_move_only_moves_kindergarten_grants(self):
+        kindergarten = self.create_kindergarten('Other kindergarten')
+        KinderGartenCamera.objects.create(kindergarten=kindergarten, camera=self.cameras[1])
+        KinderGartenCamera.objects.create(kindergarten=kindergarten, camera=self.cameras[2])
+        # Shared by both kindergartens
+        KinderGartenCamera.objects.create(kindergarten=self.kindergarten, camera=self.cameras[2])
+        RepresentativeChildCamera.objects.create(representative_child=self.link, camera=self.cameras[3])
+
+        self.child.kindergarten = kindergarten
+        self.child.group = Group.objects.create(kindergarten=kindergarten, name='Group', limit=10)
+        self.child.save()
+        self.assertEqual(self.get_grants(), {self.cameras[1].pk, self.cameras[2].pk, self.cameras[3].pk})
+
+    def test_materialize_adds_missing_grants_only(self):
+        RepresentativeChildCamera.objects.filter(representative_child=self.link).delete()
+        RepresentativeChildCamera.objects.create(representative_child=self.link, camera=self.cameras[3])
+        materialize_camera_grants([self.link.pk])
+        self.assertEqual(self.get_grants(), {self.cameras[0].pk, self.cameras[3].pk})
+
+    def test_materialize_queries_do_not_grow_with_the_links(self):
+        children = self.create_children(10)
+        links = [
+            RepresentativeChild.objects.create(representative=self.create_user(index + 1), child=child)
+            for index, child in enumerate(children)
+        ]
+        RepresentativeChildCamera.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as small:
+            materialize_camera_grants([links[0].pk])
+        with CaptureQueriesContext(connection) as large:
+            materialize_camera_grants([link.pk for link in links[1:]])
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(RepresentativeChildCamera.objects.count(), 10)
+
+
+class GroupOccupancyTests(ParticipantsTestCase):
+
+    def setUp(self):
+        self.small_group = Group.objects.create(kindergarten=self.kindergarten, name='Small group', limit=2)
+
+    def get_occupancy(self, group):
+        return Group.objects.values_list('occupancy', flat=True).get(pk=group.pk)
+
+    def test_children_take_places_until_the_group_is_full(self):
+        self.create_children(2, self.small_group)
+        self.assertEqual(self.get_occupancy(self.small_group), 2)
+        with self.assertRaises(GroupFullError):
+            self.create_children(1, self.small_group)
+        self.assertEqual(self.get_occupancy(self.small_group), 2)
+        self.assertEqual(self.small_group.children.count(), 2)
+
+    def test_moved_child_moves_its_place(self):
+        child, = self.create_children(1)
+        child.group = self.small_group
+        child.save()
+        self.assertEqual(self.get_occupancy(self.group), 0)
+        self.assertEqual(self.get_occupancy(self.small_group), 1)
+
+        # Saving without a move takes no place
+        child.first_name = 'Renamed'
+        child.save()
+        self.assertEqual(self.get_occupancy(self.small_group), 1)
+
+    def test_move_to_a_full_group_keeps_the_child(self):
+        self.create_children(2, self.small_group)
+        child, = self.create_children(1)
+        child.group = self.small_group
+        with self.assertRaises(GroupFullError):
+            child.save()
+        self.assertEqual(Child.objects.get(pk=child.pk).group_id, self.group.pk)
+        self.assertEqual(self.get_occupancy(self.group), 1)
+
+    def test_deleted_children_release_their_places(self):
+        children = self.create_children(2, self.small_group)
+        children[0].delete()
+        self.assertEqual(self.get_occupancy(self.small_group), 1)
+        Child.objects.filter(group=self.small_group).delete()
+        self.assertEqual(self.get_occupancy(self.small_group), 0)
+
+    def test_reserve_takes_the_free_places(self):
+        self.create_children(1, self.small_group)
+        taken = Group.objects.reserve_places({self.small_group.pk: 3, self.group.pk: 3})
+        self.assertEqual(taken, {self.small_group.pk: 1, self.group.pk: 3})
+        self.assertEqual(self.get_occupancy(self.small_group), 2)
+        Group.objects.release_places({self.group.pk: 3})
+        self.assertEqual(self.get_occupancy(self.group), 0)
+
+    def test_group_save_keeps_occupancy(self):
+        group = Group.objects.get(pk=self.small_group.pk)
+        self.create_children(1, self.small_group)
+        group.name = 'Renamed'
+        group.save()
+        self.assertEqual(self.get_occupancy(self.small_group), 1)
+
+    def test_occupancy_of_older_groups_is_filled_after_migrate(self):
+        self.create_children(2, self.small_group)
+        Group.objects.update(occupancy=0)
+        out = io.StringIO()
+        fill_occupancy_after_migrate(sender=None, stdout=out)
+        self.assertEqual(self.get_occupancy(self.small_group), 2)
+        self.assertIn('occupancy of 1 groups', out.getvalue())
+
+
+@override_settings(KEYSET_PAGE_SIZE=3, KEYSET_MAX_PAGE_SIZE=5)
+class KeysetPaginationTests(ParticipantsTestCase):
+
+    def setUp(self):
+        self.children = self.create_children(7)
+        # Rows created in the same instant are ordered by id
+        Child.objects.update(created_at=timezone.now())
+        self.admin = self.create_user(9, ut=CustomUser.UserTypes.ADMIN)
+
+    def get(self, url=None, **params):
+        return self.client.get(
+            url or reverse('staff-children-list', args=[self.kindergarten.pk]), params,
+            HTTP_AUTHORIZATION=f'Bearer {generate_jwt_token(self.admin).access_token}',
+        )
+
+    def test_pages_walk_all_rows_once_in_order(self):
+        seen = []
+        response = self.get()
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend(child['id'] for child in response.json()['children'])
+            if response.json()['next'] is None:
+                break
+            response = self.get(response.json()['next'])
+        self.assertEqual(seen, [child.pk for child in self.children])
+
+    def test_rows_inserted_before_the_cursor_do_not_shift_the_pages(self):
+        first = self.get().json()
+        earlier, = self.create_children(1)
+        Child.objects.filter(pk=earlier.pk).update(created_at=timezone.now() - timedelta(days=1))
+        second = self.get(first['next']).json()
+        self.assertEqual([child['id'] for child in second['children']], [child.pk for child in self.children[3:6]])
+
+    def test_page_size_is_clamped(self):
+        self.assertEqual(len(self.get(page_size=100).json()['children']), 5)
+        self.assertEqual(len(self.get(page_size=0).json()['children']), 1)
+        self.assertEqual(self.get(page_size='many').status_code, 400)
+
+    def test_invalid_cursor_is_a_bad_request(self):
+        for cursor in ('not-a-cursor', 'WyJ4IiwgMV0', 'WyIyMDI0LTAxLTAxVDAwOjAwOjAwIiwgIjEiXQ'):
+            response = self.get(cursor=cursor)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('cursor', response.json())
+
+    def test_fields_are_selected(self):
+        response = self.get(fields='first_name,id')
+        self.assertEqual(list(response.json()['children'][0]), ['id', 'first_name'])
+        self.assertEqual(self.get(fields='password').status_code, 400)
+
+
+@override_settings(RESPONSE_CACHE='default', RESPONSE_CACHE_TIMEOUT=300, LOCAL_CACHE_TIMEOUT=5)
+class RepresentativeChildrenCacheTests(ParticipantsTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = self.create_user(0)
+        self.child, = self.create_children(1)
+        RepresentativeChild.objects.create(representative=self.user, child=self.child)
+        self.authorization = f'Bearer {generate_jwt_token(self.user).access_token}'
+
+    def get(self, **headers):
+        return self.client.get(reverse('user-children-list'), HTTP_AUTHORIZATION=self.authorization, **headers)
+
+    def get_child_queries(self, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(**headers)
+        return response, [query['sql'] for query in queries if 'participants_child' in query['sql']]
+
+    def test_response_is_cached_with_an_etag(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('Authorization', response['Vary'])
+
+        cached, child_queries = self.get_child_queries()
+        self.assertEqual(child_queries, [])
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+    def test_current_etag_gets_304(self):
+        etag = self.get()['ETag']
+        response, child_queries = self.get_child_queries(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(child_queries, [])
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_new_link_changes_the_etag(self):
+        etag = self.get()['ETag']
+        child, = self.create_children(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            RepresentativeChild.objects.create(representative=self.user, child=child)
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([child['id'] for child in response.json()['children']], [self.child.pk, child.pk])
+
+    def test_users_do_not_share_responses(self):
+        self.get()
+        other = self.create_user(1)
+        response = self.client.get(
+            reverse('user-children-list'), HTTP_AUTHORIZATION=f'Bearer {generate_jwt_token(other).access_token}'
+        )
+        self.assertEqual(response.json()['children'], [])
+
+    def test_local_cache_entries_expire_quickly(self):
+        # Other workers can't bump the version in this process' locmem cache, a stale response lives 5 seconds
+        etag = self.get()['ETag']
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + 6):
+            response, child_queries = self.get_child_queries(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertTrue(child_queries)
@@ -1,7 +1,18 @@
 from django.urls import path
 
-from apps.participants.views import RepresentativeChildrenAPIView
+from apps.participants.views import (
+    GroupOccupancyAPIView, RepresentativeChildBulkLinkAPIView, RepresentativeChildrenAPIView, StaffChildListAPIView,
+    StaffEmployeeListAPIView, StaffGroupListAPIView
+)
 
 urlpatterns = [
     path('children/', RepresentativeChildrenAPIView.as_view(), name='user-children-list'),
+    path('representatives/bulk-link/', RepresentativeChildBulkLinkAPIView.as_view(), name='representatives-bulk-link'),
+    path('kindergartens/<int:kindergarten_id>/occupancy/', GroupOccupancyAPIView.as_view(), name='group-occupancy'),
+    path('kindergartens/<int:kindergarten_id>/children/', StaffChildListAPIView.as_view(), name='staff-children-list'),
+    path('kindergartens/<int:kindergarten_id>/groups/', StaffGroupListAPIView.as_view(), name='staff-groups-list'),
+    path(
+        'kindergartens/<int:kindergarten_id>/employees/', StaffEmployeeListAPIView.as_view(),
+        name='staff-employees-list'
+    ),
 ]
\ No newline at end of file
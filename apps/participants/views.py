@@ -1,23 +1,146 @@
+from django.conf import settings
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
-from apps.participants.models import RepresentativeChild
-from apps.participants.serializers import RepresentativeChildSerializer
+from apps.authentication.authentication import CustomJWTAuthentication
+from apps.authentication.permissions import IsAdminUserType
+from apps.participants.models import Child, Employee, Group
+from apps.participants.serializers import (
+    ChildSerializer, ChildValuesSerializer, GroupOccupancySerializer, RepresentativeChildLinkSerializer,
+    StaffChildSerializer, StaffEmployeeSerializer, StaffGroupSerializer
+)
+from apps.participants.services import bulk_link_representatives
+from apps.utils.renderers import FastJSONRenderer
+from apps.utils.response_cache import UserVersionedCacheMixin
+from apps.utils.views import KeysetListAPIView
 
 
-class RepresentativeChildrenAPIView(APIView):
+class RepresentativeChildrenAPIView(UserVersionedCacheMixin, KeysetListAPIView):
     """
     This view is used to get the children of the user that are represented by him.
+    Responses are cached per user until the user's links or children change.
+    Rows are serialized from values_list() and rendered with FastJSONRenderer, the output is the one of
+    ChildSerializer and JSONRenderer, manage.py benchmark_serializers compares both.
     """
+    cache_name = 'children'
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CustomJWTAuthentication]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    serializer_class = ChildSerializer
+    values_serializer_class = ChildValuesSerializer
+    results_key = 'children'
 
     def get_queryset(self):
-        return RepresentativeChild.objects.filter(representative=self.request.user).select_related('child')
+        return Child.objects.filter(representatives__representative_id=self.request.user.id)
 
-    def get(self, request):
-        serializer = RepresentativeChildSerializer(self.get_queryset(), many=True)
 
-        return Response({'children': [item['child'] for item in serializer.data]})
+class RepresentativeChildBulkLinkAPIView(APIView):
+    """
+    This view is used to link many representatives to children at once.
+    Valid links are created, the others are reported by their index in the request.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUserType]
+    authentication_classes = [CustomJWTAuthentication]
+
+    def post(self, request):
+        links = request.data.get('links')
+        if not isinstance(links, list) or not links:
+            return Response({'error': 'links must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(links) > settings.BULK_LINK_MAX_ROWS:
+            return Response(
+                {'error': f'At most {settings.BULK_LINK_MAX_ROWS} links can be sent at once'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        errors = {}
+        valid_links = []
+        indexes = []
+        for index, link in enumerate(links):
+            serializer = RepresentativeChildLinkSerializer(data=link)
+            if serializer.is_valid():
+                valid_links.append(serializer.validated_data)
+                indexes.append(index)
+            else:
+                errors[index] = serializer.errors
+
+        created, link_errors = bulk_link_representatives(valid_links)
+        errors.update({indexes[index]: error for index, error in link_errors.items()})
+
+        if not created:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_200_OK
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({
+            'created': len(created),
+            'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)],
+        }, status=response_status)
+
+
+class GroupOccupancyAPIView(APIView):
+    """
+    This view is used to list the groups of a kindergarten with their occupancy.
+    Only the maintained counters are read, the children are not counted.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUserType]
+    authentication_classes = [CustomJWTAuthentication]
+
+    def get(self, request, kindergarten_id):
+        groups = Group.objects.filter(kindergarten_id=kindergarten_id).only(
+            'id', 'name', 'limit', 'occupancy'
+        ).order_by('name')
+        return Response({'groups': GroupOccupancySerializer(groups, many=True).data})
+
+
+class StaffChildListAPIView(KeysetListAPIView):
+    """
+    This view is used to list the children of a kindergarten, ?group= narrows them to a group
+    """
+    permission_classes = [IsAuthenticated, IsAdminUserType]
+    authentication_classes = [CustomJWTAuthentication]
+    serializer_class = StaffChildSerializer
+    results_key = 'children'
+
+    def get_queryset(self):
+        queryset = Child.objects.filter(kindergarten_id=self.kwargs['kindergarten_id'])
+        group_id = self.request.query_params.get('group')
+        if group_id is not None:
+            if not group_id.isdigit():
+                raise ValidationError({'group': ['A valid integer is required.']})
+            queryset = queryset.filter(group_id=group_id)
+        return queryset
+
+
+class StaffGroupListAPIView(KeysetListAPIView):
+    """
+    This view is used to list the groups of a kindergarten
+    """
+    permission_classes = [IsAuthenticated, IsAdminUserType]
+    authentication_classes = [CustomJWTAuthentication]
+    serializer_class = StaffGroupSerializer
+    results_key = 'groups'
+
+    def get_queryset(self):
+        return Group.objects.filter(kindergarten_id=self.kwargs['kindergarten_id'])
+
+
+class StaffEmployeeListAPIView(KeysetListAPIView):
+    """
+    This view is used to list the employees of a kindergarten, those working in one of its groups
+    """
+    permission_classes = [IsAuthenticated, IsAdminUserType]
+    authentication_classes = [CustomJWTAuthentication]
+    serializer_class = StaffEmployeeSerializer
+    results_key = 'employees'
+
+    def get_queryset(self):
+        kindergarten_id = self.kwargs['kindergarten_id']
+        return Employee.objects.filter(
+            Q(first_employee__kindergarten_id=kindergarten_id) | Q(second_employee__kindergarten_id=kindergarten_id)
+        ).distinct()
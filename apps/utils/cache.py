@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_local_cache(cache) -> bool:
+    """
+    A local-memory cache belongs to its process, the other workers never see what it writes
+    """
+    return isinstance(cache, LocMemCache)
+
+
+def get_shared_timeout(cache, timeout):
+    """
+    Timeout of an entry every worker must see change. A local-memory cache can't be told about
+    changes made by other workers, so its entries only live LOCAL_CACHE_TIMEOUT seconds.
+    """
+    if is_local_cache(cache):
+        return min(timeout, settings.LOCAL_CACHE_TIMEOUT)
+    return timeout
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Tags, Warning, register
+
+from apps.utils.cache import is_local_cache
+
+
+def get_shared_cache_features():
+    """
+    (feature, CACHES alias) of the enabled features that rely on one cache shared by all workers
+    """
+    features = [
+        ('Token revocation', 'default'),
+        ('Stream viewer counting', 'default'),
+        ('Master playlist invalidation', 'default'),
+        ('SMS provider rate limits', settings.SMS_RATE_CACHE),
+        ('Endpoint concurrency limits', settings.CONCURRENCY_CACHE),
+        ('Per-user response cache', settings.RESPONSE_CACHE),
+    ]
+    if settings.OTP_BACKEND == 'apps.authentication.otp.CacheOTPBackend':
+        features.append(('CacheOTPBackend', settings.OTP_CACHE))
+    return features
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    return [
+        Warning(
+            f'{feature} uses the local-memory cache {alias!r}, every worker only sees its own writes.',
+            hint=f'Point CACHES[{alias!r}] to a cache shared by all workers, e.g. Redis.',
+            id='utils.W001',
+        )
+        for feature, alias in get_shared_cache_features()
+        if is_local_cache(caches[alias])
+    ]
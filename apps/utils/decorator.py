@@ -0,0 +1,78 @@
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+# Requests running an endpoint, counted per window of CONCURRENCY_SLOT_TIMEOUT seconds, (name, window)
+CONCURRENCY_CACHE_KEY = 'concurrency:{}:{}'
+
+
+def _incr(cache, key, delta, timeout):
+    """
+    Atomically add delta to the counter at key and return the new value, the counter starts at 0
+    """
+    if delta > 0 and cache.add(key, delta, timeout):
+        return delta
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Expired in between, the requests counted in it are forgotten
+        if delta > 0:
+            cache.add(key, delta, timeout)
+        return delta
+
+
+def acquire_slot(name, limit):
+    """
+    Count a request in the endpoint, returns its counter key or None when the limit is reached.
+    A request is counted in the window it started in and the limit applies to the current and
+    the previous window together, so a slot a killed worker never released is freed after two windows.
+    """
+    cache = caches[settings.CONCURRENCY_CACHE]
+    window = int(time.time() // settings.CONCURRENCY_SLOT_TIMEOUT)
+    key = CONCURRENCY_CACHE_KEY.format(name, window)
+    timeout = 2 * settings.CONCURRENCY_SLOT_TIMEOUT
+
+    running = _incr(cache, key, 1, timeout)
+    running += cache.get(CONCURRENCY_CACHE_KEY.format(name, window - 1), 0)
+    if running > limit:
+        release_slot(key)
+        return None
+    return key
+
+
+def release_slot(key):
+    cache = caches[settings.CONCURRENCY_CACHE]
+    _incr(cache, key, -1, 2 * settings.CONCURRENCY_SLOT_TIMEOUT)
+
+
+def concurrency_limit(name):
+    """
+    Limit how many requests of all worker processes run the decorated view method at the same time.
+    The limit is CONCURRENCY_LIMITS[name], requests over it are answered with 503 and Retry-After
+    at once instead of queueing behind expensive work like password hashing.
+    Running requests are counted with atomic incr and decr in the CONCURRENCY_CACHE cache.
+    Names missing from CONCURRENCY_LIMITS are not limited.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(*args, **kwargs):
+            if name not in settings.CONCURRENCY_LIMITS:
+                return view_method(*args, **kwargs)
+
+            key = acquire_slot(name, settings.CONCURRENCY_LIMITS[name])
+            if key is None:
+                return Response(
+                    {"error": "Server is busy, try again later"},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={"Retry-After": str(settings.CONCURRENCY_RETRY_AFTER)},
+                )
+            try:
+                return view_method(*args, **kwargs)
+            finally:
+                release_slot(key)
+        return wrapper
+    return decorator
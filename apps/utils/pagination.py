@@ -0,0 +1,65 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination:
+    """
+    Cursor pagination on (created_at, id).
+    A page is read with WHERE (created_at, id) > (cursor) ORDER BY created_at, id LIMIT page_size + 1,
+    so every page costs the same index range scan however deep it is, unlike OFFSET.
+    The cursor is the key of the last row, rows inserted meanwhile don't shift the pages.
+    Pages of values_list() rows work as well when the rows start with the ordering columns.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('created_at', 'id')
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, settings.KEYSET_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: ['A valid integer is required.']})
+        return min(max(page_size, 1), settings.KEYSET_MAX_PAGE_SIZE)
+
+    def encode_cursor(self, obj):
+        created_at, pk = obj[:len(self.ordering)] if isinstance(obj, tuple) else (obj.created_at, obj.pk)
+        key = json.dumps([created_at.isoformat(), pk])
+        return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            created_at, pk = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            created_at = parse_datetime(created_at)
+            if created_at is None or not isinstance(pk, int):
+                raise ValueError
+        except (TypeError, ValueError, binascii.Error):
+            raise ValidationError({self.cursor_query_param: ['Invalid cursor.']})
+        return created_at, pk
+
+    def paginate_queryset(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
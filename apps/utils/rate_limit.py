@@ -0,0 +1,60 @@
+import math
+import threading
+
+# GCRA on Redis: KEYS[1] holds the theoretical arrival time, ARGV = now, emission interval, tolerance.
+# Returns '0' when the request is allowed, otherwise the seconds to wait.
+# Numbers are returned as strings, Redis would truncate Lua floats to integers.
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local tolerance = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local allow_at = tat - tolerance
+if now < allow_at then
+    return tostring(allow_at - now)
+end
+local new_tat = tat + interval
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+_lock = threading.Lock()
+_scripts = {}
+
+
+def get_redis_client(cache, key):
+    """
+    Raw client of Django's Redis cache backend, None for other backends
+    """
+    get_client = getattr(getattr(cache, '_cache', None), 'get_client', None)
+    if get_client is None:
+        return None
+    return get_client(cache.make_and_validate_key(key), write=True)
+
+
+def consume_token(cache, key, now, interval, tolerance):
+    """
+    Take a token from the GCRA bucket stored at key, returns 0 or the seconds until a token is available.
+    A bucket is a single timestamp, one token is added every interval seconds and tolerance / interval + 1
+    tokens may be taken at once. now must be wall-clock time, time.time(), as it is compared across processes.
+    The update is one Lua call on Redis caches and a get and set under a process lock elsewhere,
+    which is atomic for the locmem cache.
+    """
+    client = get_redis_client(cache, key)
+    if client is not None:
+        script = _scripts.get(id(client))
+        if script is None:
+            script = _scripts[id(client)] = client.register_script(GCRA_SCRIPT)
+        return float(script(keys=[cache.make_and_validate_key(key)], args=[now, interval, tolerance]))
+
+    with _lock:
+        tat = max(cache.get(key, now), now)
+        allow_at = tat - tolerance
+        if now < allow_at:
+            return allow_at - now
+        new_tat = tat + interval
+        cache.set(key, new_tat, math.ceil(new_tat - now))
+        return 0
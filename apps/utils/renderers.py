@@ -0,0 +1,31 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson when it is installed, for responses without floats the output is
+    byte for byte the one of JSONRenderer. orjson writes floats in exponent form and NaN differently,
+    so only use it on views whose data has no floats.
+    Datetimes and the types orjson doesn't know are encoded by the encoder of JSONRenderer, data orjson
+    can't encode, e.g. integers over 64 bits or non-string keys, and indented output go to JSONRenderer itself.
+    """
+    orjson_options = orjson.OPT_PASSTHROUGH_DATETIME if orjson is not None else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.orjson_options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped by JSONRenderer for JavaScript, where they end a line inside a string
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,102 @@
+import hashlib
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.utils.cache import get_shared_timeout
+
+USER_VERSION_CACHE_KEY = 'response:version:{}'
+RESPONSE_CACHE_KEY = 'response:{}:{}:{}'
+
+
+def get_response_cache():
+    return caches[settings.RESPONSE_CACHE]
+
+
+def get_response_cache_timeout(cache):
+    return get_shared_timeout(cache, settings.RESPONSE_CACHE_TIMEOUT)
+
+
+def new_version():
+    # Random instead of a counter, a version lost from the cache can't come back and match old entries
+    return secrets.token_hex(8)
+
+
+def bump_user_versions(user_ids) -> None:
+    """
+    Give the users a new response version once the current transaction commits,
+    their cached responses stop matching. One cache write for all users.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+
+    def bump():
+        cache = get_response_cache()
+        cache.set_many(
+            {USER_VERSION_CACHE_KEY.format(user_id): new_version() for user_id in user_ids},
+            timeout=get_response_cache_timeout(cache),
+        )
+
+    transaction.on_commit(bump)
+
+
+class UserVersionedCacheMixin:
+    """
+    Caches the GET responses of a view per user, request path and query string.
+    Every user has a version in the cache that signals replace when the data behind the responses changes,
+    a cached response is used only while its version is current.
+    The version and the response are read with one get_many, the ETag is derived from the version,
+    so a revalidation with If-None-Match gets a 304 from that single cache read.
+    With a local-memory cache every process has its own versions and bumps reach only the process
+    making the change, so versions and responses only live LOCAL_CACHE_TIMEOUT seconds there.
+    Use a shared cache such as Redis with several workers.
+    """
+    cache_name = None
+
+    def get_response_cache_key(self, request):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return RESPONSE_CACHE_KEY.format(self.cache_name, request.user.id, path)
+
+    def get_etag(self, key, version):
+        return quote_etag(hashlib.md5(f'{key}:{version}'.encode()).hexdigest())
+
+    def finalize_cached_response(self, response, etag):
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def get(self, request, *args, **kwargs):
+        cache = get_response_cache()
+        key = self.get_response_cache_key(request)
+        version_key = USER_VERSION_CACHE_KEY.format(request.user.id)
+        cached = cache.get_many([version_key, key])
+
+        timeout = get_response_cache_timeout(cache)
+        version = cached.get(version_key)
+        if version is None:
+            version = new_version()
+            if not cache.add(version_key, version, timeout=timeout):
+                version = cache.get(version_key, version)
+
+        etag = self.get_etag(key, version)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return self.finalize_cached_response(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+        entry = cached.get(key)
+        if entry is not None and entry[0] == version:
+            return self.finalize_cached_response(Response(entry[1]), etag)
+
+        # A bump while this runs replaces the version, so the entry written here can't be served stale
+        response = super().get(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        cache.set(key, (version, response.data), timeout=timeout)
+        return self.finalize_cached_response(response, etag)
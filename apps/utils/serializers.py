@@ -0,0 +1,80 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+
+
+def get_url_template(view_name, placeholder, args=None):
+    """
+    (head, tail) of the url of view_name around placeholder, so urls are formatted per row as
+    head + value + tail without reverse(). The url is reversed with args, by default the placeholder
+    itself, and the placeholder must be a value the route can't contain otherwise.
+    """
+    url = reverse(view_name, args=args or [placeholder])
+    if url.count(str(placeholder)) != 1:
+        raise ImproperlyConfigured(f'The url of {view_name} must contain {placeholder!r} once')
+    head, tail = url.split(str(placeholder))
+    return head, tail
+
+
+class SelectableFieldsMixin:
+    """
+    Serializer mixin taking fields=[...] to output only these of its fields.
+    get_select_columns() gives the model columns the fields read, for QuerySet.only().
+    A field reads its source by default, fields reading other columns, e.g. method fields,
+    declare them in Meta.field_columns.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def get_selectable_fields(cls):
+        return list(cls().fields)
+
+    @classmethod
+    def get_select_columns(cls, fields):
+        field_columns = getattr(cls.Meta, 'field_columns', {})
+        serializer_fields = cls().fields
+        columns = []
+        for name in fields:
+            if name in field_columns:
+                columns.extend(field_columns[name])
+            else:
+                columns.append(serializer_fields[name].source.replace('.', '__'))
+        return columns
+
+
+class ValuesSerializer:
+    """
+    Read-only counterpart of a SelectableFieldsMixin serializer for hot list endpoints,
+    giving the same data from values_list() rows without DRF field objects per row.
+    get_value_fields() maps every field to (column, converter), the converter turns the column value
+    into the output value, None outputs it as it is. The fields are compiled once into
+    (name, row index, converter) entries, a row then becomes a dict in one comprehension.
+    offset is the number of columns the rows start with before the columns of the fields.
+    """
+    value_fields = {}
+
+    def __init__(self, fields, offset=0):
+        value_fields = self.get_value_fields()
+        self.columns = list(dict.fromkeys(value_fields[name][0] for name in fields))
+        self.compiled = [
+            (name, offset + self.columns.index(value_fields[name][0]), value_fields[name][1]) for name in fields
+        ]
+
+    def get_value_fields(self):
+        return self.value_fields
+
+    def serialize(self, rows):
+        compiled = self.compiled
+        if all(converter is None for _, _, converter in compiled):
+            return [{name: row[index] for name, index, _ in compiled} for row in rows]
+        return [
+            {
+                name: row[index] if converter is None or row[index] is None else converter(row[index])
+                for name, index, converter in compiled
+            }
+            for row in rows
+        ]
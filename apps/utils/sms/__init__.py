@@ -0,0 +1,2 @@
+from .dispatcher import SMSQueueFull, send_sms, sms_dispatcher
+from .providers import BaseSMSProvider, SMSError, SMSTemporaryError
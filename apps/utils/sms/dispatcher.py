@@ -0,0 +1,150 @@
+import heapq
+import itertools
+import logging
+import queue
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from apps.utils.rate_limit import consume_token
+from apps.utils.sms.providers import SMSError, SMSTemporaryError
+
+logger = logging.getLogger(__name__)
+
+
+class SMSQueueFull(Exception):
+    pass
+
+
+SMS_RATE_CACHE_KEY = 'sms:rate:{}'
+
+
+class TokenBucket:
+    """
+    Allows `rate` messages per second on average with bursts of up to `capacity`.
+    The bucket is stored in the cache under key, so all processes sharing the cache share the limit.
+    """
+
+    def __init__(self, cache, key, rate, capacity):
+        self.cache = cache
+        self.key = key
+        self.interval = 1 / rate
+        self.tolerance = self.interval * (capacity - 1)
+
+    def acquire(self):
+        """
+        Take a token, sleeping until one is available
+        """
+        while wait := consume_token(self.cache, self.key, time.time(), self.interval, self.tolerance):
+            time.sleep(wait)
+
+
+class SMSDispatcher:
+    """
+    Sends SMS from background worker threads, so web requests only put the message on a queue.
+    SMS_WORKERS threads share one provider instance and its connection pool,
+    sending is limited by the provider's rate in SMS_RATE_LIMITS, for all processes sharing SMS_RATE_CACHE.
+    Temporary failures are retried with exponential backoff and jitter up to SMS_MAX_RETRIES times.
+    Messages are kept in memory, the ones still queued are lost when the process exits.
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._delayed = []
+        self._delayed_condition = threading.Condition()
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.provider = None
+        self.bucket = None
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self.provider = import_string(settings.SMS_BACKEND)()
+            rate, capacity = settings.SMS_RATE_LIMITS.get(self.provider.name, (settings.SMS_WORKERS, settings.SMS_WORKERS))
+            self.bucket = TokenBucket(
+                caches[settings.SMS_RATE_CACHE], SMS_RATE_CACHE_KEY.format(self.provider.name), rate, capacity
+            )
+            self._queue = queue.Queue(maxsize=settings.SMS_QUEUE_SIZE)
+
+            threads = [threading.Thread(target=self._work, name=f'sms-worker-{index}', daemon=True)
+                       for index in range(settings.SMS_WORKERS)]
+            threads.append(threading.Thread(target=self._schedule_retries, name='sms-retry', daemon=True))
+            for thread in threads:
+                thread.start()
+            self._threads = threads
+
+    def enqueue(self, phone_number, message):
+        """
+        Queue a message and return at once, raises SMSQueueFull when the backlog is at SMS_QUEUE_SIZE
+        """
+        self._start()
+        try:
+            self._queue.put_nowait((phone_number, message, 0))
+        except queue.Full:
+            raise SMSQueueFull('SMS queue is full')
+
+    def _work(self):
+        while True:
+            phone_number, message, attempt = self._queue.get()
+            try:
+                self.bucket.acquire()
+                self.provider.send(phone_number, message)
+            except SMSTemporaryError as e:
+                self._retry(phone_number, message, attempt, e)
+            except SMSError as e:
+                logger.error('SMS to %s was rejected: %s', phone_number, e)
+            except Exception:
+                logger.exception('Sending SMS to %s failed', phone_number)
+            finally:
+                self._queue.task_done()
+
+    def _retry(self, phone_number, message, attempt, error):
+        if attempt >= settings.SMS_MAX_RETRIES:
+            logger.error('Giving up on SMS to %s after %s attempts: %s', phone_number, attempt + 1, error)
+            return
+        delay = min(settings.SMS_BACKOFF_MAX, settings.SMS_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+        logger.warning('SMS to %s failed, retrying in %.1fs: %s', phone_number, delay, error)
+        with self._delayed_condition:
+            heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._counter),
+                                           (phone_number, message, attempt + 1)))
+            self._delayed_condition.notify()
+
+    def _schedule_retries(self):
+        """
+        Move retries back onto the queue once their backoff has passed
+        """
+        while True:
+            with self._delayed_condition:
+                while not self._delayed:
+                    self._delayed_condition.wait()
+                due_at, _, item = self._delayed[0]
+                wait = due_at - time.monotonic()
+                if wait > 0:
+                    self._delayed_condition.wait(wait)
+                    continue
+                heapq.heappop(self._delayed)
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                logger.error('SMS queue is full, dropping the retry of the SMS to %s', item[0])
+
+    def join(self):
+        """
+        Wait until the queue is drained, meant for tests and scripts
+        """
+        if self._queue is not None:
+            self._queue.join()
+
+
+sms_dispatcher = SMSDispatcher()
+
+
+def send_sms(phone_number, message):
+    sms_dispatcher.enqueue(phone_number, message)
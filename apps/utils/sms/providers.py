@@ -0,0 +1,72 @@
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+class SMSError(Exception):
+    """
+    The provider rejected the message, sending it again won't help
+    """
+
+
+class SMSTemporaryError(SMSError):
+    """
+    The message could not be sent right now, e.g. a timeout or rate limit, and may be retried
+    """
+
+
+class BaseSMSProvider:
+    """
+    Interface of the SMS providers used by the dispatcher.
+    send() is called from several worker threads at once.
+    """
+    name = None
+
+    def send(self, phone_number, message):
+        raise NotImplementedError
+
+
+class EskizProvider(BaseSMSProvider):
+    """
+    Sends messages through the Eskiz API over one keep-alive session,
+    with a connection pool sized for the dispatcher workers
+    """
+    name = 'eskiz'
+    url = 'https://notify.eskiz.uz/api/message/sms/send'
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.SMS_WORKERS)
+        self.session.mount('https://', adapter)
+        self.session.headers['Authorization'] = f'Bearer {settings.ESKIZ_API_TOKEN}'
+
+    def send(self, phone_number, message):
+        data = {
+            'mobile_phone': phone_number,
+            'message': message,
+            'from': settings.ESKIZ_SENDER,
+        }
+        try:
+            response = self.session.post(self.url, data=data, timeout=settings.SMS_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise SMSTemporaryError(str(e))
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise SMSTemporaryError(f'Eskiz answered {response.status_code}')
+        if response.status_code >= 400:
+            raise SMSError(f'Eskiz answered {response.status_code}: {response.text[:200]}')
+
+
+class LocMemProvider(BaseSMSProvider):
+    """
+    Keeps the messages in LocMemProvider.outbox instead of sending them, for development and tests
+    """
+    name = 'locmem'
+    outbox = []
+    _lock = threading.Lock()
+
+    def send(self, phone_number, message):
+        with self._lock:
+            self.outbox.append((phone_number, message))
@@ -0,0 +1,166 @@
+import time
+import uuid
+from datetime import date, datetime, timezone
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from apps.utils.decorator import acquire_slot, concurrency_limit, release_slot
+from apps.utils.renderers import FastJSONRenderer, orjson
+from apps.utils.sms.dispatcher import SMSDispatcher, TokenBucket
+from apps.utils.sms.providers import LocMemProvider, SMSTemporaryError
+
+
+class FlakyProvider(LocMemProvider):
+    """
+    Fails every message the first time with a temporary error
+    """
+    name = 'flaky'
+    failed = set()
+
+    def send(self, phone_number, message):
+        if (phone_number, message) not in self.failed:
+            self.failed.add((phone_number, message))
+            raise SMSTemporaryError('Provider timed out')
+        super().send(phone_number, message)
+
+
+@override_settings(SMS_WORKERS=2, SMS_QUEUE_SIZE=100, SMS_BACKOFF_BASE=0.01, SMS_BACKOFF_MAX=0.05,
+                   SMS_MAX_RETRIES=3, SMS_RATE_LIMITS={}, SMS_RATE_CACHE='default')
+class SMSDispatcherTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        LocMemProvider.outbox.clear()
+        FlakyProvider.failed.clear()
+
+    def wait_for_outbox(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while len(LocMemProvider.outbox) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return sorted(LocMemProvider.outbox)
+
+    @override_settings(SMS_BACKEND='apps.utils.sms.providers.LocMemProvider')
+    def test_queued_messages_are_sent(self):
+        dispatcher = SMSDispatcher()
+        for index in range(5):
+            dispatcher.enqueue(f'99890000000{index}', 'code')
+        dispatcher.join()
+        self.assertEqual(self.wait_for_outbox(5), [(f'99890000000{index}', 'code') for index in range(5)])
+
+    @override_settings(SMS_BACKEND='apps.utils.tests.FlakyProvider')
+    def test_temporary_failures_are_retried(self):
+        dispatcher = SMSDispatcher()
+        dispatcher.enqueue('998900000000', 'code')
+        self.assertEqual(self.wait_for_outbox(1), [('998900000000', 'code')])
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rate_is_shared_by_buckets_on_the_same_cache(self):
+        # Two processes sending through the same provider
+        buckets = [TokenBucket(cache, 'sms:rate:test', rate=20, capacity=2) for _ in range(2)]
+        started = time.monotonic()
+        for index in range(8):
+            buckets[index % 2].acquire()
+        # The burst of 2 is free, the other 6 tokens come at 20 per second
+        self.assertGreaterEqual(time.monotonic() - started, 0.25)
+
+
+@override_settings(CONCURRENCY_LIMITS={'test': 2}, CONCURRENCY_CACHE='default', CONCURRENCY_SLOT_TIMEOUT=30,
+                   CONCURRENCY_RETRY_AFTER=1)
+class ConcurrencyLimitTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_slots_are_limited_and_released(self):
+        slots = [acquire_slot('test', 2), acquire_slot('test', 2)]
+        self.assertNotIn(None, slots)
+        self.assertIsNone(acquire_slot('test', 2))
+        release_slot(slots.pop())
+        self.assertIsNotNone(acquire_slot('test', 2))
+
+    def test_requests_of_the_previous_window_are_counted(self):
+        with mock.patch('apps.utils.decorator.time.time', return_value=1000 * 30 + 29):
+            acquire_slot('test', 2)
+            acquire_slot('test', 2)
+        with mock.patch('apps.utils.decorator.time.time', return_value=1001 * 30):
+            self.assertIsNone(acquire_slot('test', 2))
+
+    def test_unreleased_slots_expire(self):
+        # Requests of a killed worker
+        with mock.patch('apps.utils.decorator.time.time', return_value=1000 * 30):
+            acquire_slot('test', 2)
+            acquire_slot('test', 2)
+        with mock.patch('apps.utils.decorator.time.time', return_value=1002 * 30):
+            self.assertIsNotNone(acquire_slot('test', 2))
+
+    def test_busy_endpoint_answers_503(self):
+        @concurrency_limit('test')
+        def view(request):
+            return Response(status=200)
+
+        acquire_slot('test', 2)
+        self.assertEqual(view(None).status_code, 200)
+        acquire_slot('test', 2)
+        response = view(None)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_slot_is_released_when_the_view_raises(self):
+        @concurrency_limit('test')
+        def view(request):
+            raise ValueError
+
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                view(None)
+        self.assertIsNotNone(acquire_slot('test', 1))
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    data = {
+        'children': [
+            {'id': 1, 'first_name': 'Ўғилой', 'last_name': 'O\'Neil "Jr"', 'age': 3, 'active': True},
+            {'id': 2 ** 40, 'first_name': 'Line\u2028separator\u2029', 'last_name': '', 'age': None, 'active': False},
+        ],
+        'created_at': datetime(2024, 5, 1, 8, 30, 15, 123456, tzinfo=timezone.utc),
+        'birth_date': date(2021, 1, 31),
+        'uuid': uuid.UUID(int=1),
+        'next': None,
+        'empty': {'list': [], 'dict': {}},
+    }
+
+    def assertSameBytes(self, data, accepted_media_type=None):
+        self.assertEqual(
+            FastJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type),
+        )
+
+    @skipUnless(orjson, 'orjson is not installed')
+    def test_orjson_encodes(self):
+        with mock.patch.object(JSONRenderer, 'render', side_effect=AssertionError('JSONRenderer was used')):
+            FastJSONRenderer().render(self.data)
+
+    @skipUnless(orjson, 'orjson is not installed')
+    def test_output_is_the_one_of_json_renderer(self):
+        self.assertSameBytes(self.data)
+
+    def test_output_without_orjson(self):
+        with mock.patch('apps.utils.renderers.orjson', None):
+            self.assertSameBytes(self.data)
+
+    @skipUnless(orjson, 'orjson is not installed')
+    def test_data_orjson_refuses_falls_back(self):
+        self.assertSameBytes({'id': 2 ** 70})
+        self.assertSameBytes({1: 'integer key'})
+
+    def test_indented_output_falls_back(self):
+        self.assertSameBytes(self.data, 'application/json; indent=4')
@@ -0,0 +1 @@
+from apps.utils.validators.phone import normalize_phone_number, validate_phone_number
@@ -0,0 +1,33 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+PHONE_NUMBER_RE = re.compile(r'^998\d{9}$')
+
+
+def normalize_phone_number(phone_number):
+    """
+    Remove all non-numeric characters from the phone number and check the operator code.
+    These are the rules of CustomUser.clean(), the result is stored as is.
+    """
+    phone_number = re.sub(r'\D', '', str(phone_number).strip())
+
+    operator_code = phone_number[3:5]
+    if operator_code not in settings.VALID_OPERATORS_PHONE:
+        raise ValidationError("Invalid operator code.")
+
+    return phone_number
+
+
+def validate_phone_number(phone_number):
+    """
+    Normalize the phone number and check it is a full Uzbekistan number, as the phone_number field does
+    """
+    phone_number = normalize_phone_number(phone_number)
+    if not PHONE_NUMBER_RE.match(phone_number):
+        raise ValidationError(
+            'Phone number must be a valid Uzbekistan number starting with 998 and 12 digits long',
+            code='invalid_phone_number',
+        )
+    return phone_number
@@ -0,0 +1,62 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.utils.pagination import KeysetPagination
+
+
+class KeysetListAPIView(APIView):
+    """
+    List endpoint paginated with KeysetPagination, the response is {results_key: [...], 'next': url or None}.
+    ?fields=a,b outputs only these fields of the serializer, a SelectableFieldsMixin serializer,
+    and the SELECT reads only the columns they need. Relations used by the fields are joined
+    with select_related.
+    With values_serializer_class set, a ValuesSerializer giving the same fields as serializer_class,
+    the rows are read with values_list() and serialized without model instances or DRF fields.
+    """
+    serializer_class = None
+    values_serializer_class = None
+    results_key = 'results'
+    pagination_class = KeysetPagination
+    fields_query_param = 'fields'
+
+    def get_queryset(self):
+        raise NotImplementedError('.get_queryset() must be overridden')
+
+    def get_fields(self):
+        available = self.serializer_class.get_selectable_fields()
+        fields = self.request.query_params.get(self.fields_query_param)
+        if not fields:
+            return available
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in available]
+        if unknown or not fields:
+            raise ValidationError({self.fields_query_param: [f'Choose from: {", ".join(available)}']})
+        # In the order of the serializer, which is the order of the output
+        return [field for field in available if field in fields]
+
+    def get_object_results(self, paginator, fields):
+        columns = self.serializer_class.get_select_columns(fields)
+        queryset = self.get_queryset().only(*self.pagination_class.ordering, *columns)
+        related = {column.rsplit('__', 1)[0] for column in columns if '__' in column}
+        if related:
+            # select_related() without arguments would join every relation
+            queryset = queryset.select_related(*related)
+
+        page = paginator.paginate_queryset(queryset, self.request)
+        return self.serializer_class(page, many=True, fields=fields).data
+
+    def get_value_results(self, paginator, fields):
+        ordering = self.pagination_class.ordering
+        serializer = self.values_serializer_class(fields, offset=len(ordering))
+        queryset = self.get_queryset().values_list(*ordering, *serializer.columns)
+        return serializer.serialize(paginator.paginate_queryset(queryset, self.request))
+
+    def get(self, request, *args, **kwargs):
+        fields = self.get_fields()
+        paginator = self.pagination_class()
+        if self.values_serializer_class is not None:
+            results = self.get_value_results(paginator, fields)
+        else:
+            results = self.get_object_results(paginator, fields)
+        return Response({self.results_key: results, 'next': paginator.get_next_link()})
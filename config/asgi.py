@@ -3,6 +3,9 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Served by an ASGI server, auth/async/login/ and auth/async/register/ keep the
+event loop free while passwords are hashed in a process pool.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -12,4 +12,5 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from .base import *
 from .database import *
 from .environments import *
+from .rest_framework import *
 from .rest_framework_simplejwt import *
\ No newline at end of file
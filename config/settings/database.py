@@ -10,3 +10,6 @@ DATABASES = {
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
+
+# Creates the test database from the models of the project apps, their migrations aren't committed
+TEST_RUNNER = 'config.test_runner.TestRunner'
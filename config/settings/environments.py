@@ -7,4 +7,176 @@ INTERNAL_IPS = ["127.0.0.1", ]
 # ==================== OTP SETTINGS ====================
 OTP_EXPIRY = 5
 OTP_LENGTH = 6
+# Wrong codes accepted per issued OTP
+OTP_MAX_ATTEMPTS = 5
+# Seconds a verified phone number may be used to register
+OTP_VERIFIED_TTL = 60 * 15
+# 'apps.authentication.otp.DatabaseOTPBackend' keeps codes in the PhoneToken table,
+# 'apps.authentication.otp.CacheOTPBackend' in the OTP_CACHE cache with native expiry
+OTP_BACKEND = 'apps.authentication.otp.DatabaseOTPBackend'
+# CACHES alias used by CacheOTPBackend, must be shared by all workers, e.g. Redis
+OTP_CACHE = 'default'
 ESKIZ_API_TOKEN = "Token 1234567890"
+ESKIZ_SENDER = "4546"
+
+# ==================== SMS SETTINGS ====================
+# Provider class, apps.utils.sms.providers.LocMemProvider keeps messages in memory for development
+SMS_BACKEND = 'apps.utils.sms.providers.EskizProvider'
+SMS_OTP_MESSAGE = 'Verification code: {otp}'
+# Worker threads sending messages, also the size of the provider's connection pool
+SMS_WORKERS = 4
+# Messages waiting to be sent, SendOTPAPIView answers 503 when the queue is full
+SMS_QUEUE_SIZE = 10000
+# Seconds to connect and to wait for the provider's answer
+SMS_TIMEOUT = (3, 10)
+# Retries of temporary failures, the delay doubles from the base up to the maximum, with +-50% jitter
+SMS_MAX_RETRIES = 5
+SMS_BACKOFF_BASE = 1
+SMS_BACKOFF_MAX = 60
+# Provider name -> (messages per second, burst), for all processes sending through the provider
+SMS_RATE_LIMITS = {
+    'eskiz': (5, 10),
+}
+# CACHES alias holding the rate limit buckets. It must be shared by all processes, e.g. Redis, for the limits
+# to hold: with a local-memory cache every process has its own bucket, then divide the rates by the processes.
+SMS_RATE_CACHE = 'default'
+
+# ==================== CONCURRENCY SETTINGS ====================
+# Requests of all worker processes allowed in an endpoint at the same time, see apps.utils.decorator
+CONCURRENCY_LIMITS = {
+    'login': 4,
+    'register': 4,
+    'send_otp': 8,
+    'verify_otp': 8,
+}
+# Retry-After in seconds of the 503 answered over the limit
+CONCURRENCY_RETRY_AFTER = 1
+# CACHES alias counting the running requests. It must be shared by all processes, e.g. Redis, for the limits
+# to hold: with a local-memory cache every process counts its own requests.
+CONCURRENCY_CACHE = 'default'
+# Seconds after which a request is no longer counted, frees the slots of killed workers.
+# Longer than the slowest request of a limited endpoint.
+CONCURRENCY_SLOT_TIMEOUT = 30
+
+# ==================== PASSWORD HASHING SETTINGS ====================
+# Worker processes hashing passwords for the async login and register views, None for one per core
+PASSWORD_HASHING_WORKERS = None
+# Hashes a web process may have running or waiting before answering 503
+PASSWORD_HASHING_QUEUE_DEPTH = 64
+
+# ==================== PARTICIPANTS SETTINGS ====================
+# Links accepted by one bulk linking request
+BULK_LINK_MAX_ROWS = 5000
+# Rows of a roster file written per transaction by manage.py import_roster and the admin action
+ROSTER_BATCH_SIZE = 1000
+# Limit of the groups created by a roster import
+ROSTER_GROUP_LIMIT = 30
+
+# ==================== PAGINATION SETTINGS ====================
+# Rows per page of the keyset paginated lists, and the largest ?page_size= accepted
+KEYSET_PAGE_SIZE = 50
+KEYSET_MAX_PAGE_SIZE = 500
+
+# ==================== RESPONSE CACHE SETTINGS ====================
+# CACHES alias of the per-user response cache of the home and children lists. A locmem cache
+# only sees the changes made by its own process, use a shared cache such as Redis with several workers
+RESPONSE_CACHE = 'default'
+# Seconds cached responses and user versions are kept, at most LOCAL_CACHE_TIMEOUT in a locmem cache
+RESPONSE_CACHE_TIMEOUT = 300
+
+# ==================== KINDERGARTEN SETTINGS ====================
+# Kilometers searched by kindergartens/nearby/ without a radius, and the largest radius accepted
+KINDERGARTEN_NEARBY_RADIUS = 5
+KINDERGARTEN_NEARBY_MAX_RADIUS = 50
+# Kindergartens returned by one nearby search
+KINDERGARTEN_NEARBY_LIMIT = 50
+
+# ==================== JWT SETTINGS ====================
+# Seconds a user's token version is kept in the cache before it is read from the database again.
+# Revoked tokens are refused by every worker only with a shared cache, e.g. Redis, see CACHE SETTINGS.
+TOKEN_VERSION_CACHE_TIMEOUT = 60 * 5
+
+# ==================== CACHE SETTINGS ====================
+# Token versions, cached responses, OTP codes, throttles and viewers must be seen by every worker,
+# so production needs a shared CACHES backend such as Redis, manage.py check --deploy warns otherwise.
+# A local-memory cache keeps the entries other workers may change at most this many seconds,
+# which bounds how long a worker uses a revoked token version or a stale response.
+LOCAL_CACHE_TIMEOUT = 5
+
+# ==================== STREAM SETTINGS ====================
+# Directory ffmpeg writes the HLS playlists and segments to
+STREAM_ROOT = '/var/lib/streams'
+# None serves files from Python, 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache, lighttpd)
+# hands them to the front proxy
+STREAM_OFFLOAD = None
+# Internal nginx location mapped to STREAM_ROOT, used with 'x-accel-redirect'
+STREAM_OFFLOAD_PREFIX = '/protected/streams/'
+# URL prefix written into the playlists in front of every segment name
+STREAM_SEGMENT_URL = '/content/stream/segment/'
+# Playlists change with every segment, segments never change once written.
+# Use "public" instead of "private" only if the CDN in front authorizes requests itself.
+STREAM_PLAYLIST_CACHE_CONTROL = 'private, max-age=1'
+STREAM_SEGMENT_CACHE_CONTROL = 'private, max-age=86400, immutable'
+# The master playlist only changes with the encoding profile, revalidated through its ETag
+STREAM_MASTER_PLAYLIST_CACHE_CONTROL = 'private, no-cache'
+# Seconds a built master playlist is cached, saving its encoding profile drops it earlier
+STREAM_MASTER_PLAYLIST_CACHE_TIMEOUT = 60 * 60
+# Number of playlists each worker keeps in memory
+STREAM_PLAYLIST_CACHE_SIZE = 1024
+
+# ==================== CAMERA PROVISIONING SETTINGS ====================
+FFMPEG_BINARY = '/usr/bin/ffmpeg'
+# 'systemd' runs one camera_<id>.service unit per camera,
+# 'supervisor' runs all ffmpeg processes from manage.py run_stream_supervisor.
+# After switching to 'supervisor' run manage.py reconcile_cameras once to remove the old units.
+CAMERA_STREAM_BACKEND = 'systemd'
+# Directory the camera_<id>.service units are written to
+CAMERA_UNIT_DIR = '/etc/systemd/system'
+CAMERA_PROVISIONING_ENABLED = True
+# Seconds the provisioner waits for more camera changes before reconciling a batch
+CAMERA_PROVISIONING_DEBOUNCE = 2
+
+# ==================== STREAM SUPERVISOR SETTINGS ====================
+# Maximum number of ffmpeg processes one supervisor runs at the same time
+STREAM_SUPERVISOR_MAX_PROCESSES = 64
+# Seconds between reads of the camera list
+STREAM_SUPERVISOR_REFRESH_INTERVAL = 10
+# Restart delay in seconds, doubled after every crash up to the maximum, with +-50% jitter
+STREAM_SUPERVISOR_BACKOFF_BASE = 1
+STREAM_SUPERVISOR_BACKOFF_MAX = 60
+# A process running this many seconds is considered healthy again and its backoff is reset
+STREAM_SUPERVISOR_STABLE_AFTER = 30
+# Per-process pid, uptime, CPU and RSS are written here every second
+STREAM_SUPERVISOR_STATUS_FILE = f'{STREAM_ROOT}/supervisor.json'
+
+# ==================== ON-DEMAND STREAM SETTINGS ====================
+# Transcode only cameras that are being watched, needs CAMERA_STREAM_BACKEND = 'supervisor'
+# and a CACHES backend shared by the web workers and the supervisor, e.g. Redis
+STREAM_ON_DEMAND = False
+# Seconds a camera keeps transcoding after its last viewer left
+STREAM_IDLE_GRACE = 60
+# Seconds of the windows viewers are counted in, a viewer without a playlist fetch is gone after one or two
+STREAM_VIEWER_TIMEOUT = 10
+
+# ==================== METRICS SETTINGS ====================
+# Directory the web workers write their metrics shards to, merged when /metrics/ is scraped.
+# Must be shared by all workers of a host, e.g. a tmpfs under /run. The scrape folds the shards of
+# exited workers into exited.json, emptying it on deploy resets the counters like a restart.
+# With None only the metrics of the worker answering the scrape are reported.
+METRICS_DIR = None
+# Seconds between writes of a worker's shard
+METRICS_FLUSH_INTERVAL = 5
+# Bearer token Prometheus sends to scrape /metrics/ (authorization.credentials in the scrape config),
+# /metrics/ refuses every request while it is None
+METRICS_TOKEN = None
+
+# ==================== CAMERA HEALTH SETTINGS ====================
+# Seconds between health sweeps of manage.py probe_cameras
+CAMERA_HEALTH_INTERVAL = 30
+# Maximum number of RTSP probes open at the same time
+CAMERA_HEALTH_CONCURRENCY = 200
+# Seconds a single probe may take to connect and answer
+CAMERA_HEALTH_TIMEOUT = 3
+# Consecutive failed probes before a camera is marked down, and successful ones before it is up again
+CAMERA_HEALTH_FAILURES = 3
+CAMERA_HEALTH_RECOVERIES = 2
@@ -0,0 +1,13 @@
+REST_FRAMEWORK = {
+    # Token bucket rates of apps.authentication.throttles, '<throttle_scope>_<ip|phone>': 'requests/period'.
+    # The period may have a multiplier, e.g. '3/10m'. Scopes missing here are not throttled.
+    "DEFAULT_THROTTLE_RATES": {
+        "send_otp_ip": "20/h",
+        "send_otp_phone": "3/10m",
+        "verify_otp_ip": "30/h",
+        "verify_otp_phone": "10/10m",
+        "login_ip": "30/m",
+        "login_phone": "10/m",
+        "register_ip": "10/h",
+    },
+}
@@ -0,0 +1,15 @@
+from django.apps import apps
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runner of manage.py test. The migrations of the project apps are generated on every deployment
+    and not committed, so the test database is created straight from their models.
+    """
+
+    def setup_databases(self, **kwargs):
+        project_apps = {app.label: None for app in apps.get_app_configs() if app.name.startswith('apps.')}
+        with override_settings(MIGRATION_MODULES=project_apps):
+            return super().setup_databases(**kwargs)
@@ -20,15 +20,20 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
-from apps.core.views import M3U8FileAPIView
+from apps.core.views import M3U8FileAPIView, MasterPlaylistAPIView, StreamMetricsAPIView, StreamSegmentAPIView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('apps.authentication.urls')),
     path('main/', include('apps.participants.urls')),
     path('core/', include('apps.core.urls')),
+    path('kindergartens/', include('apps.kindergarten.urls')),
 
     path('content/stream/get_m3u8_url/<str:file_name>/', M3U8FileAPIView.as_view(), name='get_m3u8_url'),
+    path('content/stream/master/<int:camera_id>/', MasterPlaylistAPIView.as_view(), name='get_master_playlist'),
+    # No trailing slash, ffmpeg appends segment names to STREAM_SEGMENT_URL as they are
+    path('content/stream/segment/<str:file_name>', StreamSegmentAPIView.as_view(), name='get_stream_segment'),
+    path('metrics/', StreamMetricsAPIView.as_view(), name='stream_metrics'),
 
 ] + debug_toolbar_urls()
 